@@ -0,0 +1,148 @@
+"""This module defines a buddy allocator for IP subnets, used to assign
+prefixes to the broadcast domains of a network, as well as the allocator of
+the router ids"""
+import heapq
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Union, Tuple, Set
+
+from ipaddress import IPv4Network, IPv6Network, IPv4Address, ip_address
+
+Network = Union[IPv4Network, IPv6Network]
+
+
+def _merge_intervals(intervals: Iterable[Tuple[int, int]]) \
+        -> List[Tuple[int, int]]:
+    """Merge overlapping or adjacent intervals
+
+    :return: The sorted list of the resulting disjoint intervals"""
+    merged = []  # type: List[Tuple[int, int]]
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class SubnetAllocator:
+    """Allocate subnets from a set of available prefixes, as a buddy allocator.
+    The free blocks are kept in one heap per prefix length. An allocation
+    takes the smallest free block able to contain the requested prefix
+    (the one with the lowest address if there are several) and splits it
+    until it has the right size, always keeping the left half. This keeps
+    the free space as aggregated as possible.
+    The subnets that are already allocated are kept as a sorted list of
+    disjoint address intervals, and the free blocks overlapping them are
+    either split or discarded when they are picked."""
+
+    def __init__(self, subnets: Iterable[Network],
+                 allocated_subnets: Iterable[Network] = ()):
+        """:param subnets: The available subnets, all of the same IP version
+        :param allocated_subnets: The subnets that cannot be allocated"""
+        self._free = {}  # type: Dict[int, List[int]]
+        self._cls = None
+        self.max_prefixlen = 0
+        for net in subnets:
+            if self._cls is None:
+                self._cls = type(net)
+                self.max_prefixlen = net.max_prefixlen
+            self._push(int(net.network_address), net.prefixlen)
+        intervals = _merge_intervals(
+            (int(n.network_address), int(n.broadcast_address))
+            for n in allocated_subnets
+            if self._cls is None or isinstance(n, self._cls))
+        self._reserved_starts = [start for start, _ in intervals]
+        self._reserved_ends = [end for _, end in intervals]
+
+    def _push(self, address: int, prefixlen: int):
+        heapq.heappush(self._free.setdefault(prefixlen, []), address)
+
+    def _best_fit(self, prefixlen: int) -> Optional[int]:
+        """Return the prefix length of the smallest free blocks that can
+        contain a prefix of the given length, if any"""
+        for plen in range(prefixlen, -1, -1):
+            if self._free.get(plen):
+                return plen
+        return None
+
+    def _overlap(self, first: int, last: int) -> int:
+        """Check whether an address interval overlaps allocated subnets
+
+        :return: 0 if it does not, 1 if it is partially covered by them,
+                 2 if it is contained in one of them"""
+        i = bisect_right(self._reserved_starts, last) - 1
+        if i < 0 or self._reserved_ends[i] < first:
+            return 0
+        if self._reserved_starts[i] <= first \
+                and self._reserved_ends[i] >= last:
+            return 2
+        return 1
+
+    def has_free(self, prefixlen: Optional[int] = None) -> bool:
+        """Return whether there are free blocks left
+
+        :param prefixlen: Only consider the blocks that are able to contain
+                          a prefix of this length"""
+        if prefixlen is None:
+            return any(self._free.values())
+        return self._best_fit(prefixlen) is not None
+
+    def allocate(self, prefixlen: int) -> Optional[Network]:
+        """Allocate a subnet
+
+        :param prefixlen: The prefix length of the subnet
+        :return: The allocated subnet or None if none is left"""
+        while True:
+            plen = self._best_fit(prefixlen)
+            if plen is None:
+                return None
+            address = heapq.heappop(self._free[plen])
+            size = 1 << (self.max_prefixlen - plen)
+            overlap = self._overlap(address, address + size - 1)
+            if overlap == 2:
+                continue  # Discard the block
+            if overlap == 1 or plen < prefixlen:
+                # Split the block, the left half will be picked next
+                self._push(address, plen + 1)
+                self._push(address + size // 2, plen + 1)
+                continue
+            return self._cls((address, plen))
+
+    def free_subnets(self) -> List[Network]:
+        """Return the free subnets, from the smallest to the biggest"""
+        return [self._cls((address, plen))
+                for plen in sorted(self._free, reverse=True)
+                for address in sorted(self._free[plen])]
+
+
+class RouterIdAllocator:
+    """Hand out router ids that are unique in a network.
+    The router ids already in use, either explicitly set or derived from
+    the addresses of the routers, are reserved beforehand, and the other
+    ones are then allocated in increasing order."""
+
+    def __init__(self, first: Union[str, IPv4Address] = '0.0.0.1'):
+        """:param first: The lowest router id to allocate"""
+        self._next = int(ip_address(first))
+        self._used = set()  # type: Set[int]
+        # Nodes can be started concurrently, see ipmininet.scheduler
+        self._lock = threading.Lock()
+
+    def reserve(self, *routerids: Union[str, IPv4Address]):
+        """Prevent router ids from being allocated"""
+        with self._lock:
+            self._used.update(int(ip_address(str(r))) for r in routerids)
+
+    def allocate(self) -> str:
+        """Return a new router id
+
+        :raise ValueError: if there are no router ids left"""
+        with self._lock:
+            while self._next in self._used:
+                self._next += 1
+            if self._next > int(IPv4Address('255.255.255.255')):
+                raise ValueError('No router id left')
+            self._used.add(self._next)
+            return IPv4Address(self._next).compressed
@@ -0,0 +1,392 @@
+"""This module places the processes of the nodes in cgroup v2 hierarchies,
+one cgroup per network and one per node in it:
+<cgroup2 mount>/ipmininet/<network>/<node>. All the processes of a node or
+of a network, including those that daemonized, can then be listed and
+killed at once. The name of the cgroup of a network records the process
+that owns it, so that cleaning up after a crash leaves alone the networks
+of the processes that still run."""
+import itertools
+import os
+import re
+import select
+import signal
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, \
+    Union
+
+from mininet.log import lg as log
+
+# The cgroup, under the cgroup v2 mount, holding the cgroups of the networks
+BASE = 'ipmininet'
+# How long to wait for killed processes to die, in seconds
+KILL_TIMEOUT = 5.
+# How long the processes of a node have to exit on SIGTERM when it stops
+TERM_GRACE = .5
+# The period of the CPU quotas, in microseconds
+CPU_PERIOD = 100000
+
+_network_ids = itertools.count()
+
+
+def cgroup2_mount() -> Optional[str]:
+    """Return where the cgroup v2 hierarchy is mounted, if it is"""
+    try:
+        with open('/proc/self/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == 'cgroup2':
+                    return fields[1]
+    except OSError:
+        pass
+    return None
+
+
+def _start_time(pid: int) -> Optional[str]:
+    """Return the start time of a process, which tells it apart from a later
+    process with the same pid"""
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            # The command name can contain spaces and parentheses
+            return f.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def owner_alive(name: str) -> bool:
+    """Return whether the process that owns the cgroup of a network runs
+
+    :param name: The name of the cgroup of the network"""
+    try:
+        pid, start, _ = name.split('-', 2)
+        return _start_time(int(pid)) == start
+    except ValueError:
+        return False
+
+
+def _running(pid: int) -> bool:
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (OSError, IndexError):
+        return False
+
+
+def send_signal(pids: Iterable[int], sig: int) -> Set[int]:
+    """Send a signal to processes
+
+    :return: The processes that received it"""
+    sent = set()
+    for pid in pids:
+        try:
+            os.kill(pid, sig)
+            sent.add(pid)
+        except ProcessLookupError:
+            pass
+    return sent
+
+
+def wait_pids(pids: Iterable[int], timeout: float) -> Set[int]:
+    """Wait for processes to exit, through pidfds when the kernel has them
+
+    :param pids: The processes
+    :param timeout: The maximal time to wait, in seconds
+    :return: The processes still running after the timeout"""
+    deadline = time.monotonic() + timeout
+    poller = select.poll()
+    fds = {}
+    polled = set()
+    for pid in pids:
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            continue  # Already gone
+        except (AttributeError, OSError):
+            polled.add(pid)  # No pidfds before Linux 5.3 and Python 3.9
+            continue
+        fds[fd] = pid
+        poller.register(fd, select.POLLIN)
+    try:
+        while fds:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            for fd, _ in poller.poll(left * 1000):
+                poller.unregister(fd)
+                os.close(fd)
+                del fds[fd]
+        while polled:
+            polled = {p for p in polled if _running(p)}
+            if not polled or time.monotonic() >= deadline:
+                break
+            time.sleep(.05)
+    finally:
+        for fd in fds:
+            os.close(fd)
+    return polled | set(fds.values())
+
+
+def resource_limits(cpu_quota: Optional[float] = None,
+                    cpu_weight: Optional[int] = None,
+                    memory_max: Union[None, int, str] = None,
+                    cpuset: Union[None, str, Sequence[int]] = None) \
+        -> Dict[str, str]:
+    """Translate resource limits to the interface files of a cgroup
+
+    :param cpu_quota: The number of CPUs that the processes can use in
+                      total, e.g., 0.5 or 2
+    :param cpu_weight: The share of the processes when the CPUs are busy,
+                       from 1 to 10000, 100 by default
+    :param memory_max: The maximal memory of the processes in bytes, or
+                       with a K, M, G or T suffix
+    :param cpuset: The CPUs on which the processes run, e.g., [0, 1] or '0-3'
+    :return: The value of each interface file"""
+    limits = {}
+    if cpu_quota is not None:
+        if cpu_quota <= 0:
+            raise ValueError('cpu_quota must be positive, got %s' % cpu_quota)
+        limits['cpu.max'] = '%d %d' % (max(1000, round(cpu_quota
+                                                        * CPU_PERIOD)),
+                                       CPU_PERIOD)
+    if cpu_weight is not None:
+        if not 1 <= cpu_weight <= 10000:
+            raise ValueError('cpu_weight must be in [1, 10000], got %s'
+                             % cpu_weight)
+        limits['cpu.weight'] = str(cpu_weight)
+    if memory_max is not None:
+        if not re.match(r'^\d+[KMGT]?$', str(memory_max)):
+            raise ValueError('Invalid memory_max: %s' % memory_max)
+        limits['memory.max'] = str(memory_max)
+    if cpuset is not None:
+        if not isinstance(cpuset, str):
+            cpuset = ','.join(str(cpu) for cpu in cpuset)
+        if not re.match(r'^\d+(-\d+)?(,\d+(-\d+)?)*$', cpuset):
+            raise ValueError('Invalid cpuset: %s' % cpuset)
+        limits['cpuset.cpus'] = cpuset
+    return limits
+
+
+class Cgroup:
+    """A cgroup of the cgroup v2 hierarchy"""
+
+    def __init__(self, path: str):
+        """:param path: The directory of the cgroup"""
+        self.path = path
+
+    def __repr__(self):
+        return 'Cgroup(%r)' % self.path
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.path)
+
+    def child(self, name: str) -> 'Cgroup':
+        """Return a child of this cgroup, created if needed"""
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return Cgroup(path)
+
+    def children(self) -> List['Cgroup']:
+        try:
+            return [Cgroup(e.path) for e in os.scandir(self.path)
+                    if e.is_dir(follow_symlinks=False)]
+        except OSError:
+            return []
+
+    def read(self, key: str) -> str:
+        """Read an interface file of the cgroup, e.g. cgroup.procs"""
+        with open(os.path.join(self.path, key)) as f:
+            return f.read()
+
+    def write(self, key: str, value):
+        """Write to an interface file of the cgroup"""
+        with open(os.path.join(self.path, key), 'w') as f:
+            f.write(str(value))
+
+    def attach(self, pid: int):
+        """Move a running process in the cgroup, its future children will be
+        in it as well"""
+        self.write('cgroup.procs', pid)
+
+    def preexec_fn(self, then: Optional[Callable[[], None]] = None) \
+            -> Callable[[], None]:
+        """Return a function for the preexec_fn argument of subprocess.Popen,
+        which moves the new process in the cgroup before it executes anything
+
+        :param then: Another preexec_fn to call afterwards"""
+        path = os.path.join(self.path, 'cgroup.procs')
+
+        def attach():
+            # Only system calls, as other threads may hold locks in the child
+            fd = os.open(path, os.O_WRONLY)
+            try:
+                os.write(fd, b'0')
+            finally:
+                os.close(fd)
+            if then is not None:
+                then()
+        return attach
+
+    def limit(self, limits: Dict[str, str]):
+        """Enable the controllers of the limits in the ancestors of the
+        cgroup, then set the limits
+
+        :param limits: The value of each interface file, see
+                       resource_limits()
+        :raise ValueError: if a limit cannot be set"""
+        controllers = sorted({key.split('.')[0] for key in limits})
+        mount = cgroup2_mount()
+        ancestors = []
+        parent = os.path.dirname(self.path)
+        while mount is not None \
+                and os.path.commonpath([parent, mount]) == mount:
+            ancestors.append(parent)
+            parent = os.path.dirname(parent)
+        for path in reversed(ancestors):
+            try:
+                Cgroup(path).write('cgroup.subtree_control',
+                                   ' '.join('+' + c for c in controllers))
+            except OSError as e:
+                raise ValueError('Cannot enable the %s controllers in %s: %s'
+                                 % (', '.join(controllers), path, e))
+        for key, value in limits.items():
+            try:
+                self.write(key, value)
+            except OSError as e:
+                raise ValueError('Cannot set %s to %s in %s: %s'
+                                 % (key, value, self.path, e))
+
+    def usage(self) -> Dict[str, int]:
+        """Return the resource usage counters of the cgroup: the cpu.stat
+        counters (usage_usec, user_usec, system_usec, nr_throttled,
+        throttled_usec...), memory_current, memory_peak, oom_kill and
+        pids. The counters of disabled controllers are missing."""
+        usage = {}
+        for key in ('cpu.stat', 'memory.events'):
+            try:
+                for line in self.read(key).splitlines():
+                    name, value = line.split()
+                    if key == 'cpu.stat' or name == 'oom_kill':
+                        usage[name] = int(value)
+            except (OSError, ValueError):
+                pass
+        for key in ('memory.current', 'memory.peak'):
+            try:
+                usage[key.replace('.', '_')] = int(self.read(key))
+            except (OSError, ValueError):
+                pass
+        usage['pids'] = len(self.pids())
+        return usage
+
+    def pids(self) -> Set[int]:
+        """Return the processes in the cgroup and its descendants"""
+        pids = set()
+        for directory, _, _ in os.walk(self.path):
+            try:
+                with open(os.path.join(directory, 'cgroup.procs')) as f:
+                    pids.update(int(p) for p in f.read().split())
+            except (OSError, ValueError):
+                pass  # Removed in between
+        return pids
+
+    def _kill(self, pids: Set[int]):
+        try:
+            self.write('cgroup.kill', 1)
+        except OSError:  # No cgroup.kill before Linux 5.14
+            send_signal(pids, signal.SIGKILL)
+
+    def kill(self, timeout=KILL_TIMEOUT, grace=0.) -> bool:
+        """Kill all the processes of the cgroup and its descendants at once,
+        wait for them to die and remove the cgroups
+
+        :param timeout: The maximal time to wait for the processes to die
+        :param grace: How long the processes have to exit after a SIGTERM
+                      before being killed, 0 kills them right away
+        :return: Whether the cgroups are removed"""
+        if not self.exists():
+            return True
+        pids = self.pids()
+        if grace and pids:
+            wait_pids(send_signal(pids, signal.SIGTERM), grace)
+            pids = self.pids()
+        deadline = time.monotonic() + timeout
+        while pids and time.monotonic() < deadline:
+            self._kill(pids)
+            wait_pids(pids, deadline - time.monotonic())
+            # Look for the processes forked in between
+            pids = self.pids()
+        return self.remove()
+
+    def remove(self) -> bool:
+        """Remove the cgroup and its descendants, which must have no process
+
+        :return: Whether they are removed"""
+        try:
+            for directory, _, _ in os.walk(self.path, topdown=False):
+                os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning('*** Cannot remove the cgroup %s: %s\n'
+                        % (self.path, e))
+            return False
+        return True
+
+
+def _base() -> Optional[Cgroup]:
+    mount = cgroup2_mount()
+    return None if mount is None else Cgroup(os.path.join(mount, BASE))
+
+
+def network_cgroup() -> Optional[Cgroup]:
+    """Create the cgroup of a new network, owned by the current process
+
+    :return: The cgroup, or None if cgroup v2 cannot be used"""
+    base = _base()
+    if base is None:
+        log.warning('*** cgroup v2 is not mounted, the processes of the '
+                    'nodes are not tracked\n')
+        return None
+    pid = os.getpid()
+    try:
+        return base.child('%d-%s-%d' % (pid, _start_time(pid),
+                                        next(_network_ids)))
+    except OSError as e:
+        log.warning('*** Cannot create the cgroup of the network, the '
+                    'processes of the nodes are not tracked: %s\n' % e)
+        return None
+
+
+def networks() -> List[Cgroup]:
+    """Return the cgroups of all the networks, running or not"""
+    base = _base()
+    return [] if base is None else base.children()
+
+
+def running_pids() -> Set[int]:
+    """Return the processes of the networks whose owner still runs"""
+    pids = set()  # type: Set[int]
+    for network in networks():
+        if owner_alive(network.name):
+            pids.update(network.pids())
+    return pids
+
+
+def cleanup_stale(timeout=KILL_TIMEOUT) -> int:
+    """Kill the processes of the networks whose owner is gone, all at once,
+    and remove their cgroups
+
+    :param timeout: The maximal time to wait for the processes to die
+    :return: The number of cleaned up networks"""
+    stale = [n for n in networks() if not owner_alive(n.name)]
+    pids = {}  # type: Dict[str, Set[int]]
+    for network in stale:
+        pids[network.name] = network.pids()
+        network._kill(pids[network.name])
+    wait_pids(set().union(*pids.values()), timeout)
+    # Wait for the stragglers and remove the cgroups
+    for network in stale:
+        network.kill(timeout=timeout)
+    return len(stale)
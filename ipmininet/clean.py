@@ -1,20 +1,36 @@
-import time
+import os
+import signal
 from subprocess import check_output, CalledProcessError
-from typing import List
+from typing import List, Set
 
 import mininet.clean as mnclean
 from mininet.log import lg as log
 
 import ipmininet.router.config as router_daemons
 import ipmininet.host.config as host_daemons
+from .cgroup import cleanup_stale, networks, owner_alive, running_pids, \
+    send_signal, wait_pids
 from .utils import is_container
 
 
 def cleanup(level: str = 'info'):
-    """Cleanup all possible junk that we may have started."""
+    """Cleanup all possible junk that we may have started.
+    The Mininet cleanup removes all the links, switches and Mininet
+    processes of the machine, so it is skipped while another network runs.
+    Running networks can only be detected with cgroup v2."""
     log.setLogLevel(level)
-    # Standard mininet cleanup
-    mnclean.cleanup()
+    running = [n.name for n in networks() if owner_alive(n.name)]
+    if running:
+        log.warning('*** Skipping the Mininet cleanup, as it would break the '
+                    'networks of running processes: %s\n'
+                    % ', '.join(running))
+    else:
+        log.info('*** Running the Mininet cleanup, which removes all the '
+                 'links, switches and Mininet processes of the machine\n')
+        mnclean.cleanup()
+    # Kill at once the processes of the networks whose owner is gone
+    log.info('*** Cleaning up the cgroups of stopped networks:\n')
+    log.info(cleanup_stale(), 'networks\n')
     # Cleanup any leftover daemon
     patterns = []  # type: List[str]
     for package in [router_daemons, host_daemons]:
@@ -27,38 +43,34 @@ def cleanup(level: str = 'info'):
                 killp = [killp]
             patterns.extend(killp)
     log.info('*** Cleaning up daemons:\n')
-    killprocs(['"^%s"' % p for p in patterns])
+    killprocs(['^%s' % p for p in patterns])
     log.info('\n')
 
 
-def killprocs(patterns, timeout=10):
-    """Reliably terminate processes matching a pattern (including args)"""
+def _pgrep(patterns: List[str]) -> Set[int]:
+    try:
+        out = check_output(['pgrep', '-f',
+                            '|'.join('(%s)' % p for p in patterns)],
+                           universal_newlines=True)
+    except CalledProcessError:  # Nothing matches
+        return set()
+    return {int(p) for p in out.split()}
 
-    # Try clean kill
-    for p in patterns:
-        mnclean.sh('pkill -SIGINT -f %s' % p)
 
-    # Make sure they are gone
-    t = 0
-    to_be_killed = {p: True for p in patterns}
-    while any(to_be_killed.values()) or t >= timeout:
-        for p in patterns:
-            try:
-                pids = check_output(['pgrep', '-f', p])
-            except CalledProcessError:
-                pids = ''
-            if not pids:
-                log.info(p)
-                to_be_killed[p] = False
+def killprocs(patterns, timeout=10):
+    """Reliably terminate processes matching a pattern (including args),
+    except those of the networks that are still running"""
+    if not patterns:
+        return
+    pids = _pgrep(patterns) - running_pids() - {os.getpid()}
 
-        time.sleep(.5)
-        t += .5
+    # Try clean kill
+    pids = wait_pids(send_signal(pids, signal.SIGINT), timeout)
 
     # Last resort
-    for p in patterns:
-        if to_be_killed[p]:
-            log.info(p)
-            mnclean.killprocs(p)
+    if pids:
+        log.info('killing', len(pids), 'processes')
+        wait_pids(send_signal(pids, signal.SIGKILL), timeout)
 
 
 if __name__ == '__main__':
@@ -1,16 +1,24 @@
 """An enhanced CLI providing IP-related commands"""
+import asyncio
 import sys
+import time
 from cmd import Cmd
+from fnmatch import fnmatchcase
 from select import poll
+from typing import Dict, List, Sequence, Tuple
 
 from mininet.cli import CLI
 from mininet.log import lg
+from mininet.node import Node
 
 from ipmininet.utils import address_pair
 
 
 class IPCLI(CLI):
 
+    # The maximal number of commands run at the same time by fan-out commands
+    FANOUT_LIMIT = 64
+
     # XXX When PR https://github.com/mininet/mininet/pull/897
     # is accepted, we can remove this constructor
     def __init__(self, mininet, stdin=sys.stdin, script=None):
@@ -39,9 +47,63 @@ class IPCLI(CLI):
     def do_route(self, line: str = ""):
         """route destination: Print all the routes towards that destination
         for every router in the network"""
-        for r in self.mn.routers:
-            lg.output("[%s] " % r.name)
-            self.default('%s ip route get %s' % (r.name, line))
+        start = time.time()
+        results = self.fanout(self.mn.routers, 'ip route get %s' % line)
+        for name, (out, _) in results.items():
+            lg.output("[%s] %s" % (name, out))
+        lg.info('*** %d routers in %.3fs\n' % (len(results),
+                                               time.time() - start))
+
+    def do_pall(self, line: str):
+        """pall glob1[,glob2...] cmd: Run the command on all the nodes whose
+        name matches one of the shell-style patterns, at the same time.
+        Node names are replaced by addresses as for '<node> cmd'."""
+        patterns, _, cmd = line.partition(' ')
+        if not cmd.strip():
+            lg.error('*** Usage: pall <node-glob> <cmd>\n')
+            return
+        nodes = self.match_nodes(patterns.split(','))
+        if not nodes:
+            lg.error('*** No node matches %s\n' % patterns)
+            return
+        start = time.time()
+        for name, (out, duration) in self.fanout(nodes, cmd).items():
+            lg.output('*** [%s] %.3fs\n%s' % (name, duration, out))
+        lg.info('*** %d nodes in %.3fs\n' % (len(nodes), time.time() - start))
+
+    def match_nodes(self, patterns: Sequence[str]) -> List[Node]:
+        """Return the nodes of the network whose name matches one of the
+        shell-style patterns, in the order of the network"""
+        return [self.mn[n] for n in self.mn
+                if any(fnmatchcase(n, p) for p in patterns if p)]
+
+    def fanout(self, nodes: Sequence[Node], cmd: str) \
+            -> Dict[str, Tuple[str, float]]:
+        """Run a command on the nodes at the same time
+
+        :param nodes: The nodes
+        :param cmd: The command, node names in it are replaced by addresses
+        :return: The output of the command on each node and its duration,
+                 in the order of the nodes"""
+        args = cmd.split(' ')
+
+        async def run(node: Node, semaphore: asyncio.Semaphore) \
+                -> Tuple[str, float]:
+            async with semaphore:
+                start = time.time()
+                try:
+                    out = (await self.mn.gather_cmd(
+                        [node], self._replace_names(node, args)))[node.name]
+                except Exception as e:
+                    out = '*** %s failed: %s\n' % (node.name, e)
+                return out, time.time() - start
+
+        async def run_all() -> List[Tuple[str, float]]:
+            semaphore = asyncio.Semaphore(self.FANOUT_LIMIT)
+            return await asyncio.gather(*(run(n, semaphore) for n in nodes))
+
+        return {n.name: result
+                for n, result in zip(nodes, asyncio.run(run_all()))}
 
     def do_ip(self, line: str):
         """ip IP1 IP2 ...: return the node associated to the given IP"""
@@ -99,23 +161,25 @@ class IPCLI(CLI):
                 lg.error("*** Enter a command for node: %s <cmd>" % first)
                 return
             node = self.mn[first]
-            rest = args.split(' ')
-
-            hops = [h for h in rest if h in self.mn]
-            v4_support, v6_support = address_pair(self.mn[first])
-            v4_map = {}
-            v6_map = {}
-            for hop in hops:
-                ip, ip6 = address_pair(self.mn[hop],
-                                       v4_support is not None,
-                                       v6_support is not None)
-                if ip is not None:
-                    v4_map[hop] = ip
-                if ip6 is not None:
-                    v6_map[hop] = ip6
-            ip_map = v4_map if len(v4_map) >= len(v6_map) else v6_map
-
-            node.sendCmd(' '.join([ip_map.get(r, r) for r in rest]))
+            node.sendCmd(self._replace_names(node, args.split(' ')))
             self.waitForNode(node)
         else:
             lg.error('*** Unknown command: %s\n' % line)
+
+    def _replace_names(self, node: Node, args: Sequence[str]) -> str:
+        """Replace the node names in the arguments of a command run by node
+        with their addresses, see default()"""
+        hops = [h for h in args if h in self.mn]
+        v4_support, v6_support = address_pair(node)
+        v4_map = {}
+        v6_map = {}
+        for hop in hops:
+            ip, ip6 = address_pair(self.mn[hop],
+                                   v4_support is not None,
+                                   v6_support is not None)
+            if ip is not None:
+                v4_map[hop] = ip
+            if ip6 is not None:
+                v6_map[hop] = ip6
+        ip_map = v4_map if len(v4_map) >= len(v6_map) else v6_map
+        return ' '.join([ip_map.get(r, r) for r in args])
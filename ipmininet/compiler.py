@@ -0,0 +1,140 @@
+"""This module compiles the configuration files of the nodes of a network
+ahead of their startup. The daemon configurations are built and rendered
+by a pool of forked processes, which inherit the network, and the result is
+recorded in a manifest that the nodes consume when they start."""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from mininet.log import lg as log
+from mininet.node import Node
+
+from .router.config.base import NodeConfig, _read_file, _write_file
+
+# {node: {daemon: {config path: {'file': compiled path, 'sha256': digest}}}}
+Manifest = Dict[str, Dict[str, Dict[str, Dict[str, str]]]]
+Rendered = Dict[str, Dict[str, str]]
+
+MANIFEST_FILENAME = 'manifest.json'
+# Below that many nodes, forking workers costs more than it saves
+MIN_FORKED_NODES = 32
+# The name prefix of the long-lived threads of ipmininet
+LIBRARY_THREAD_PREFIX = 'ipmininet-'
+
+# The nodes being compiled, inherited by the forked workers
+_nodes = {}  # type: Dict[str, Node]
+
+
+def _render(name: str) -> Tuple[str, Union[Rendered, BaseException]]:
+    try:
+        return name, _nodes[name].nconfig.render_daemons()
+    except Exception as e:
+        return name, e
+
+
+def _other_threads() -> List[threading.Thread]:
+    """Return the threads that prevent forking the workers, i.e., all the
+    threads but the current one and the daemon threads of ipmininet, which
+    wait on the pipes of the nodes and hold no lock used by the rendering"""
+    current = threading.current_thread()
+    return [t for t in threading.enumerate()
+            if t is not current and not (
+                t.daemon and t.name.startswith(LIBRARY_THREAD_PREFIX))]
+
+
+def _render_all(names: List[str], processes: Optional[int]) \
+        -> Iterable[Tuple[str, Union[Rendered, BaseException]]]:
+    if processes == 1 or len(names) < MIN_FORKED_NODES \
+            or 'fork' not in multiprocessing.get_all_start_methods():
+        return [_render(n) for n in names]
+    threads = _other_threads()
+    if threads:
+        # The forked workers could inherit locks held by the other threads
+        log.debug('Compiling the configurations in the current process, as '
+                  'other threads are running: %s\n'
+                  % ', '.join(t.name for t in threads))
+        return [_render(n) for n in names]
+    processes = min(processes or os.cpu_count() or 1, len(names))
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(processes=processes) as pool:
+        return pool.map(_render, names,
+                        chunksize=max(1, len(names) // (4 * processes)))
+
+
+def compile_configs(nodes: Iterable[Node], directory: Optional[str] = None,
+                    processes: Optional[int] = None) -> Manifest:
+    """Compile the configuration files of the daemons of the nodes
+
+    :param nodes: The nodes to compile, the ones without configuration object
+                  are ignored
+    :param directory: The directory where the compiled files and the manifest
+                      are stored. If None, the files are directly written at
+                      the location used by the daemons and no manifest file
+                      is written.
+    :param processes: The number of worker processes, None uses all CPUs and
+                      1 compiles everything in the current process, as do
+                      fewer than MIN_FORKED_NODES nodes or running threads
+                      other than those of ipmininet
+    :return: The manifest of the compiled files. The nodes that could not be
+             compiled are left out and will build their configuration when
+             they start."""
+    global _nodes
+    _nodes = {n.name: n for n in nodes
+              if isinstance(getattr(n, 'nconfig', None), NodeConfig)}
+    manifest = {}  # type: Manifest
+    try:
+        # Sequentially, as this assigns the router ids among others
+        for n in _nodes.values():
+            n.nconfig.prepare_daemons()
+        for name, rendered in _render_all(sorted(_nodes), processes):
+            if isinstance(rendered, BaseException):
+                log.error('*** Cannot compile the configuration of %s: %s\n'
+                          % (name, rendered))
+                continue
+            manifest[name] = _store(name, rendered, directory)
+            _nodes[name].nconfig.compiled = manifest[name]
+    finally:
+        _nodes = {}
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, MANIFEST_FILENAME), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _store(name: str, rendered: Rendered, directory: Optional[str]) \
+        -> Dict[str, Dict[str, Dict[str, str]]]:
+    """Write the compiled files of a node and return its manifest entry"""
+    entry = {}  # type: Dict[str, Dict[str, Dict[str, str]]]
+    for daemon, files in rendered.items():
+        for target, content in files.items():
+            if directory is None:
+                path = target
+            else:
+                os.makedirs(os.path.join(directory, name), exist_ok=True)
+                path = os.path.join(directory, name, os.path.basename(target))
+            if _read_file(path) != content:
+                _write_file(path, content)
+            entry.setdefault(daemon, {})[target] = {
+                'file': path,
+                'sha256': hashlib.sha256(content.encode()).hexdigest()}
+    return entry
+
+
+def load_manifest(nodes: Iterable[Node], directory: str) -> Manifest:
+    """Attach the configuration files compiled in a directory to the nodes,
+    which will use them when they start
+
+    :param nodes: The nodes of the network
+    :param directory: The directory given to compile_configs()
+    :return: The manifest"""
+    with open(os.path.join(directory, MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)  # type: Manifest
+    for n in nodes:
+        if n.name in manifest \
+                and isinstance(getattr(n, 'nconfig', None), NodeConfig):
+            n.nconfig.compiled = manifest[n.name]
+    return manifest
@@ -0,0 +1,115 @@
+"""This module indexes the connected components of a network, so that the
+nodes do not have to explore the whole network to find the addresses of
+their neighbors or another node"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mininet.node import Host, Node
+
+from .link import IPIntf
+from .router import IPNode
+from .utils import DisjointSet, L3Router, realIntfList, otherIntf
+
+
+class ComponentIndex:
+    """The connected components of a network:
+
+    - the nodes linked together, whatever their kind, which share the same
+      /etc/hosts file;
+    - the broadcast domains joined by L3 routers, in which find_node()
+      looks for nodes."""
+
+    def __init__(self, nodes: Iterable[Node],
+                 broadcast_domains: Iterable = ()):
+        """:param nodes: All the nodes of the network
+        :param broadcast_domains: The broadcast domains of the network"""
+        self._nodes = {n.name: n for n in nodes}
+        links = DisjointSet()
+        for n in self._nodes.values():
+            links.find(n.name)
+            for i in realIntfList(n):
+                other = otherIntf(i)
+                if other is not None and other.node.name in self._nodes:
+                    links.union(n.name, other.node.name)
+        self._component = {}  # type: Dict[str, str]
+        members = {}  # type: Dict[str, List[str]]
+        for name in sorted(self._nodes):
+            root = links.find(name)
+            members.setdefault(root, []).append(name)
+        for names in members.values():
+            # The name of the first node identifies the component
+            for name in names:
+                self._component[name] = names[0]
+        self._members = {names[0]: names for names in members.values()}
+        self._ips = {}  # type: Dict[str, Dict[str, List[str]]]
+        self._hosts_files = {}  # type: Dict[Tuple[str, str], str]
+        self._etc_hosts = None  # type: Optional[bytes]
+
+        # Nodes can be started concurrently, see ipmininet.scheduler
+        self._lock = threading.RLock()
+
+        self._domains = DisjointSet()
+        for d in broadcast_domains:
+            self._domains.find(d)
+            for i in d.interfaces:
+                if L3Router.is_l3router_intf(i):
+                    self._domains.union(d, i.node)
+
+    def network_ips(self, node: Node) -> Dict[str, List[str]]:
+        """Return all the addresses of the nodes connected directly or not
+        to the node, computed once per component"""
+        component = self._component[node.name]
+        with self._lock:
+            ips = self._ips.get(component)
+            if ips is None:
+                ips = self._ips[component] = {}
+                for name in self._members[component]:
+                    n = self._nodes[name]
+                    if not isinstance(n, (Host, IPNode)):
+                        continue
+                    for i in n.intfList():
+                        for ip in list(i.ips()) \
+                                + list(i.ip6s(exclude_lls=True)):
+                            ips.setdefault(name, []).append(ip.ip.compressed)
+        return ips
+
+    def hosts_file(self, node: Node) -> str:
+        """Return the path of the /etc/hosts file of the node, which is
+        written once per component and shared by all its nodes"""
+        component = self._component[node.name]
+        key = (node.cwd, component)
+        with self._lock:
+            path = self._hosts_files.get(key)
+            if path is not None:
+                return path
+            if self._etc_hosts is None:
+                with open("/etc/hosts", "rb") as fileobj:
+                    self._etc_hosts = fileobj.read()
+            path = os.path.join(node.cwd, 'hosts_component_%s' % component)
+            with open(path, "wb") as fileobj:
+                for node_name, ips in self.network_ips(node).items():
+                    for ip in ips:
+                        fileobj.write("{ip}\t{name}\n"
+                                      .format(ip=ip, name=node_name).encode())
+                fileobj.write(b"\n")
+                fileobj.write(self._etc_hosts)
+            self._hosts_files[key] = path
+        return path
+
+    def find_node(self, start: Node, node_name: str) -> Optional[IPIntf]:
+        """Return the interface of the node named node_name that start can
+        reach through the routers of the network, if any"""
+        if start.name == node_name:
+            return start.intf()
+        reachable = {self._domains.find(i.broadcast_domain)
+                     for i in realIntfList(start)
+                     if getattr(i, 'broadcast_domain', None) is not None}
+        node = self._nodes.get(node_name)
+        if node is None:
+            return None
+        for i in realIntfList(node):
+            if getattr(i, 'broadcast_domain', None) is not None \
+                    and self._domains.find(i.broadcast_domain) in reachable:
+                return i
+        return None
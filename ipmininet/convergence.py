@@ -0,0 +1,62 @@
+"""This module waits for the routing of a network to converge, i.e., for the
+routing tables of its routers to stop changing, instead of sleeping for a
+fixed amount of time."""
+import os
+import selectors
+import subprocess
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from mininet.log import lg as log
+from mininet.node import Node
+
+MONITOR_CMD = ['ip', '-j', 'monitor', 'route']
+
+
+def wait_converged(nodes: Iterable[Node], quiet_period=5., timeout=300.) \
+        -> Tuple[bool, Dict[str, Optional[float]]]:
+    """Wait until no routing table of the nodes changed for quiet_period
+
+    :param nodes: The nodes to monitor
+    :param quiet_period: The time without route change, in seconds, after
+                         which the routing is considered converged
+    :param timeout: The maximal time to wait, in seconds
+    :return: Whether the routing converged before the timeout, and the
+             time.time() of the last route change of each node, or None if
+             its routes did not change while waiting"""
+    last_change = {}  # type: Dict[str, Optional[float]]
+    monitors = []
+    selector = selectors.DefaultSelector()
+    start = time.monotonic()
+    try:
+        for n in nodes:
+            last_change[n.name] = None
+            p = n.popen(MONITOR_CMD, stdin=subprocess.DEVNULL,
+                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            monitors.append(p)
+            selector.register(p.stdout, selectors.EVENT_READ, n.name)
+        # The time of the last change over all nodes
+        quiet_since = start
+        while True:
+            now = time.monotonic()
+            if now - quiet_since >= quiet_period:
+                return True, last_change
+            if now - start >= timeout:
+                log.warning('*** The routes did not converge after %ss\n'
+                            % timeout)
+                return False, last_change
+            wait = min(quiet_period - (now - quiet_since),
+                       timeout - (now - start))
+            for key, _ in selector.select(max(wait, 0)):
+                if not os.read(key.fd, 65536):
+                    # The monitor is gone, e.g., the node was stopped
+                    selector.unregister(key.fileobj)
+                    continue
+                quiet_since = time.monotonic()
+                last_change[key.data] = time.time()
+    finally:
+        selector.close()
+        for p in monitors:
+            p.terminate()
+            p.wait()
+            p.stdout.close()
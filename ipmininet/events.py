@@ -0,0 +1,226 @@
+"""This module streams the route, link, address and neighbor events of the
+kernel of nodes. Each node runs an 'ip monitor' process, subscribed to the
+netlink multicast groups of its namespace, and a single reader thread
+watches all of them with epoll and dispatches their events."""
+import os
+import queue
+import re
+import selectors
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, \
+    Sequence
+
+from mininet.log import lg as log
+from mininet.node import Node
+
+ROUTE = 'route'
+LINK = 'link'
+ADDRESS = 'address'
+NEIGHBOR = 'neigh'
+KINDS = (ROUTE, LINK, ADDRESS, NEIGHBOR)
+
+# The labels printed by 'ip monitor label'
+_LABELS = {'ROUTE': ROUTE, 'LINK': LINK, 'ADDR': ADDRESS,
+           'NEIGH': NEIGHBOR}
+_LABEL = re.compile(r'^\[(\w+)\]\s*')
+_DEV = re.compile(r'\bdev (\S+)')
+_IFNAME = re.compile(r'^\d+: ([^:@\s]+)')
+
+
+class Event:
+    """A kernel event of a node"""
+
+    def __init__(self, node: str, kind: str, line: str, deleted=False,
+                 timestamp: Optional[float] = None):
+        """:param node: The node name
+        :param kind: One of ROUTE, LINK, ADDRESS or NEIGHBOR
+        :param line: The description of the object, as printed by ip
+        :param deleted: Whether the object was removed
+        :param timestamp: The time.time() at which the event was read"""
+        self.node = node
+        self.kind = kind
+        self.line = line
+        self.deleted = deleted
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    @classmethod
+    def parse(cls, node: str, line: str, timestamp: Optional[float] = None) \
+            -> Optional['Event']:
+        """Parse a line of 'ip monitor label'
+
+        :return: The event, or None if the line does not describe one"""
+        m = _LABEL.match(line)
+        kind = _LABELS.get(m.group(1)) if m else None
+        if kind is None:
+            return None
+        line = line[m.end():].strip()
+        deleted = line.startswith('Deleted ')
+        if deleted:
+            line = line[len('Deleted '):]
+        return cls(node, kind, line, deleted=deleted, timestamp=timestamp)
+
+    @property
+    def dev(self) -> Optional[str]:
+        """The name of the interface concerned by the event, if any"""
+        m = _DEV.search(self.line) or _IFNAME.match(self.line)
+        return m.group(1) if m else None
+
+    def __repr__(self):
+        return '%s %s %s%s: %s' % (self.timestamp, self.node, self.kind,
+                                   ' (deleted)' if self.deleted else '',
+                                   self.line)
+
+
+class _Monitor:
+    """The ip monitor process of a node in a stream"""
+
+    def __init__(self, stream: 'EventStream', node: Node):
+        self.stream = stream
+        self.node = node.name
+        self.process = node.popen(['ip', 'monitor', 'label']
+                                  + list(stream.kinds),
+                                  stdin=subprocess.DEVNULL,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL)
+        self.buffer = b''
+
+    def feed(self, data: bytes) -> List[Event]:
+        now = time.time()
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()
+        events = (Event.parse(self.node, line.decode(errors='replace'), now)
+                  for line in lines)
+        return [e for e in events if e is not None]
+
+    def close(self):
+        try:
+            self.process.terminate()
+        except OSError:
+            pass  # Process is already dead
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class _Reader:
+    """The thread reading the monitors of all streams"""
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def register(self, monitor: _Monitor):
+        with self._lock:
+            self._selector.register(monitor.process.stdout,
+                                    selectors.EVENT_READ, monitor)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='ipmininet-events',
+                                                daemon=True)
+                self._thread.start()
+
+    def unregister(self, monitor: _Monitor):
+        with self._lock:
+            try:
+                self._selector.unregister(monitor.process.stdout)
+            except (KeyError, ValueError):
+                pass  # Already gone
+
+    def _run(self):
+        while True:
+            # epoll picks up the monitors registered while waiting
+            for key, _ in self._selector.select(timeout=1):
+                monitor = key.data
+                with self._lock:
+                    if self._selector.get_map().get(key.fileobj) is not key:
+                        continue  # Unregistered meanwhile
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        self._selector.unregister(key.fileobj)
+                if not data:
+                    log.debug('*** The event monitor of %s stopped\n'
+                              % monitor.node)
+                    continue
+                for event in monitor.feed(data):
+                    monitor.stream.dispatch(event)
+
+
+_reader = _Reader()
+
+
+class EventStream:
+    """The kernel events of a set of nodes, delivered to callbacks and to
+    the iterators over the stream"""
+
+    def __init__(self, nodes: Iterable[Node], kinds: Sequence[str] = KINDS,
+                 callback: Optional[Callable[[Event], None]] = None,
+                 maxsize=4096):
+        """:param nodes: The nodes whose events are streamed
+        :param kinds: The kinds of events to stream
+        :param callback: A first callback, subscribed before any event
+        :param maxsize: The maximal number of events waiting to be iterated
+                        over, the next events are dropped"""
+        for k in kinds:
+            if k not in KINDS:
+                raise ValueError('Unknown event kind %s, expected one of %s'
+                                 % (k, ', '.join(KINDS)))
+        self.kinds = tuple(kinds)
+        self.dropped = 0
+        self._callbacks = []  # type: List[Callable[[Event], None]]
+        if callback is not None:
+            self._callbacks.append(callback)
+        self._queue = queue.Queue(maxsize)  # type: queue.Queue
+        self._monitors = {}  # type: Dict[str, _Monitor]
+        for n in nodes:
+            self._monitors[n.name] = _Monitor(self, n)
+            _reader.register(self._monitors[n.name])
+
+    def subscribe(self, callback: Callable[[Event], None]):
+        """Call callback with each event, from the reader thread"""
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Event], None]):
+        self._callbacks.remove(callback)
+
+    def dispatch(self, event: Event):
+        for cb in list(self._callbacks):
+            try:
+                cb(event)
+            except Exception as e:
+                log.error('*** Event callback %s failed: %s\n' % (cb, e))
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Return the next event
+
+        :param timeout: The maximal time to wait, None waits forever
+        :return: The event or None if the timeout expired"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __iter__(self) -> Iterator[Event]:
+        while self._monitors or not self._queue.empty():
+            event = self.get(timeout=.5)
+            if event is not None:
+                yield event
+
+    def close(self):
+        """Stop the monitors of the stream, the queued events can still be
+        iterated over"""
+        monitors, self._monitors = self._monitors, {}
+        for m in monitors.values():
+            _reader.unregister(m)
+            m.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
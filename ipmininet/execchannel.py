@@ -0,0 +1,149 @@
+"""This module provides a persistent execution channel to a node: a worker
+process started once in the namespaces of the node, which runs the
+commands that it receives concurrently and sends back their complete
+outputs and exit codes. Compared to Node.cmd(), commands do not go through
+the single interactive shell of the node and can overlap, and compared to
+Node.pexec(), no mnexec process is spawned per command.
+
+The commands and results are exchanged as pickled tuples over the pipes
+of the worker, which runs ipmininet.execworker."""
+import os
+import pickle
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+from mininet.log import lg as log
+from mininet.node import Node
+
+# The number of commands that a worker runs at the same time
+DEFAULT_WORKERS = 8
+# The script of the workers, which only depends on the standard library
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'execworker.py')
+
+# Results: (stdout, stderr, exit code)
+Result = Tuple[str, str, int]
+
+
+def _command(args: Sequence, shell=False) -> Tuple[Union[str, Sequence[str]],
+                                                     bool]:
+    """Normalize the arguments of a command as Node.popen() does"""
+    if len(args) == 1 and isinstance(args[0], (list, tuple)):
+        cmd = [str(a) for a in args[0]]
+    elif len(args) == 1 and isinstance(args[0], str):
+        cmd = args[0] if shell else args[0].split()
+    elif args:
+        cmd = [str(a) for a in args]
+    else:
+        raise ValueError('No command to execute')
+    if shell and not isinstance(cmd, str):
+        cmd = ' '.join(cmd)
+    return cmd, shell
+
+
+class ExecChannel:
+    """The execution channel of a node"""
+
+    def __init__(self, node: Node, workers=DEFAULT_WORKERS):
+        """:param node: The node in which the commands run
+        :param workers: The number of commands run at the same time"""
+        self.node = node
+        self._process = node.popen(
+            [sys.executable, '-I', WORKER, str(workers)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None)
+        self._next_id = 0
+        self._pending = {}  # type: Dict[int, Future]
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read,
+                                        name='ipmininet-exec-%s' % node.name,
+                                        daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed
+
+    @property
+    def pid(self) -> int:
+        """The pid of the worker"""
+        return self._process.pid
+
+    def _read(self):
+        try:
+            while True:
+                req_id, out, err, code = pickle.load(self._process.stdout)
+                with self._lock:
+                    future = self._pending.pop(req_id, None)
+                if future is not None:
+                    future.set_result((out.decode(errors='replace'),
+                                       err.decode(errors='replace'), code))
+        except (EOFError, OSError, pickle.UnpicklingError, ValueError) as e:
+            with self._lock:
+                was_closed = self._closed
+                self._closed = True
+                pending, self._pending = self._pending, {}
+            if not was_closed:
+                log.warning('*** The execution channel of %s stopped: %r\n'
+                            % (self.node.name, e))
+            for future in pending.values():
+                future.set_exception(OSError('The execution channel of %s '
+                                             'stopped' % self.node.name))
+
+    def submit(self, *args, shell=False, input: Optional[str] = None,
+               merge_stderr=False) -> 'Future[Result]':
+        """Start a command without waiting for its result
+
+        :param args: The command, as for Node.pexec()
+        :param shell: Whether to run the command through a shell
+        :param input: The data to write on the standard input of the command
+        :param merge_stderr: Whether to send the standard error of the
+                             command to its standard output
+        :return: The future (stdout, stderr, exit code) of the command"""
+        cmd, shell = _command(args, shell=shell)
+        future = Future()  # type: Future
+        with self._lock:
+            if self._closed:
+                raise OSError('The execution channel of %s is closed'
+                              % self.node.name)
+            self._next_id += 1
+            req_id = self._next_id
+            self._pending[req_id] = future
+            try:
+                pickle.dump((req_id, cmd, shell,
+                             None if input is None else input.encode(),
+                             os.getcwd(), merge_stderr),
+                            self._process.stdin)
+                self._process.stdin.flush()
+            except (OSError, ValueError) as e:
+                del self._pending[req_id]
+                raise OSError('Cannot send a command to %s: %s'
+                              % (self.node.name, e))
+        return future
+
+    def pexec(self, *args, **kwargs) -> Result:
+        """Run a command and return (stdout, stderr, exit code), see
+        submit() for the parameters"""
+        return self.submit(*args, **kwargs).result()
+
+    def cmd(self, *args) -> str:
+        """Run a command through a shell and return its merged stdout and
+        stderr, as Node.cmd() does"""
+        return self.pexec(*args, shell=True, merge_stderr=True)[0]
+
+    def close(self):
+        """Stop the worker once the pending commands are done"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+        self._process.wait()
+        self._reader.join()
+        self._process.stdout.close()
@@ -0,0 +1,64 @@
+"""The worker side of an execution channel, see ipmininet.execchannel.
+
+This module is run as a script with python -I in the namespaces of a node.
+It only imports the standard library, to keep the memory of the workers,
+one per node, as low as possible."""
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+
+# Requests: (id, command, shell, input, cwd, merge stderr into stdout)
+# Replies: (id, stdout, stderr, exit code)
+
+
+def _execute(request):
+    req_id, cmd, shell, data, cwd, merge = request
+    try:
+        p = subprocess.run(cmd, shell=shell, input=data, cwd=cwd,
+                           stdin=None if data is not None
+                           else subprocess.DEVNULL,
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.STDOUT if merge
+                           else subprocess.PIPE)
+        return req_id, p.stdout, p.stderr or b'', p.returncode
+    except OSError as e:
+        # As a shell reports a command that cannot be executed
+        return req_id, b'', str(e).encode(), 127
+
+
+def serve(workers):
+    """Execute the requests read on the standard input with that many
+    threads and write their results on the standard output"""
+    requests = sys.stdin.buffer
+    results = sys.stdout.buffer
+    pending = queue.Queue()
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            request = pending.get()
+            if request is None:
+                return
+            reply = _execute(request)
+            with lock:
+                pickle.dump(reply, results)
+                results.flush()
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    while True:
+        try:
+            pending.put(pickle.load(requests))
+        except EOFError:
+            break
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        t.join()
+
+
+if __name__ == '__main__':
+    serve(int(sys.argv[1]))
@@ -0,0 +1,143 @@
+"""This module takes snapshots of the forwarding tables of the nodes of a
+network, all nodes at once, and compares them. The routes are dumped in
+JSON by ip and read from pipes, not through the shells of the nodes."""
+import json
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from mininet.log import lg as log
+from mininet.node import Node
+
+# A next hop: (gateway, device), the gateway is empty for direct routes
+NextHop = Tuple[str, str]
+# A route: (next hops, protocol, metric, type)
+Route = Tuple[Tuple[NextHop, ...], str, int, str]
+# The routes of a prefix, sorted
+Routes = Tuple[Route, ...]
+Table = Dict[str, Routes]
+
+ROUTE_CMDS = {4: ['ip', '-j', '-4', 'route', 'show'],
+              6: ['ip', '-j', '-6', 'route', 'show']}
+_HOST_PREFIXLEN = {4: '/32', 6: '/128'}
+_DEFAULT = {4: '0.0.0.0/0', 6: '::/0'}
+
+
+def _route(entry: Dict) -> Tuple[str, Route]:
+    hops = entry.get('nexthops')
+    if hops:
+        nexthops = tuple(sorted((h.get('gateway', ''), h.get('dev', ''))
+                                for h in hops))
+    else:
+        nexthops = ((entry.get('gateway', ''), entry.get('dev', '')),)
+    return entry.get('dst', ''), (nexthops, entry.get('protocol', ''),
+                                  entry.get('metric', 0),
+                                  entry.get('type', 'unicast'))
+
+
+def parse_routes(out: str, family: int) -> Table:
+    """Parse the JSON output of ip route
+
+    :param out: The output
+    :param family: The IP version of the routes
+    :return: The routes of each prefix"""
+    table = {}  # type: Dict[str, List[Route]]
+    for entry in json.loads(out or '[]'):
+        dst, route = _route(entry)
+        if dst == 'default':
+            dst = _DEFAULT[family]
+        elif '/' not in dst:
+            dst += _HOST_PREFIXLEN[family]
+        table.setdefault(dst, []).append(route)
+    return {dst: tuple(sorted(routes)) for dst, routes in table.items()}
+
+
+class FibSnapshot:
+    """The forwarding tables of nodes at a given time"""
+
+    def __init__(self, tables: Optional[Dict[str, Dict[int, Table]]] = None,
+                 timestamp: Optional[float] = None):
+        """:param tables: The table of each IP version of each node
+        :param timestamp: The time.time() of the snapshot"""
+        self.tables = {} if tables is None else tables
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __getitem__(self, node: str) -> Dict[int, Table]:
+        return self.tables[node]
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.tables
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def routes(self, node: str, prefix: str) -> Routes:
+        """Return the routes of a node towards a prefix, if any"""
+        family = 6 if ':' in prefix else 4
+        return self.tables[node].get(family, {}).get(prefix, ())
+
+
+def _dump(node: Node, families: Iterable[int]) -> Dict[int, Table]:
+    processes = {f: node.popen(ROUTE_CMDS[f], stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               universal_newlines=True)
+                 for f in families}
+    tables = {}
+    for f, p in processes.items():
+        out, err = p.communicate()
+        if p.returncode:
+            raise ValueError('%s failed with code %s: %s'
+                             % (' '.join(ROUTE_CMDS[f]), p.returncode, err))
+        tables[f] = parse_routes(out, f)
+    return tables
+
+
+def fib_snapshot(nodes: Iterable[Node], families: Iterable[int] = (4, 6),
+                 max_workers: Optional[int] = None) -> FibSnapshot:
+    """Dump the forwarding tables of all the nodes concurrently
+
+    :param nodes: The nodes to dump
+    :param families: The IP versions to dump
+    :param max_workers: The maximal number of nodes dumped at the same time
+    :return: The snapshot, without the nodes that could not be dumped"""
+    families = tuple(families)
+    snapshot = FibSnapshot()
+    nodes = list(nodes)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_dump, n, families) for n in nodes]
+        for n, f in zip(nodes, futures):
+            try:
+                snapshot.tables[n.name] = f.result()
+            except Exception as e:
+                log.error('*** Cannot dump the routes of %s: %s\n'
+                          % (n.name, e))
+    return snapshot
+
+
+def diff(a: FibSnapshot, b: FibSnapshot) \
+        -> Dict[str, Dict[str, Tuple[Routes, Routes]]]:
+    """Compare two snapshots
+
+    :return: {node: {prefix: (routes in a, routes in b)}} for each prefix
+             whose routes changed, an empty tuple meaning no route. The nodes
+             missing from either snapshot are ignored."""
+    changes = {}  # type: Dict[str, Dict[str, Tuple[Routes, Routes]]]
+    for node in a.tables.keys() & b.tables.keys():
+        node_changes = {}  # type: Dict[str, Tuple[Routes, Routes]]
+        for family in a[node].keys() | b[node].keys():
+            old = a[node].get(family, {})  # type: Mapping[str, Routes]
+            new = b[node].get(family, {})  # type: Mapping[str, Routes]
+            if old == new:
+                continue
+            for prefix in old.keys() | new.keys():
+                before = old.get(prefix, ())
+                after = new.get(prefix, ())
+                if before != after:
+                    node_changes[prefix] = (before, after)
+        if node_changes:
+            changes[node] = node_changes
+    return changes
@@ -8,6 +8,7 @@ from typing import List, Union, Sequence, Optional
 from mininet.log import lg
 
 from ipmininet.overlay import Overlay
+from ipmininet.router.config.readiness import ListeningPortProbe
 from ipmininet.router.config.utils import ConfigDict
 from ipmininet.utils import realIntfList, find_node, has_cmd
 from .base import HostDaemon
@@ -56,6 +57,14 @@ class Named(HostDaemon):
         return '{name} {cfg}' \
             .format(name='named-checkconf', cfg=self.cfg_filename)
 
+    def readiness_probe(self):
+        return ListeningPortProbe(self._node, self.options.dns_server_port)
+
+    def startup_dependencies(self):
+        # Slaves transfer their zones from the master at startup
+        return [zone.dns_master for zone in self._node.get('dns_zones', [])
+                if self._node.name in zone.dns_slaves]
+
     def build(self):
         cfg = super().build()
         cfg.log_severity = self.options.log_severity
@@ -1,29 +1,47 @@
 """IPNet: The Mininet that plays nice with IP networks.
 This modules will auto-generate all needed configuration properties if
 unspecified by the user"""
+import asyncio
+import functools
+import logging
 import math
-from operator import attrgetter, methodcaller
-from typing import Union, List, Optional, Type, Iterable, Mapping, Tuple, \
-    Iterator, Dict, Set
+import sys
+from operator import methodcaller
+from typing import Callable, Union, List, Optional, Type, Iterable, \
+    Iterator, Dict, Set, Tuple, Sequence, TYPE_CHECKING
 
 from ipaddress import ip_network, ip_interface, IPv4Address, IPv6Address, \
     IPv4Network, IPv6Network, IPv4Interface, IPv6Interface
 
 from . import MIN_IGP_METRIC, OSPF_DEFAULT_AREA
-from .utils import otherIntf, realIntfList, L3Router, address_pair, has_cmd, \
-    is_subnet_of
+from .utils import otherIntf, realIntfList, L3Router, address_pair, \
+    DisjointSet
 from .host import IPHost
-from .router import Router
+from .router import IPNode, Router
 from .router.config import BasicRouterConfig, RouterConfig
-from .link import IPIntf, IPLink, PhysicalInterface
+from .router.config.bgp import IGPDistanceCache
+from .link import IPIntf, IPLink, PhysicalInterface, IPBatch, \
+    refresh_addresses
 from .ipswitch import IPSwitch
-
+from .scheduler import StartupScheduler
+from .allocator import SubnetAllocator, RouterIdAllocator
+from .cgroup import Cgroup, network_cgroup
+from .compiler import compile_configs, Manifest
+from .components import ComponentIndex
+from .convergence import wait_converged
+from .events import Event, EventStream, KINDS
+from .fib import FibSnapshot, fib_snapshot
+from .lpm import AddressIndex
+from .validation import validate_configs, DryRun
+from .reachability import ReachabilityMatrix, Target, probe_all
+
+import mininet.clean
 from mininet.net import Mininet
 from mininet.node import Host, Controller, Node
 from mininet.log import lg as log
 
-# ping6 is not provided by default on newer systems
-PING6_CMD = 'ping6' if has_cmd('ping6') else 'ping -6'
+if TYPE_CHECKING:
+    from .planner import AddressPlan, PlanCache
 
 
 class IPNet(Mininet):
@@ -45,6 +63,10 @@ class IPNet(Mininet):
                  intf: Type[IPIntf] = IPIntf,
                  switch: Type[IPSwitch] = IPSwitch,
                  controller: Optional[Type[Controller]] = None,
+                 max_workers: Optional[int] = None,
+                 plan_cache: Optional[str] = None,
+                 compile_workers: Optional[int] = None,
+                 exec_channel=True,
                  *args, **kwargs):
         """Extends Mininet by adding IP-related ivars/functions and
         configuration knobs.
@@ -60,12 +82,26 @@ class IPNet(Mininet):
         :param max_v6_prefixlen: Maximal IPv6 prefixlen to auto-allocate
         :param allocate_IPs: whether to auto-allocate subnets in the network
         :param igp_metric: The default IGP metric for the links
-        :param igp_area: The default IGP area for the links"""
+        :param igp_area: The default IGP area for the links
+        :param max_workers: The maximal number of nodes to start at the same
+                            time, None picks a default based on the number of
+                            CPUs and 1 starts them one after the other
+        :param plan_cache: A directory where the address plans and router ids
+                           are cached, keyed by a fingerprint of the topology.
+                           A later run of the same topology then skips the
+                           address allocation.
+        :param compile_workers: The number of processes compiling the node
+                                configurations before starting them, None
+                                uses all CPUs and 1 compiles them in the
+                                current process
+        :param exec_channel: Whether the routers and hosts run their commands
+                             through a persistent worker process each, see
+                             ipmininet.execchannel"""
         self.router = router
         self.config = config
         self.routers = []  # type: List[Router]
-        # We need this to be able to do inverse-lookups
-        self._ip_allocs = {}  # type: Dict[str, Node]
+        # The addresses of all interfaces, for the inverse-lookups
+        self.address_index = AddressIndex()
         self.max_v4_prefixlen = max_v4_prefixlen
         self._unallocated_ipbase = [ip_network(ipBase)]
         self.use_v4 = use_v4
@@ -78,6 +114,20 @@ class IPNet(Mininet):
         self.igp_area = igp_area
         self.allocate_IPs = allocate_IPs
         self.physical_interface = {}  # type: Dict[IPIntf, Node]
+        self.max_workers = max_workers
+        self.compile_workers = compile_workers
+        self.exec_channel = exec_channel
+        self.routerid_allocator = None  # type: Optional[RouterIdAllocator]
+        self.igp_distances = None  # type: Optional[IGPDistanceCache]
+        self.components = None  # type: Optional[ComponentIndex]
+        # The cgroup of the processes of all nodes
+        self.cgroup = None  # type: Optional[Cgroup]
+        # The pending ip commands of each node, while the network is built
+        self._ip_batches = None  # type: Optional[Dict[str, IPBatch]]
+        self.plan_cache = plan_cache
+        self._plan = None  # type: Optional[AddressPlan]
+        self._plan_fingerprint = None  # type: Optional[str]
+        self._plan_cached = False
         super().__init__(ipBase=ipBase, host=host, switch=switch, link=link,
                          intf=intf, controller=controller, *args, **kwargs)
 
@@ -87,7 +137,7 @@ class IPNet(Mininet):
         :param name: the node name
         :param cls: the class to use to instantiate it"""
         defaults = {'use_v4': self.use_v4, 'use_v6': self.use_v6,
-                    'config': self.config}
+                    'config': self.config, 'exec_channel': self.exec_channel}
         defaults.update(params)
         if not cls:
             cls = self.router
@@ -156,7 +206,53 @@ class IPNet(Mininet):
                 # Only iff not already specified
                 if k not in p:
                     p[k] = v
-        return super().addLink(node1=node1, node2=node2, *args, **params)
+        if self._ip_batches is not None:
+            for n in (node1, node2):
+                self._ip_batch(self[n] if isinstance(n, str) else n)
+        link = super().addLink(node1=node1, node2=node2, *args, **params)
+        if self.built:
+            # The interfaces of the network are indexed once it is built
+            self._watch_addresses(link.intf1.node, link.intf2.node)
+        return link
+
+    def _ip_batch(self, node: Node) -> IPBatch:
+        """Return the batch of ip commands of a node, creating it if needed.
+        The interfaces of the node queue their commands in this batch until
+        it is flushed."""
+        try:
+            return self._ip_batches[node.name]
+        except KeyError:
+            batch = self._ip_batches[node.name] = node.ip_batch = \
+                IPBatch(node)
+            return batch
+
+    def _close_ip_batch(self, node: Node):
+        """Run the pending ip commands of a node, refresh the addresses of
+        its interfaces and stop batching its next commands"""
+        batch = self._ip_batches.pop(node.name, None)
+        if batch is None:
+            return
+        node.ip_batch = None
+        if len(batch):
+            batch.flush()
+            refresh_addresses(node)
+
+    def _flush_ip_batches(self):
+        """Run the pending ip commands, with one invocation per node"""
+        if self._ip_batches is None:
+            return
+        for name in list(self._ip_batches):
+            self._close_ip_batch(self[name])
+        self._ip_batches = None
+
+    def configHosts(self):
+        # The addresses of the hosts with an explicit default route must be
+        # set before the route is added
+        if self._ip_batches is not None:
+            for h in self.hosts:
+                if h.params.get('defaultRoute'):
+                    self._close_ip_batch(h)
+        super().configHosts()
 
     def addHost(self, name: str, **params) -> IPHost:
         """Prevent Mininet from forcing the allocation of IPv4 addresses
@@ -164,52 +260,206 @@ class IPNet(Mininet):
            IPNet."""
         if 'ip' not in params:
             params['ip'] = None
+        params.setdefault('exec_channel', self.exec_channel)
         return super().addHost(name, **params)
 
     def node_for_ip(self, ip: Union[str, IPv4Address, IPv6Address]) -> Node:
         """Return the node owning a given IP address
 
+        :param ip: an IP address, optionally with its prefix length
+        :return: the node
+        :raise KeyError: if no interface has this address"""
+        intf = self.intf_for_ip(ip)
+        if intf is None:
+            raise KeyError(str(ip))
+        return intf.node
+
+    def intf_for_ip(self, ip: Union[str, IPv4Address, IPv6Address]) \
+            -> Optional[IPIntf]:
+        """Return the interface owning a given IP address, if any
+
+        :param ip: an IP address, optionally with its prefix length"""
+        return self.address_index.intf_for_ip(ip)
+
+    def node_for_prefix(self, prefix: Union[str, IPv4Network, IPv6Network]) \
+            -> List[Node]:
+        """Return the nodes with an address in a given prefix
+
+        :param prefix: the IP prefix, e.g., the subnet of a LAN"""
+        nodes = {i.node.name: i.node
+                 for i in self.address_index.intfs_for_prefix(prefix)}
+        return [nodes[name] for name in sorted(nodes)]
+
+    def lpm(self, ip: Union[str, IPv4Address, IPv6Address]) \
+            -> Optional[Tuple[Union[IPv4Network, IPv6Network], List[IPIntf]]]:
+        """Return the longest prefix of the network containing an address,
+        and the interfaces with an address in that prefix
+
         :param ip: an IP address
-        :return: a node name"""
-        return self._ip_allocs[str(ip)]
+        :return: (prefix, interfaces) or None if no prefix matches"""
+        return self.address_index.lpm(ip)
+
+    def _watch_addresses(self, *nodes: Node):
+        """Index the addresses of the interfaces of the nodes and follow
+        their changes"""
+        for n in nodes:
+            for i in n.intfList():
+                if isinstance(i, IPIntf):
+                    self.address_index.watch(i)
 
     def start(self):
         super().start()
-        log.info('*** Starting, ', len(self.routers), 'routers\n')
-        for router in self.routers:
-            log.info(router.name + ' ')
-            router.start()
-        log.info('*** Starting, ', len(self.hosts), 'hosts\n')
-        for host in self.hosts:
-            log.info(host.name + ' ')
-            host.start()
+        log.info('*** Checking the configurations of', len(self.routers),
+                 'routers and', len(self.hosts), 'hosts\n')
+        failures = self.validate_configs()
+        if failures:
+            for results in failures.values():
+                for r in results:
+                    log.error('*** %s\n' % r)
+            log.error('Some configurations are invalid, aborting!\n')
+            mininet.clean.cleanup()
+            sys.exit(1)
+        log.info('*** Starting', len(self.routers), 'routers and',
+                 len(self.hosts), 'hosts\n')
+        scheduler = StartupScheduler(max_workers=self.max_workers)
+        for n in self.routers + self.hosts:
+            scheduler.add(n, after=self._startup_dependencies(n))
+        failures = scheduler.run()
         log.info('\n')
+        if failures:
+            for name, err in failures.items():
+                log.error('*** Could not start %s: %s\n' % (name, err))
+            log.error('Some nodes failed to start, aborting!\n')
+            mininet.clean.cleanup()
+            sys.exit(1)
         log.info('*** Setting default host routes\n')
         for h in self.hosts:
             if 'defaultRoute' in h.params:
                 continue  # Skipping hosts with explicit default route
             default = False
+            batch = IPBatch(h)
             # The first router we find will become the default gateway
             for itf in realIntfList(h):
                 for r in itf.broadcast_domain.routers:
                     log.info('%s via %s, ' % (h.name, r.name))
                     if self.use_v4 and h.use_v4 and len(r.addresses[4]) > 0:
-                        h.setDefaultRoute('via %s' % r.ip)
+                        batch.add('route', 'replace', 'default', 'via', r.ip)
                         default = True
                     if (self.use_v6 and h.use_v6 and len(r.addresses[6]) > 0 and
                             len(r.ra_prefixes)) == 0:
                         # We define a default route only if router xi
                         # advertisement are not activated. If we call the same
                         # function, the route created above might be deleted
-                        h.cmd('ip route add default dev %s via %s' % (
-                            h.defaultIntf(), r.ip6))
+                        batch.add('route', 'replace', 'default', 'dev',
+                                  str(h.defaultIntf()), 'via', r.ip6)
                         default = True
                     break
                 if default:
                     break
+            batch.flush()
             if not default:
                 log.info('skipping %s , ' % h.name)
         log.info('\n')
+        self._store_address_plan()
+        # The addresses may change before the routers are built again
+        for r in self.routers:
+            r.nconfig.planned_routerid = None
+
+    def compile_configs(self, directory: Optional[str] = None,
+                        processes: Optional[int] = None) -> Manifest:
+        """Compile the configuration files of all routers and hosts in
+        parallel. The nodes use them when they start.
+
+        :param directory: Where to store the compiled files and their
+                          manifest, None writes them where the daemons
+                          expect them
+        :param processes: The number of worker processes, None uses all CPUs
+        :return: The manifest of the compiled files"""
+        self._share_network_state()
+        return compile_configs(self.routers + self.hosts, directory=directory,
+                               processes=processes)
+
+    def _share_network_state(self):
+        """Give all routers the same router id allocator, which knows the
+        router ids that they already use, and the same IGP distance cache.
+        Give all routers and hosts the same component index, and the cgroup
+        of the network under which they place their processes."""
+        self.components = ComponentIndex(self.values(),
+                                         self.broadcast_domains or ())
+        if self.cgroup is None:
+            self.cgroup = network_cgroup()
+        for n in self.routers + self.hosts:
+            n.components = self.components
+            n.network_cgroup = self.cgroup
+        self.routerid_allocator = RouterIdAllocator()
+        self.igp_distances = IGPDistanceCache()
+        configs = [r.nconfig for r in self.routers
+                   if isinstance(r.nconfig, RouterConfig)]
+        for c in configs:
+            self.routerid_allocator.reserve(*c.known_routerids())
+        for c in configs:
+            c.routerid_allocator = self.routerid_allocator
+            c.igp_distances = self.igp_distances
+
+    def validate_configs(self) -> Dict[str, List[DryRun]]:
+        """Compile the configurations of all routers and hosts, then check
+        them concurrently with the dry runs of their daemons. No daemon is
+        started.
+
+        :return: The failed dry runs of each node with at least one failure"""
+        manifest = self.compile_configs(processes=self.compile_workers)
+        return validate_configs((n for n in self.routers + self.hosts
+                                 if n.name in manifest),
+                                max_workers=self.max_workers)
+
+    def wait_converged(self, quiet_period=5., timeout=300.,
+                       nodes: Optional[List[Node]] = None) \
+            -> Tuple[bool, Dict[str, Optional[float]]]:
+        """Wait until no routing table changed for quiet_period seconds
+
+        :param quiet_period: The time without route change, in seconds
+        :param timeout: The maximal time to wait, in seconds
+        :param nodes: The nodes to monitor, None monitors all routers
+        :return: Whether the routing converged before the timeout, and the
+                 time of the last route change of each node, if any"""
+        return wait_converged(self.routers if nodes is None else nodes,
+                              quiet_period=quiet_period, timeout=timeout)
+
+    def event_stream(self, nodes: Optional[List[Node]] = None,
+                     kinds: Sequence[str] = KINDS,
+                     callback: Optional[Callable[[Event], None]] = None) \
+            -> EventStream:
+        """Stream the kernel events of several nodes at once, until the
+        stream is closed
+
+        :param nodes: The nodes to monitor, None monitors all routers and
+                      hosts
+        :param kinds: The kinds of events, see ipmininet.events
+        :param callback: A function called with each event"""
+        return EventStream(self.routers + self.hosts if nodes is None
+                           else nodes, kinds=kinds, callback=callback)
+
+    def fib_snapshot(self, nodes: Optional[List[Node]] = None) -> FibSnapshot:
+        """Dump the forwarding tables of the nodes concurrently, see
+        ipmininet.fib.diff() to compare two snapshots
+
+        :param nodes: The nodes to dump, None dumps all routers"""
+        families = [f for f, used in ((4, self.use_v4), (6, self.use_v6))
+                    if used]
+        return fib_snapshot(self.routers if nodes is None else nodes,
+                            families=families, max_workers=self.max_workers)
+
+    @staticmethod
+    def _startup_dependencies(node: Node) -> Set[str]:
+        """Return the names of the nodes that must be started before the
+        given one, either explicitly through its 'start_after' parameter or
+        as required by its daemons"""
+        deps = set(node.params.get('start_after', ()))
+        try:
+            deps.update(node.nconfig.startup_dependencies())
+        except AttributeError:
+            pass  # Not an IPNode
+        return deps
 
     def stop(self):
         log.info('*** Stopping', len(self.routers), 'routers\n')
@@ -218,14 +468,54 @@ class IPNet(Mininet):
             router.terminate()
         log.info('\n')
         super().stop()
+        if self.cgroup is not None:
+            self.cgroup.kill()
+            self.cgroup = None
+
+    async def astart(self):
+        """Start the network without blocking the event loop"""
+        await asyncio.get_running_loop().run_in_executor(None, self.start)
+
+    async def astop(self):
+        """Stop the network without blocking the event loop"""
+        await asyncio.get_running_loop().run_in_executor(None, self.stop)
+
+    async def gather_cmd(self, nodes: Optional[Iterable[Node]], *args,
+                         limit: Optional[int] = None) -> Dict[str, str]:
+        """Run a command on many nodes at once
+
+        :param nodes: The nodes, None runs it on all routers and hosts
+        :param args: The command, as for Node.cmd()
+        :param limit: The maximal number of commands in flight, None does
+                      not limit them
+        :return: The output of the command on each node"""
+        if nodes is None:
+            nodes = self.routers + self.hosts
+        semaphore = asyncio.Semaphore(limit) if limit else None
+
+        async def run(node: Node) -> str:
+            if semaphore is not None:
+                async with semaphore:
+                    return await _acmd(node, *args)
+            return await _acmd(node, *args)
+
+        nodes = list(nodes)
+        outputs = await asyncio.gather(*(run(n) for n in nodes))
+        return {n.name: out for n, out in zip(nodes, outputs)}
 
     def build(self):
-        super().build()
-        self.broadcast_domains = self._broadcast_domains()
-        log.info("*** Found", len(self.broadcast_domains),
-                 "broadcast domains\n")
-        if self.allocate_IPs:
-            self._allocate_IPs()
+        # Queue the ip commands of the interfaces and of the address
+        # allocation to run them with a single command per node
+        self._ip_batches = {}
+        try:
+            super().build()
+            self.broadcast_domains = self._broadcast_domains()
+            log.info("*** Found", len(self.broadcast_domains),
+                     "broadcast domains\n")
+            if self.allocate_IPs:
+                self._allocate_IPs()
+        finally:
+            self._flush_ip_batches()
         # Physical interfaces are their own broadcast domain
         for itf_name, n in self.physical_interface.items():
             try:
@@ -235,6 +525,7 @@ class IPNet(Mininet):
                 self.broadcast_domains.append(BroadcastDomain(itf))
             except KeyError:
                 log.error('!!! Node', n, 'not found!\n')
+        self._watch_addresses(*self.values())
         try:
             self.topo.post_build(self)
         except AttributeError as e:
@@ -259,20 +550,134 @@ class IPNet(Mininet):
     def _allocate_IPs(self):
         """Allocate IP addresses on every interface in every broadcast
         domain"""
+        plan = self._load_address_plan()
+        if plan is None:
+            plan = self._address_plan()
+        else:
+            log.info("*** Using the cached address plan\n")
+        self._plan = plan
+        if plan is not None:
+            self._apply_address_plan(plan)
+            for r in self.routers:
+                r.nconfig.planned_routerid = plan.routerids.get(r.name)
         if self.use_v4:
             self._allocate_ipv4()
         if self.use_v6:
             self._allocate_ipv6()
 
+    def _plan_cache(self) -> Optional['PlanCache']:
+        if self.plan_cache is None or self.topo is None:
+            return None
+        # Prevent circular imports
+        from .planner import PlanCache, topology_fingerprint
+        if self._plan_fingerprint is None:
+            self._plan_fingerprint = topology_fingerprint(
+                self.topo, use_v4=self.use_v4, ipBase=self.ipBase,
+                max_v4_prefixlen=self.max_v4_prefixlen, use_v6=self.use_v6,
+                ip6Base=self.ip6Base, max_v6_prefixlen=self.max_v6_prefixlen)
+        return PlanCache(self.plan_cache)
+
+    def _load_address_plan(self) -> Optional['AddressPlan']:
+        """Return the cached address plan of the topology, if any"""
+        cache = self._plan_cache()
+        if cache is None:
+            return None
+        plan = cache.load(self._plan_fingerprint)
+        self._plan_cached = plan is not None
+        return plan
+
+    def _store_address_plan(self):
+        """Cache the address plan of the topology with the router ids
+        computed when the routers started"""
+        cache = self._plan_cache()
+        if cache is None or self._plan is None:
+            return
+        routerids = {r.name: str(r.nconfig.routerid) for r in self.routers
+                     if r.nconfig.routerid}
+        if self._plan_cached and routerids == self._plan.routerids:
+            return
+        self._plan.routerids = routerids
+        cache.store(self._plan_fingerprint, self._plan)
+        self._plan_cached = True
+
+    def _address_plan(self) -> Optional['AddressPlan']:
+        """Compute the address plan of the topology, if any"""
+        if self.topo is None:
+            return None
+        from .planner import AddressPlanner  # Prevent circular imports
+        planner = AddressPlanner(self.topo, use_v4=self.use_v4,
+                                 ipBase=self.ipBase,
+                                 max_v4_prefixlen=self.max_v4_prefixlen,
+                                 use_v6=self.use_v6, ip6Base=self.ip6Base,
+                                 max_v6_prefixlen=self.max_v6_prefixlen)
+        try:
+            return planner.plan()
+        except ValueError as e:
+            log.warning('*** Cannot plan the addresses of the topology (%s),'
+                        ' allocating them one broadcast domain at a time\n'
+                        % e)
+            return None
+
+    def _apply_address_plan(self, plan: 'AddressPlan'):
+        """Set the planned subnets and addresses on the broadcast domains
+        matching the plan. The other domains are left for the regular
+        allocation."""
+        log.info("*** Applying the address plan\n")
+        for domain in self.broadcast_domains:
+            planned = self._planned_domain(plan, domain)
+            if planned is None:
+                continue
+            domain.net, domain.net6 = planned.net, planned.net6
+            domain._allocated_v4 = planned._allocated_v4
+            domain._allocated_v6 = planned._allocated_v6
+            for intf in domain:
+                planned_intf = plan.interface(intf.node.name, intf.name)
+                ips = []  # type: List[Union[IPv4Interface, IPv6Interface]]
+                if self.use_v4 and intf.node.use_v4 \
+                        and next(intf.ips(), None) is None:
+                    ips.extend(planned_intf.addresses[4])
+                if self.use_v6 and intf.node.use_v6 \
+                        and next(intf.ip6s(exclude_lls=True), None) is None:
+                    ips.extend(planned_intf.addresses[6])
+                if ips:
+                    intf.setIP(ips)
+        self._unallocated_ipbase = plan.unallocated_ipbase
+        self._unallocated_ip6base = plan.unallocated_ip6base
+
+    @staticmethod
+    def _planned_domain(plan: 'AddressPlan', domain: 'BroadcastDomain') \
+            -> Optional['BroadcastDomain']:
+        """Return the planned domain with the same interfaces and pre-fixed
+        subnets as the given one, if any"""
+        planned = None
+        for intf in domain:
+            planned_intf = plan.interface(intf.node.name, intf.name)
+            if planned_intf is None or (
+                    planned is not None
+                    and planned_intf.broadcast_domain is not planned):
+                return None
+            planned = planned_intf.broadcast_domain
+        if planned is None \
+                or len(planned.interfaces) != len(domain.interfaces) \
+                or set(planned.fixed_net4s) != set(domain.fixed_net4s) \
+                or set(planned.fixed_net6s) != set(domain.fixed_net6s):
+            return None
+        return planned
+
     def _allocate_ipv4(self):
         log.info("*** Allocating IPv4 addresses\n")
+        # Planned domains already have their subnet
+        allocated = self._allocated_ipv4_subnets()
+        allocated.extend(d.net for d in self.broadcast_domains
+                         if d.net is not None)
         self._allocate_subnets(self._unallocated_ipbase,
-                               self.broadcast_domains,
+                               [d for d in self.broadcast_domains
+                                if d.net is None],
                                domainlen='len_v4',
                                net_key='net',
                                size_key='max_v4prefixlen',
                                max_prefixlen=self.max_v4_prefixlen,
-                               allocated_subnets=self._allocated_ipv4_subnets())
+                               allocated_subnets=allocated)
         for domain in self.broadcast_domains:
             if not domain.use_ip_version(4):
                 continue
@@ -282,19 +687,21 @@ class IPNet(Mininet):
                     ips = tuple(domain.next_ipv4()
                                 for _ in range(intf.interface_width[0]))
                     intf.setIP(ips)
-                for ip in intf.ips():
-                    self._ip_allocs[ip.with_prefixlen] = intf.node
-                    self._ip_allocs[ip.ip.compressed] = intf.node
 
     def _allocate_ipv6(self):
         log.info("*** Allocating IPv6 addresses\n")
+        # Planned domains already have their subnet
+        allocated = self._allocated_ipv6_subnets()
+        allocated.extend(d.net6 for d in self.broadcast_domains
+                         if d.net6 is not None)
         self._allocate_subnets(self._unallocated_ip6base,
-                               self.broadcast_domains,
+                               [d for d in self.broadcast_domains
+                                if d.net6 is None],
                                domainlen='len_v6',
                                net_key='net6',
                                size_key='max_v6prefixlen',
                                max_prefixlen=self.max_v6_prefixlen,
-                               allocated_subnets=self._allocated_ipv6_subnets())
+                               allocated_subnets=allocated)
         for domain in self.broadcast_domains:
             if not domain.use_ip_version(6):
                 continue
@@ -304,9 +711,6 @@ class IPNet(Mininet):
                     ips = tuple(domain.next_ipv6()
                                 for _ in range(intf.interface_width[1]))
                     intf.setIP6(ips)
-                for ip in intf.ip6s(exclude_lls=True):
-                    self._ip_allocs[ip.with_prefixlen] = intf.node
-                    self._ip_allocs[ip.ip.compressed] = intf.node
 
     @staticmethod
     def _allocate_subnets(subnets: List[Union[IPv4Network, IPv6Network]],
@@ -317,17 +721,15 @@ class IPNet(Mininet):
                                                             IPv6Network]] = ()):
         """Allocate subnets to broadcast domains.
 
-        We keep the subnets sorted as x < y wrt the available number of
-        addresses in the subnet so that the bigger domains
-        take the smallest subnets before subdividing them.
-        As the domains range from the biggest to the smallest, and the subnets
-        from the smallest to the biggest, the biggest domains will take the
-        first subnet that is able to contain it, and split it in several
-        subnets until it is restricted to its prefix.
-        The next domain then is necessarily of the same size (reuses on of the
-        split subnets) or smaller (uses a previously split subnet or splits a
-        bigger one). This avoids wasting of addresses (wrt. the specified
-        max_prefixlen) at the cost of a quadratic (?) behavior.
+        The domains range from the biggest to the smallest, and each of them
+        takes the smallest available subnet that is able to contain it.
+        This subnet is split in halves until it is restricted to the prefix
+        of the domain, keeping the left half each time (see
+        SubnetAllocator). The next domain then is necessarily of the same size
+        (reuses one of the split subnets) or smaller (uses a previously split
+        subnet or splits a bigger one). This avoids wasting of addresses (wrt.
+        the specified max_prefixlen), and each allocation is logarithmic in
+        the number of available subnets.
 
         :param subnets: a list of ip_network of available subnets. This list
                         will be modified to account for the new allocations.
@@ -341,108 +743,96 @@ class IPNet(Mininet):
         :param max_prefixlen: The maximal prefixlen that can be allocated,
                                 e.g. to not allocate /126 for IPv6 P2P links
         :param allocated_subnets: The subnets that are already allocated and
-                                  cannot be allocated to another domain
-        :return: iterator of (domain, subnet)"""
+                                  cannot be allocated to another domain"""
         _domainlen = methodcaller(domainlen)
         domains.sort(key=_domainlen, reverse=True)
-        _prefixlen = attrgetter('prefixlen')
-        subnets.sort(key=_prefixlen, reverse=True)
         ip_version = 4 if net_key == 'net' else 6
-        for d in domains:
-            if not d.use_ip_version(ip_version):
-                continue
-            if not subnets:
-                raise ValueError('No subnet left in the prefix space for all'
-                                 'broadcast domains.')
-            plen = min(max_prefixlen, getattr(d, size_key))
-            if plen < subnets[-1].prefixlen:
-                raise ValueError('Could not find a subnet big enough for a '
-                                 'broadcast domain.')
-            log.debug('Allocating prefix', plen, 'for interfaces',
-                      d.interfaces)
-            # Try to find a suitable subnet in the list
-            for i, net in enumerate(subnets):
-                nets = []
-                # if the subnet is too big for the prefix, perform a left
-                # expansion (only expand one at a time to keep subnets as
-                # aggregated as possible).
-                while plen > net.prefixlen:
-                    # Get list of subnets and append to list of previous
-                    # expanded subnets as it is bigger wrt. prefixlen
-                    net, next_net = tuple(net.subnets(prefixlen_diff=1))
-                    # If not a subnet of an allocated subnet
-                    if len(list(filter(lambda y: is_subnet_of(next_net, y),
-                                       allocated_subnets))) == 0:
-                        nets.append(next_net)
-                # Check if we have an appropriately-sized subnet
-                if plen == net.prefixlen:
-                    # If the network overlaps with an allocated subnet,
-                    # we pass it
-                    if len(list(filter(lambda y: is_subnet_of(net, y)
-                                                 or is_subnet_of(y, net),
-                                       allocated_subnets))) == 0:
-                        # Register the allocation
-                        setattr(d, net_key, net)
-                    # Delete the expanded/used subnet
-                    del subnets[i]
-                    # Insert the created subnets if any
-                    subnets.extend(nets)
-                    # Sort the array again
-                    subnets.sort(key=_prefixlen, reverse=True)
-                    # Proceed to the next broadcast domain
-                    break
-                # Otherwise try the next network for the current domain
+        allocator = SubnetAllocator(subnets, allocated_subnets)
+        debug = log.isEnabledFor(logging.DEBUG)
+        try:
+            for d in domains:
+                if not d.use_ip_version(ip_version):
+                    continue
+                if not allocator.has_free():
+                    raise ValueError('No subnet left in the prefix space for '
+                                     'all broadcast domains.')
+                plen = min(max_prefixlen, getattr(d, size_key))
+                if debug:
+                    log.debug('Allocating prefix', plen, 'for interfaces',
+                              d.interfaces)
+                net = allocator.allocate(plen)
+                if net is None:
+                    raise ValueError('Could not find a subnet big enough for '
+                                     'a broadcast domain.')
+                # Register the allocation
+                setattr(d, net_key, net)
+        finally:
+            subnets[:] = allocator.free_subnets()
 
     def _broadcast_domains(self) -> List['BroadcastDomain']:
-        """Build the broadcast domains for this topology"""
+        """Build the broadcast domains for this topology.
+        The interfaces are grouped in a single pass with a union-find: the
+        two ends of a link are in the same domain, as well as all the
+        interfaces of a node that is not a domain boundary (e.g., a switch).
+        """
+        sets = DisjointSet()
+        interfaces = []  # type: List[IPIntf]
+        for n in self.values():
+            itfs = realIntfList(n)
+            if BroadcastDomain.is_domain_boundary(n):
+                interfaces.extend(itfs)
+            else:
+                for i in itfs[1:]:
+                    sets.union(itfs[0], i)
+            for i in itfs:
+                other = otherIntf(i)
+                if other is not None:
+                    sets.union(i, other)
+        interfaces.extend(r.intf('lo') for r in self.routers)
+        # Group the interfaces, in the order in which the domains were found
+        groups = {}  # type: Dict[IPIntf, List[IPIntf]]
+        for intf in interfaces:
+            groups.setdefault(sets.find(intf), []).append(intf)
         domains = []
-        interfaces = {intf: False
-                      for n in self.values()
-                      if BroadcastDomain.is_domain_boundary(n)
-                      for intf in realIntfList(n)}
-        interfaces.update({r.intf('lo'): False for r in self.routers})
-        for intf in interfaces.keys():
-            # the interface already belongs to a broadcast domain
-            if interfaces[intf]:
-                continue
-            # create a new domain and explore the interface
-            bd = BroadcastDomain(intf)
-            # Mark all explored interfaces belonging to that domain
-            for i in bd:
-                interfaces[i] = True
+        for itfs in groups.values():
+            bd = BroadcastDomain.from_interfaces(itfs)
+            for i in itfs:
                 i.broadcast_domain = bd
             domains.append(bd)
         return domains
 
-    def _ping_set(self, src: Node,
-                  dst_dict: Mapping[Node, Union[IPv4Address, IPv6Address, str]],
-                  timeout: Optional[str], v4=True) -> Tuple[int, int]:
-        """Do the actual ping to the dict of {dst: dst_ip} from src
-
-           :param src: origin of the ping
-           :param dst_dict: destinations {dst: dst_ip} of the ping
-           :param timeout: the time to wait for a response, as string
-           :param v4: whether IPv4 or IPv6 is used
-           :param return: a tuple (lost packets, sent packets)"""
-        if len(dst_dict) == 0:
-            return 0, 0
-        lost = 0
-        packets = 0
-        opts = ''
-        if timeout:
-            opts = '-W %s' % timeout
-
-        log.output("%s --%s--> " % (src.name, "IPv4" if v4 else "IPv6"))
-        for dst, dst_ip in dst_dict.items():
-            result = src.cmd('%s -c1 %s %s' % ("ping" if v4 else PING6_CMD,
-                                               opts, dst_ip))
-            sent, received = self._parsePing(result)
-            lost += sent - received
-            packets += sent
-            log.output("%s " % dst.name if received else "X ")
-        log.output('\n')
-
-        return lost, packets
+    def reachability(self, hosts: Optional[List[Node]] = None,
+                     timeout: Optional[str] = None, use_v4=True, use_v6=True,
+                     count=1, max_workers: Optional[int] = None) \
+            -> ReachabilityMatrix:
+        """Probe the reachability between all specified hosts, from all
+           sources at once. The destination addresses are chosen as in ping().
+
+           :param hosts: list of hosts or None if all must be probed
+           :param timeout: time to wait for a response, as string
+           :param use_v4: whether IPv4 addresses can be used
+           :param use_v6: whether IPv6 addresses can be used
+           :param count: the number of probes per destination address
+           :param max_workers: the maximal number of sources probing at the
+                               same time
+           :return: the loss and round-trip time per (src, dst, family)"""
+        host_list = self.hosts if hosts is None else hosts
+        targets = {}  # type: Dict[Node, List[Target]]
+        for src in host_list:
+            src_ip, src_ip6 = address_pair(src, use_v4, use_v6)
+            v4 = []  # type: List[Target]
+            v6 = []  # type: List[Target]
+            for dst in host_list:
+                if src != dst:
+                    dst_ip, dst_ip6 = address_pair(dst, src_ip is not None,
+                                                   src_ip6 is not None)
+                    if dst_ip is not None:
+                        v4.append((dst, 4, str(dst_ip)))
+                    if dst_ip6 is not None:
+                        v6.append((dst, 6, str(dst_ip6)))
+            targets[src] = v4 + v6
+        return probe_all(targets, timeout=timeout, count=count,
+                         max_workers=max_workers)
 
     def ping(self, hosts: Optional[List[Node]] = None,
              timeout: Optional[str] = None, use_v4=True, use_v6=True) -> float:
@@ -461,11 +851,9 @@ class IPNet(Mininet):
            :return: the packet loss percentage of IPv4 connectivity if
                     self.use_v4 is set the loss percentage of IPv6 connectivity
                     otherwise"""
-        packets = lost = 0
         host_list = self.hosts
         if hosts is not None:
             host_list = hosts
-        incompatible_hosts = {}  # type: Dict[str, Set[str]]
         if not use_v4 and not use_v6:
             log.output("*** Warning: Parameters forbid both IPv4 and IPv6 for "
                        "pings\n")
@@ -475,43 +863,37 @@ class IPNet(Mininet):
                    % ("IPv4" if use_v4 else "",
                       " and " if use_v4 and use_v6 else "",
                       "IPv6" if use_v6 else ""))
+        matrix = self.reachability(host_list, timeout=timeout, use_v4=use_v4,
+                                   use_v6=use_v6)
+
+        incompatible_hosts = {}  # type: Dict[str, Set[str]]
         for src in host_list:
-            src_ip, src_ip6 = address_pair(src, use_v4, use_v6)
-            ping_dict = {}
-            ping6_dict = {}
+            for family in (4, 6):
+                results = [matrix.get(src.name, dst.name, family)
+                           for dst in host_list]
+                results = [r for r in results if r is not None]
+                if not results:
+                    continue
+                log.output("%s --IPv%d--> " % (src.name, family))
+                for r in results:
+                    log.output("%s " % r.dst.name if r.received else "X ")
+                log.output('\n')
             for dst in host_list:
-                if src != dst:
-                    dst_ip, dst_ip6 = address_pair(dst, src_ip is not None,
-                                                   src_ip6 is not None)
-                    if dst_ip is not None:
-                        ping_dict[dst] = dst_ip
-                    if dst_ip6 is not None:
-                        ping6_dict[dst] = dst_ip6
-                    if (use_v4 and dst_ip is None and
-                            use_v6 and dst_ip6 is None):
-                        node1 = src if src.name <= dst.name else dst
-                        node2 = src if node1 != src else dst
-                        if node2.name not in incompatible_hosts.setdefault(
-                                node1.name, set()):
-                            incompatible_hosts[node1.name].add(node2.name)
-
-            result = self._ping_set(src, ping_dict, timeout, True)
-            lost += result[0]
-            packets += result[1]
-            result = self._ping_set(src, ping6_dict, timeout, False)
-            lost += result[0]
-            packets += result[1]
+                if src != dst and use_v4 and use_v6 \
+                        and matrix.get(src.name, dst.name, 4) is None \
+                        and matrix.get(src.name, dst.name, 6) is None:
+                    node1, node2 = sorted((src.name, dst.name))
+                    incompatible_hosts.setdefault(node1, set()).add(node2)
 
         for node1, incompatibilities in incompatible_hosts.items():
             for node2 in incompatibilities:
                 log.output("*** Warning: %s and %s have no global address "
                            "in the same IP version\n" % (node1, node2))
 
-        if packets > 0:
-            ploss = 100.0 * lost / packets
-            received = packets - lost
+        if matrix.sent > 0:
+            ploss = 100.0 * matrix.loss
             log.output("*** Results: %i%% dropped (%d/%d received)\n" %
-                       (ploss, received, packets))
+                       (ploss, matrix.received, matrix.sent))
         else:
             ploss = 0
             log.output("*** Warning: No packets sent\n")
@@ -550,6 +932,14 @@ class IPNet(Mininet):
         return self.pingPair(use_v4=False)
 
 
+async def _acmd(node: Node, *args) -> str:
+    """Run a command on any node without blocking the event loop"""
+    if isinstance(node, IPNode):
+        return await node.acmd(*args)
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(node.cmd, *args))
+
+
 class BroadcastDomain:
     """An IP broadcast domain in the network. This class stores the set of
     interfaces belonging to the same broadcast domain, as well as the
@@ -575,19 +965,31 @@ class BroadcastDomain:
             if not isinstance(interfaces, list):
                 interfaces = [interfaces]
             self.explore(interfaces)
-
-        # Retrieve pre-fixed subnets
-        self.fixed_net4s = []  # type: List[IPv4Network]
-        self.fixed_net6s = []  # type: List[IPv6Network]
+        self._collect_fixed_nets()
+
+    @classmethod
+    def from_interfaces(cls, interfaces: Iterable[IPIntf]) \
+            -> 'BroadcastDomain':
+        """Build a broadcast domain from the complete set of its interfaces,
+        without exploring the topology
+
+        :param interfaces: the interfaces of the domain"""
+        bd = cls()
+        bd.interfaces.update(interfaces)
+        bd._collect_fixed_nets()
+        return bd
+
+    def _collect_fixed_nets(self):
+        """Retrieve the subnets that are already set on the interfaces"""
+        fixed_net4s = {}  # type: Dict[IPv4Network, None]
+        fixed_net6s = {}  # type: Dict[IPv6Network, None]
         for i in self.interfaces:
             for ip in i.ips():
-                net = ip_interface(ip).network
-                if net not in self.fixed_net4s:
-                    self.fixed_net4s.append(net)
+                fixed_net4s[ip_interface(ip).network] = None
             for ip6 in i.ip6s(exclude_lls=True):
-                net6 = ip_interface(ip6).network
-                if net6 not in self.fixed_net6s:
-                    self.fixed_net6s.append(net6)
+                fixed_net6s[ip_interface(ip6).network] = None
+        self.fixed_net4s = list(fixed_net4s)  # type: List[IPv4Network]
+        self.fixed_net6s = list(fixed_net6s)  # type: List[IPv6Network]
 
     @staticmethod
     def is_domain_boundary(node: Node):
@@ -616,13 +1018,13 @@ class BroadcastDomain:
         to this broadcast domain
 
         :param itfs: a list of Intf"""
-        visited = []  # type: List[IPIntf]
+        visited = set()  # type: Set[IPIntf]
         while itfs:
             # Explore one element
             i = itfs.pop()
             if i in visited:
                 continue
-            visited.append(i)
+            visited.add(i)
             if self.is_domain_boundary(i.node):
                 self.interfaces.add(i)
             # check its corresponding interface
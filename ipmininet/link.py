@@ -3,12 +3,15 @@ enhance the TCIntf class from Mininet, and then define sane defaults for the lin
 classes."""
 from itertools import chain
 import subprocess
+from subprocess import PIPE
 from ipaddress import ip_interface, IPv4Interface, IPv6Interface
 import functools
-from typing import Union, Tuple, Optional, Generator, Sequence, List, Type
+from typing import Callable, Union, Tuple, Optional, Generator, Sequence, \
+    List, Type, Dict
 
 from . import OSPF_DEFAULT_AREA, MIN_IGP_METRIC
 from .utils import otherIntf, is_container
+from .netlink import interface_addresses
 
 import mininet.link as _m
 from mininet.log import lg as log
@@ -24,11 +27,30 @@ class IPIntf(_m.TCIntf):
         # by aliasing interfaces.
         self.broadcast_domain = None
         self.addresses = {4: [], 6: []}
+        # Called with (self, removed addresses, added addresses) whenever
+        # self.addresses changes
+        self.address_watchers = []  # type: List[Callable]
+        # Whether self.addresses may differ from the kernel state
+        self._addresses_stale = True
         self.ra_prefixes = kwargs.pop('ra', [])
         self.rdnss_list = kwargs.pop('rdnss', [])
         super().__init__(*args, **kwargs)
         self.isUp(setUp=True)
-        self._refresh_addresses()
+        if self._ip_batch is None:
+            self._refresh_addresses()
+
+    @property
+    def _ip_batch(self) -> Optional['IPBatch']:
+        """Return the batch in which the ip commands of this interface are
+        queued, or None if they are run immediately"""
+        return getattr(self.node, 'ip_batch', None)
+
+    def isUp(self, setUp=False) -> bool:
+        batch = self._ip_batch
+        if setUp and batch is not None:
+            batch.add('link', 'set', 'dev', self.name, 'up')
+            return True
+        return super().isUp(setUp=setUp)
 
     @property
     def igp_area(self) -> str:
@@ -151,9 +173,11 @@ class IPIntf(_m.TCIntf):
             return None
         setv4 = setv6 = False
         lb_v4_update = lb_v6_update = False
-        # Make sure we have an up-to-date view of our addresses
-        self._refresh_addresses()
-        cmds = []
+        batch = self._ip_batch
+        if batch is None and self._addresses_stale:
+            # Make sure we have an up-to-date view of our addresses
+            self._refresh_addresses()
+        new_addrs = []
         # We want to iterate over the new ip sets
         if not is_container(ip):
             ip = (ip,)
@@ -167,9 +191,7 @@ class IPIntf(_m.TCIntf):
                     # no prefixLen defaults to full /128 or /32
                     addr = ip_interface(str(addr))
 
-            # Prepare assignment commands
-            cmds.append('ip address add dev %s %s'
-                        % (self.name, addr.with_prefixlen))
+            new_addrs.append(addr)
             # Record assignment family
             if addr.version == 4:
                 setv4 = True
@@ -184,10 +206,26 @@ class IPIntf(_m.TCIntf):
         if setv6:
             cleanup.append(self.ip6s(exclude_lls=True,
                                      exclude_lbs=not lb_v6_update))
-        for old_ip in chain.from_iterable(cleanup):
+        removed = list(chain.from_iterable(cleanup))
+        for old_ip in removed:
             self._del_ip(old_ip)
+        if batch is not None:
+            # The addresses are only assigned when the batch is flushed,
+            # so we predict the outcome of the commands
+            for addr in new_addrs:
+                batch.add('address', 'add', 'dev', self.name,
+                          addr.with_prefixlen)
+            kept = {}
+            for v in (4, 6):
+                kept[v] = [a for a in self.addresses[v] if a not in removed]
+                kept[v].extend(a for a in new_addrs
+                               if a.version == v and a not in kept[v])
+            self._replace_addresses(kept[4], kept[6])
+            return None
         # Assign IP
-        rval = [self.cmd(cmd) for cmd in cmds]
+        rval = [self.cmd('ip address add dev %s %s'
+                         % (self.name, addr.with_prefixlen))
+                for addr in new_addrs]
         self._refresh_addresses()
         return rval.pop() if rval and len(rval) == 1 else rval
 
@@ -196,35 +234,104 @@ class IPIntf(_m.TCIntf):
         Does not update self.addresses!
 
         :param ip: ip_interface-like"""
-        self.cmd('ip', 'address', 'del', 'dev', self.name, ip.with_prefixlen)
+        batch = self._ip_batch
+        if batch is not None:
+            batch.add('address', 'del', 'dev', self.name, ip.with_prefixlen)
+        else:
+            self.cmd('ip', 'address', 'del', 'dev', self.name,
+                     ip.with_prefixlen)
+            self._addresses_stale = True
 
     setIP = setIP6 = _set_ip
 
     def _refresh_addresses(self):
         """Request and parse the addresses of this interface"""
-        self.mac, self.addresses[4], self.addresses[6] = \
-            _addresses_of(self.name, self.node)
+        self.mac, v4, v6 = _addresses_of(self.name, self.node)
+        self._replace_addresses(v4, v6)
+        self._addresses_stale = False
+
+    def _refresh_if_stale(self, missing=False):
+        """Refresh the addresses of this interface only if they may have
+        changed since the last refresh
+
+        :param missing: Also refresh them if the caller did not find the
+                        address it was looking for, as the kernel may have
+                        added it in the meantime (e.g., SLAAC)"""
+        if (self._addresses_stale or missing) and self._ip_batch is None:
+            self._refresh_addresses()
+
+    def invalidate_addresses(self):
+        """Force the next address lookup to query the kernel, e.g.,
+        after the addresses were changed without using this object"""
+        self._addresses_stale = True
+
+    def _set_addresses(self, mac: Optional[str], v4: List[IPv4Interface],
+                       v6: List[IPv6Interface]):
+        """Replace the view of the addresses of this interface"""
+        self.mac = mac
+        self._replace_addresses(v4, v6)
+        self._addresses_stale = False
+
+    def _replace_addresses(self, v4: Sequence[IPv4Interface],
+                           v6: Sequence[IPv6Interface]):
+        """Replace the addresses of this interface and notify the watchers
+        of the changes"""
+        old = self.addresses[4] + self.addresses[6]
+        self.addresses[4] = sorted(v4, key=address_sort_key, reverse=True)
+        self.addresses[6] = sorted(v6, key=address_sort_key, reverse=True)
+        if self.address_watchers:
+            new = self.addresses[4] + self.addresses[6]
+            removed = [a for a in old if a not in new]
+            added = [a for a in new if a not in old]
+            if removed or added:
+                for watcher in list(self.address_watchers):
+                    watcher(self, removed, added)
 
     def updateIP(self) -> Optional[str]:
-        self._refresh_addresses()
+        self._refresh_if_stale(missing=next(self.ips(), None) is None)
         return self.ip
 
     def updateIP6(self) -> Optional[str]:
-        self._refresh_addresses()
+        self._refresh_if_stale(
+            missing=next(self.ip6s(exclude_lls=True), None) is None)
         return self.ip6
 
     def updateMAC(self) -> Optional[str]:
-        self._refresh_addresses()
+        self._refresh_if_stale()
         return self.mac
 
     def updateAddr(self) -> Tuple[Optional[str], Optional[str]]:
-        self._refresh_addresses()
+        self._refresh_if_stale()
         return self.ip, self.mac
 
 
 def _addresses_of(devname: str, node: Optional[Node] = None):
     """Return the addresses of a named interface"""
-    cmdline = ['ip', 'address', 'show', 'dev', devname]
+    try:
+        mac, v4, v6 = _node_addresses(node)[devname]
+    except KeyError:
+        log.warning('Failed to find the addresses of %s!' % devname)
+        return None, (), ()
+    return (mac,
+            sorted(v4, key=address_sort_key, reverse=True),
+            sorted(v6, key=address_sort_key, reverse=True))
+
+
+def _node_addresses(node: Optional[Node] = None) \
+        -> Dict[str, Tuple[Optional[str], List[IPv4Interface],
+                           List[IPv6Interface]]]:
+    """Return the addresses of all the interfaces of a node, or of the root
+    namespace if node is None. They are read through netlink, and we fall
+    back on parsing the output of ip if this is not possible.
+
+    :return: {interface name: (mac, [ipv4], [ipv6])}"""
+    pid = node.pid if node is not None and node.inNamespace else None
+    try:
+        return interface_addresses(pid)
+    except OSError as e:
+        log.debug('Cannot read the addresses through netlink (%s), '
+                  'using ip instead\n' % e)
+    cmdline = ['ip', 'address', 'show']
     try:
         if node is not None:
             addrstr = node.cmd(*cmdline)
@@ -234,11 +341,8 @@ def _addresses_of(devname: str, node: Optional[Node] = None):
         addrstr = None
     if not addrstr:
         log.warning('Failed to run ip address!')
-        return None, (), ()
-    mac, v4, v6 = _parse_addresses(addrstr)
-    return (mac,
-            sorted(v4, key=OrderedAddress, reverse=True),
-            sorted(v6, key=OrderedAddress, reverse=True))
+        return {}
+    return _parse_node_addresses(addrstr)
 
 
 def _parse_addresses(out: str) -> Tuple[Optional[str], List[IPv4Interface],
@@ -269,6 +373,80 @@ def _parse_addresses(out: str) -> Tuple[Optional[str], List[IPv4Interface],
     return mac, v4, v6
 
 
+def _parse_node_addresses(out: str) \
+        -> Dict[str, Tuple[Optional[str], List[IPv4Interface],
+                           List[IPv6Interface]]]:
+    """Parse the output of an ip address command listing several interfaces
+    :return: {interface name: (mac, [ipv4], [ipv6])}"""
+    # 2: r1-eth0@if5: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 ...
+    #    link/ether 02:fc:00:00:00:01 brd ff:ff:ff:ff:ff:ff
+    #    inet 10.0.0.1/24 scope global r1-eth0
+    # ...
+    blocks = {}  # type: Dict[str, List[str]]
+    lines = []  # type: List[str]
+    for line in out.strip(' \n\t\r').split('\n'):
+        if line[:1].isdigit():
+            lines = []
+            try:
+                name = line.split(':', 2)[1].strip().split('@')[0]
+            except IndexError:
+                log.error('Malformed ip-address line:', line)
+                continue
+            blocks[name] = lines
+        else:
+            lines.append(line)
+    return {name: _parse_addresses('\n'.join(lines))
+            for name, lines in blocks.items()}
+
+
+def refresh_addresses(node: Node):
+    """Refresh the addresses of all the IPIntf of a node at once"""
+    addresses = _node_addresses(node)
+    for itf in node.intfList():
+        if isinstance(itf, IPIntf) and itf.name in addresses:
+            itf._set_addresses(*addresses[itf.name])
+
+
+class IPBatch:
+    """Collect the ip commands targeting a node in order to run them all at
+    once with 'ip -batch', instead of paying one shell round-trip per
+    command. IPIntf queues its commands in the batch stored in the ip_batch
+    attribute of its node, if any."""
+
+    def __init__(self, node: Node):
+        """:param node: The node in which the commands will be run"""
+        self.node = node
+        self.cmds = []  # type: List[str]
+
+    def add(self, *args: str):
+        """Queue a command
+
+        :param args: The arguments of the ip command, e.g.,
+                     'address', 'add', 'dev', 'eth0', '10.0.0.1/24'"""
+        self.cmds.append(' '.join(args))
+
+    def __len__(self):
+        return len(self.cmds)
+
+    def flush(self) -> bool:
+        """Run all the queued commands. A failing command does not prevent
+        the next ones to run.
+
+        :return: Whether all commands succeeded"""
+        if not self.cmds:
+            return True
+        script = '\n'.join(self.cmds) + '\n'
+        self.cmds = []
+        p = self.node.popen(['ip', '-force', '-batch', '-'], stdin=PIPE,
+                            stdout=PIPE, stderr=PIPE)
+        _, err = p.communicate(script.encode())
+        if p.returncode != 0:
+            log.error('Some ip commands failed on node %s:\n%s\n'
+                      % (self.node.name, err.decode(errors='replace')))
+            return False
+        return True
+
+
 class IPLink(_m.Link):
     """A Link class that defaults to IPIntf"""
     def __init__(self, node1: str, node2: str, intf: Type[IPIntf] = IPIntf,
@@ -282,54 +460,34 @@ class IPLink(_m.Link):
 TCIntf = IPIntf
 
 
+def address_sort_key(a: Union[IPv4Interface, IPv6Interface]) -> Tuple:
+    """Return a key ranking addresses by increasing visibility.
+    We define visibility according to IP version (IPv6 is preferred), address
+    scope (loopback then link-local addresses have low visibility), address
+    class (global addresses are preferred over private ones), and address
+    value"""
+    return (a.version, not a.network.is_loopback, not a.is_link_local,
+            a.network.is_global, a.network, a.ip)
+
+
 @functools.total_ordering
 class OrderedAddress:
     def __init__(self, addr):
         self.addr = addr
+        self.key = address_sort_key(addr)
 
     def __eq__(self, other):
-        return address_comparator(self.addr, other.addr) == 0
+        return self.key == other.key
 
     def __lt__(self, other):
-        return address_comparator(self.addr, other.addr) < 0
+        return self.key < other.key
 
 
 def address_comparator(a, b):
     """Return -1, 0, 1 if a is less, equally, more visible than b.
-    We define visibility according to IP version, address scope, address class,
-    and address value"""
-    # We prefer IPv6
-    if a.version > b.version:
-        return 1
-    if a.version < b.version:
-        return -1
-    # We don't prefer loopback addresses
-    if a.network.is_loopback and not b.network.is_loopback:
-        return -1
-    if b.network.is_loopback and not a.network.is_loopback:
-        return 1
-    # LLs have low visibility
-    if a.is_link_local and not b.is_link_local:
-        return -1
-    if b.is_link_local and not a.is_link_local:
-        return 1
-    # We prefer global addresses over private ones
-    if a.network.is_global and not b.network.is_global:
-        return 1
-    if b.network.is_global and not a.network.is_global:
-        return -1
-    # Compare networks
-    if b.network.is_global and not a.network.is_global:
-        return -1
-    # Compare network values
-    if a.network < b.network:
-        return -1
-    if a.network > b.network:
-        return 1
-    # Otherwise simply rank the IP values
-    if a.ip < b.ip:
-        return -1
-    return 1 if a.ip > b.ip else 0
+    See address_sort_key() for the definition of visibility"""
+    key_a, key_b = address_sort_key(a), address_sort_key(b)
+    return (key_a > key_b) - (key_a < key_b)
 
 
 class PhysicalInterface(IPIntf):
@@ -0,0 +1,202 @@
+"""This module indexes the addresses and prefixes of the interfaces of a
+network in radix tries, to find the owner of an address or the
+interfaces of the longest prefix matching an address in O(prefix length)"""
+from ipaddress import ip_address, ip_interface, ip_network, IPv4Address, \
+    IPv6Address, IPv4Network, IPv6Network
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, \
+    Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .link import IPIntf
+
+Address = Union[str, IPv4Address, IPv6Address]
+Network = Union[str, IPv4Network, IPv6Network]
+
+_EMPTY = object()
+
+
+class _TrieNode:
+    __slots__ = ('children', 'value')
+
+    def __init__(self):
+        self.children = [None, None]  # type: List[Optional[_TrieNode]]
+        self.value = _EMPTY  # type: Any
+
+
+class PrefixTrie:
+    """A binary radix trie mapping IP prefixes of both versions to values"""
+
+    def __init__(self):
+        self._roots = {4: _TrieNode(), 6: _TrieNode()}
+        self._len = 0
+
+    @staticmethod
+    def _bits(network: Union[IPv4Network, IPv6Network]) -> Iterator[int]:
+        value = int(network.network_address)
+        width = network.max_prefixlen
+        for i in range(network.prefixlen):
+            yield value >> (width - 1 - i) & 1
+
+    def _find(self, prefix: Network, create=False) -> Optional[_TrieNode]:
+        network = ip_network(prefix, strict=False)
+        node = self._roots[network.version]
+        for bit in self._bits(network):
+            child = node.children[bit]
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[bit] = _TrieNode()
+            node = child
+        return node
+
+    def __setitem__(self, prefix: Network, value):
+        node = self._find(prefix, create=True)
+        if node.value is _EMPTY:
+            self._len += 1
+        node.value = value
+
+    def __getitem__(self, prefix: Network):
+        node = self._find(prefix)
+        if node is None or node.value is _EMPTY:
+            raise KeyError(prefix)
+        return node.value
+
+    def __delitem__(self, prefix: Network):
+        network = ip_network(prefix, strict=False)
+        path = [self._roots[network.version]]
+        for bit in self._bits(network):
+            child = path[-1].children[bit]
+            if child is None:
+                raise KeyError(prefix)
+            path.append(child)
+        if path[-1].value is _EMPTY:
+            raise KeyError(prefix)
+        path[-1].value = _EMPTY
+        self._len -= 1
+        # Prune the branch that leads to no value anymore
+        bits = list(self._bits(network))
+        for i in range(len(path) - 1, 0, -1):
+            node = path[i]
+            if node.value is not _EMPTY or any(node.children):
+                break
+            path[i - 1].children[bits[i - 1]] = None
+
+    def __contains__(self, prefix: Network) -> bool:
+        node = self._find(prefix)
+        return node is not None and node.value is not _EMPTY
+
+    def __len__(self):
+        return self._len
+
+    def get(self, prefix: Network, default=None):
+        node = self._find(prefix)
+        return default if node is None or node.value is _EMPTY \
+            else node.value
+
+    def lpm(self, address: Address) \
+            -> Optional[Tuple[Union[IPv4Network, IPv6Network], Any]]:
+        """Return the longest prefix containing the address and its value,
+        or None if no prefix contains it"""
+        address = ip_address(address)
+        value = int(address)
+        width = address.max_prefixlen
+        node = self._roots[address.version]
+        best = None
+        depth = 0
+        while node is not None:
+            if node.value is not _EMPTY:
+                best = (depth, node.value)
+            if depth == width:
+                break
+            node = node.children[value >> (width - 1 - depth) & 1]
+            depth += 1
+        if best is None:
+            return None
+        return ip_network((value >> (width - best[0]) << (width - best[0]),
+                           best[0])), best[1]
+
+
+class AddressIndex:
+    """The addresses of the interfaces of a network, kept up to date by
+    watching the interfaces. Link-local and loopback addresses are not
+    indexed, as several nodes share them."""
+
+    def __init__(self):
+        # {address: {interface: number of occurrences}}
+        self._addresses = {}  # type: Dict[Any, Dict[IPIntf, int]]
+        # Each prefix maps to {interface: number of addresses in the prefix}
+        self._prefixes = PrefixTrie()
+
+    def watch(self, intf: 'IPIntf'):
+        """Index the addresses of the interface and follow their changes"""
+        if self.update not in intf.address_watchers:
+            intf.address_watchers.append(self.update)
+            self.update(intf, (),
+                        list(intf.addresses[4]) + list(intf.addresses[6]))
+
+    def unwatch(self, intf: 'IPIntf'):
+        if self.update in intf.address_watchers:
+            intf.address_watchers.remove(self.update)
+            self.update(intf, list(intf.addresses[4])
+                        + list(intf.addresses[6]), ())
+
+    @staticmethod
+    def _indexed(addr) -> bool:
+        return not addr.is_link_local and not addr.is_loopback
+
+    @staticmethod
+    def _add(entries: Dict['IPIntf', int], intf: 'IPIntf'):
+        entries[intf] = entries.get(intf, 0) + 1
+
+    @staticmethod
+    def _remove(entries: Dict['IPIntf', int], intf: 'IPIntf'):
+        count = entries.get(intf, 0) - 1
+        if count > 0:
+            entries[intf] = count
+        else:
+            entries.pop(intf, None)
+
+    def update(self, intf: 'IPIntf', removed: Sequence, added: Sequence):
+        """Account for the addresses removed from and added to an interface
+
+        :param intf: The interface
+        :param removed: The removed ip_interface-like addresses
+        :param added: The added ip_interface-like addresses"""
+        for addr in removed:
+            addr = ip_interface(addr)
+            if not self._indexed(addr):
+                continue
+            entries = self._addresses.get(addr.ip, {})
+            self._remove(entries, intf)
+            if not entries:
+                self._addresses.pop(addr.ip, None)
+            entries = self._prefixes.get(addr.network, {})
+            self._remove(entries, intf)
+            if not entries and addr.network in self._prefixes:
+                del self._prefixes[addr.network]
+        for addr in added:
+            addr = ip_interface(addr)
+            if not self._indexed(addr):
+                continue
+            self._add(self._addresses.setdefault(addr.ip, {}), intf)
+            entries = self._prefixes.get(addr.network)
+            if entries is None:
+                entries = self._prefixes[addr.network] = {}
+            self._add(entries, intf)
+
+    def intf_for_ip(self, ip: Address) -> Optional['IPIntf']:
+        """Return the interface owning an address, if any"""
+        entries = self._addresses.get(ip_interface(ip).ip)
+        return next(iter(entries)) if entries else None
+
+    def intfs_for_prefix(self, prefix: Network) -> List['IPIntf']:
+        """Return the interfaces with an address in exactly that prefix"""
+        return list(self._prefixes.get(ip_network(prefix, strict=False), ()))
+
+    def lpm(self, ip: Address) \
+            -> Optional[Tuple[Union[IPv4Network, IPv6Network],
+                              List['IPIntf']]]:
+        """Return the longest prefix of an interface containing the address,
+        and the interfaces with an address in that prefix"""
+        match = self._prefixes.lpm(ip_interface(ip).ip)
+        return None if match is None else (match[0], list(match[1]))
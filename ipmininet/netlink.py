@@ -0,0 +1,169 @@
+"""A minimal rtnetlink client, used to read the links and addresses of a
+network namespace with a couple of netlink dumps instead of parsing the
+output of ip(8)"""
+import ctypes
+import ctypes.util
+import os
+import socket
+import struct
+import threading
+from ipaddress import ip_interface, IPv4Interface, IPv6Interface, ip_address
+from typing import Dict, List, Optional, Tuple, Callable, Iterator, TypeVar
+
+# netlink(7) and rtnetlink(7) constants
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+CLONE_NEWNET = 0x40000000
+
+NLMSGHDR = struct.Struct('=IHHII')  # len, type, flags, seq, pid
+IFINFOMSG = struct.Struct('=BxHiII')  # family, type, index, flags, change
+IFADDRMSG = struct.Struct('=BBBBI')  # family, prefixlen, flags, scope, index
+RTATTR = struct.Struct('=HH')  # len, type
+
+RECV_SIZE = 1 << 16
+
+T = TypeVar('T')
+Addresses = Tuple[Optional[str], List[IPv4Interface], List[IPv6Interface]]
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _attributes(data: bytes, offset: int) -> Dict[int, bytes]:
+    """Parse the route attributes found in data, starting at offset"""
+    attrs = {}
+    while offset + RTATTR.size <= len(data):
+        length, kind = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[kind] = data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _dump(sock: socket.socket, msg_type: int, payload: bytes, seq: int) \
+        -> Iterator[Tuple[int, bytes]]:
+    """Send a dump request and yield the (type, payload) of the replies
+
+    :raise OSError: if the kernel returned an error"""
+    sock.send(NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type,
+                            NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + payload)
+    while True:
+        data = sock.recv(RECV_SIZE)
+        offset = 0
+        while offset + NLMSGHDR.size <= len(data):
+            length, kind, _, msg_seq, _ = NLMSGHDR.unpack_from(data, offset)
+            if length < NLMSGHDR.size:
+                raise OSError('Malformed netlink message')
+            body = data[offset + NLMSGHDR.size:offset + length]
+            offset += _align(length)
+            if msg_seq != seq:
+                continue
+            if kind == NLMSG_DONE:
+                return
+            if kind == NLMSG_ERROR:
+                error = struct.unpack_from('=i', body)[0]
+                if error:
+                    raise OSError(-error, os.strerror(-error))
+                continue
+            yield kind, body
+
+
+def _format_lladdr(raw: bytes) -> str:
+    """Format a link-layer address as ip(8) does"""
+    if len(raw) in (4, 16):  # IP tunnels
+        return ip_address(raw).compressed
+    return ':'.join('%02x' % b for b in raw)
+
+
+def _read_addresses(sock: socket.socket) -> Dict[str, Addresses]:
+    names = {}  # type: Dict[int, str]
+    addresses = {}  # type: Dict[str, Addresses]
+    for kind, body in _dump(sock, RTM_GETLINK,
+                            IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0), 1):
+        if kind != RTM_NEWLINK:
+            continue
+        index = IFINFOMSG.unpack_from(body)[2]
+        attrs = _attributes(body, IFINFOMSG.size)
+        try:
+            name = attrs[IFLA_IFNAME].rstrip(b'\0').decode()
+        except KeyError:
+            continue
+        lladdr = attrs.get(IFLA_ADDRESS)
+        names[index] = name
+        addresses[name] = (_format_lladdr(lladdr) if lladdr else None, [], [])
+    for kind, body in _dump(sock, RTM_GETADDR,
+                            IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0), 2):
+        if kind != RTM_NEWADDR:
+            continue
+        _, prefixlen, _, _, index = IFADDRMSG.unpack_from(body)
+        attrs = _attributes(body, IFADDRMSG.size)
+        # IFA_ADDRESS is the peer address on point-to-point interfaces
+        raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+        if raw is None or index not in names:
+            continue
+        addr = ip_interface('%s/%d' % (ip_address(raw), prefixlen))
+        addresses[names[index]][1 if addr.version == 4 else 2].append(addr)
+    return addresses
+
+
+def _in_namespace(pid: int, func: Callable[[], T]) -> T:
+    """Call func from a thread that entered the network namespace
+    of a process. The other threads stay in their namespace."""
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    result = []  # type: List
+    error = []  # type: List[BaseException]
+
+    def run():
+        try:
+            fd = os.open('/proc/%d/ns/net' % pid, os.O_RDONLY)
+            try:
+                if libc.setns(fd, CLONE_NEWNET) != 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, 'setns failed: %s'
+                                  % os.strerror(errno))
+            finally:
+                os.close(fd)
+            result.append(func())
+        except BaseException as e:
+            error.append(e)
+
+    # A dedicated thread, as its namespace cannot be restored afterwards
+    t = threading.Thread(target=run, name='netlink-%d' % pid, daemon=True)
+    t.start()
+    t.join()
+    if error:
+        raise error[0]
+    return result[0]
+
+
+def interface_addresses(pid: Optional[int] = None) -> Dict[str, Addresses]:
+    """Return the link-layer, IPv4 and IPv6 addresses of all the interfaces
+    of a network namespace
+
+    :param pid: A process in the namespace to inspect,
+                None for the namespace of the current process
+    :return: {interface name: (mac, [ipv4], [ipv6])}
+    :raise OSError: if the namespace cannot be entered (e.g., when not root)
+                    or if the dump failed"""
+    def dump():
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                           NETLINK_ROUTE) as sock:
+            sock.bind((0, 0))
+            return _read_addresses(sock)
+
+    if pid is None:
+        return dump()
+    return _in_namespace(pid, dump)
@@ -0,0 +1,437 @@
+"""This module computes the broadcast domains and the addresses of a topology
+from its description only, i.e., without creating any namespace or
+interface. The plan can then be applied in bulk by IPNet, and stored in a
+cache keyed by a fingerprint of the topology."""
+import hashlib
+import json
+import os
+import tempfile
+from ipaddress import ip_interface, ip_network, IPv4Interface, \
+    IPv6Interface, IPv4Network, IPv6Network
+from typing import Dict, List, Optional, Tuple, Union, Iterator, Sequence, \
+    Any, Set
+
+from mininet.log import lg as log
+from mininet.topo import Topo
+
+from .ipnet import IPNet, BroadcastDomain
+from .utils import DisjointSet, is_container
+
+IPInterface = Union[IPv4Interface, IPv6Interface]
+
+
+class PlannedNode:
+    """A node of the topology, as seen by the planner"""
+
+    def __init__(self, name: str, kind: str, use_v4: bool, use_v6: bool):
+        """:param name: The name of the node
+        :param kind: Either 'router', 'host' or 'switch'
+        :param use_v4: Whether the node has IPv4
+        :param use_v6: Whether the node has IPv6"""
+        self.name = name
+        self.kind = kind
+        self.use_v4 = use_v4
+        self.use_v6 = use_v6
+        self.intfs = {}  # type: Dict[int, PlannedInterface]
+
+    def intfList(self) -> List['PlannedInterface']:
+        return [self.intfs[p] for p in sorted(self.intfs)]
+
+    def __repr__(self):
+        return self.name
+
+
+class PlannedInterface:
+    """An interface of the topology, as seen by the planner. It mimics the
+    parts of the IPIntf API used by BroadcastDomain."""
+
+    def __init__(self, node: PlannedNode, name: str, port: int,
+                 params: Dict):
+        self.node = node
+        self.name = name
+        self.port = port
+        self.params = params
+        self.addresses = {4: [], 6: []}  # type: Dict[int, List[IPInterface]]
+        self.peer = None  # type: Optional[PlannedInterface]
+        self.broadcast_domain = None  # type: Optional[BroadcastDomain]
+        node.intfs[port] = self
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.node.name, self.name
+
+    @property
+    def interface_width(self) -> Tuple[int, int]:
+        return self.params.get('v4_width', 1), self.params.get('v6_width', 1)
+
+    def set_addresses(self, addresses: Sequence[IPInterface]):
+        """Replace the addresses of the families present in addresses"""
+        for v in (4, 6):
+            addrs = [a for a in addresses if a.version == v]
+            if addrs:
+                self.addresses[v] = addrs
+
+    def ips(self, exclude_lbs=True) -> Iterator[IPv4Interface]:
+        return (i for i in self.addresses[4]
+                if not exclude_lbs or not i.is_loopback)
+
+    def ip6s(self, exclude_lls=False, exclude_lbs=True) \
+            -> Iterator[IPv6Interface]:
+        return (i for i in self.addresses[6]
+                if (not exclude_lls or not i.is_link_local)
+                and (not exclude_lbs or not i.is_loopback))
+
+    def __repr__(self):
+        return self.name
+
+
+def _parse_ips(ips, prefixLen: Optional[int] = None) -> List[IPInterface]:
+    """Parse addresses given as interface or node parameters
+
+    :param ips: An address or a sequence of addresses
+    :param prefixLen: The prefix length of the addresses given without one,
+                      None for a full /32 or /128"""
+    if not ips:
+        return []
+    if not is_container(ips):
+        ips = (ips,)
+    parsed = []
+    for addr in ips:
+        if isinstance(addr, str) and '/' not in addr \
+                and prefixLen is not None:
+            addr = '%s/%s' % (addr, prefixLen)
+        parsed.append(ip_interface(str(addr)))
+    return parsed
+
+
+class AddressPlan:
+    """The broadcast domains and the addresses of a topology"""
+
+    def __init__(self, domains: List[BroadcastDomain],
+                 unallocated_ipbase: List[IPv4Network],
+                 unallocated_ip6base: List[IPv6Network],
+                 routerids: Optional[Dict[str, str]] = None):
+        """:param domains: The planned broadcast domains
+        :param unallocated_ipbase: The IPv4 subnets left for allocation
+        :param unallocated_ip6base: The IPv6 subnets left for allocation
+        :param routerids: The router ids of the routers, if known"""
+        self.domains = domains
+        self.unallocated_ipbase = unallocated_ipbase
+        self.unallocated_ip6base = unallocated_ip6base
+        self.routerids = {} if routerids is None else routerids
+        self._interfaces = {}  # type: Dict[Tuple[str, str], PlannedInterface]
+        for d in domains:
+            for i in d:
+                self._interfaces[i.key] = i
+
+    def interface(self, node: str, intf: str) -> Optional[PlannedInterface]:
+        """Return the planned interface of a node, if any"""
+        return self._interfaces.get((node, intf))
+
+    def addresses(self, node: str, intf: str) -> List[IPInterface]:
+        """Return the planned addresses of an interface
+
+        :param node: The node name
+        :param intf: The interface name"""
+        i = self.interface(node, intf)
+        return [] if i is None else i.addresses[4] + i.addresses[6]
+
+    def to_dict(self) -> Dict[str, Dict[str, List[str]]]:
+        """Return the addresses of all interfaces,
+        as {node: {interface: [address]}}"""
+        plan = {}  # type: Dict[str, Dict[str, List[str]]]
+        for (node, intf), i in sorted(self._interfaces.items()):
+            plan.setdefault(node, {})[intf] = \
+                [a.with_prefixlen for a in i.addresses[4] + i.addresses[6]]
+        return plan
+
+    def serialize(self) -> Dict[str, Any]:
+        """Return a JSON-serializable description of the plan"""
+        nodes = {}  # type: Dict[str, Dict[str, Any]]
+        for (node, intf), i in sorted(self._interfaces.items()):
+            n = nodes.setdefault(node, {'kind': i.node.kind,
+                                        'use_v4': i.node.use_v4,
+                                        'use_v6': i.node.use_v6,
+                                        'interfaces': {}})
+            n['interfaces'][intf] = {
+                'port': i.port,
+                'v4_width': i.interface_width[0],
+                'v6_width': i.interface_width[1],
+                'addresses': [a.with_prefixlen
+                              for a in i.addresses[4] + i.addresses[6]]}
+        domains = [{
+            'interfaces': sorted(i.key for i in d),
+            'net': str(d.net) if d.net is not None else None,
+            'net6': str(d.net6) if d.net6 is not None else None,
+            'allocated_v4': d._allocated_v4,
+            'allocated_v6': d._allocated_v6,
+            'fixed_net4s': [str(n) for n in d.fixed_net4s],
+            'fixed_net6s': [str(n) for n in d.fixed_net6s]
+        } for d in self.domains]
+        return {'nodes': nodes,
+                'domains': domains,
+                'unallocated_ipbase': [str(n)
+                                       for n in self.unallocated_ipbase],
+                'unallocated_ip6base': [str(n)
+                                        for n in self.unallocated_ip6base],
+                'routerids': self.routerids}
+
+    @classmethod
+    def deserialize(cls, data: Dict[str, Any]) -> 'AddressPlan':
+        """Rebuild a plan from the output of serialize()
+
+        :raise KeyError, ValueError: if the data is malformed"""
+        interfaces = {}  # type: Dict[Tuple[str, str], PlannedInterface]
+        for name, n in data['nodes'].items():
+            node = PlannedNode(name, n['kind'], n['use_v4'], n['use_v6'])
+            for intf, i in n['interfaces'].items():
+                itf = interfaces[name, intf] = PlannedInterface(
+                    node, intf, i['port'], {'v4_width': i['v4_width'],
+                                            'v6_width': i['v6_width']})
+                itf.set_addresses([ip_interface(a) for a in i['addresses']])
+        domains = []
+        for d in data['domains']:
+            itfs = [interfaces[tuple(key)] for key in d['interfaces']]
+            bd = BroadcastDomain.from_interfaces(itfs)
+            bd.net = ip_network(d['net']) if d['net'] else None
+            bd.net6 = ip_network(d['net6']) if d['net6'] else None
+            bd._allocated_v4 = d['allocated_v4']
+            bd._allocated_v6 = d['allocated_v6']
+            bd.fixed_net4s = [ip_network(n) for n in d['fixed_net4s']]
+            bd.fixed_net6s = [ip_network(n) for n in d['fixed_net6s']]
+            for i in itfs:
+                i.broadcast_domain = bd
+            domains.append(bd)
+        return cls(domains,
+                   [ip_network(n) for n in data['unallocated_ipbase']],
+                   [ip_network(n) for n in data['unallocated_ip6base']],
+                   routerids=dict(data.get('routerids', {})))
+
+
+class AddressPlanner:
+    """Compute the address plan of a topology, with the same broadcast domain
+    and allocation logic as IPNet, but on the topology graph alone"""
+
+    def __init__(self, topo: Topo, use_v4=True, ipBase='192.168.0.0/16',
+                 max_v4_prefixlen=24, use_v6=True, ip6Base='fc00::/7',
+                 max_v6_prefixlen=48):
+        """The parameters have the same meaning as for IPNet
+
+        :param topo: The topology to plan. Its overlays have to be applied
+                     already, which is the case once it is built."""
+        self.topo = topo
+        self.use_v4 = use_v4
+        self.ipBase = ipBase
+        self.max_v4_prefixlen = max_v4_prefixlen
+        self.use_v6 = use_v6
+        self.ip6Base = ip6Base
+        self.max_v6_prefixlen = max_v6_prefixlen
+        self.nodes = {}  # type: Dict[str, PlannedNode]
+
+    def _add_nodes(self):
+        for n in self.topo.nodes():
+            info = self.topo.nodeInfo(n)
+            if self.topo.isSwitch(n):
+                kind = 'switch'
+            elif info.get('isRouter', False):
+                kind = 'router'
+            else:
+                kind = 'host'
+            # IPNet propagates its settings to the routers only
+            default_v4 = self.use_v4 if kind == 'router' else True
+            default_v6 = self.use_v6 if kind == 'router' else True
+            node = PlannedNode(n, kind, info.get('use_v4', default_v4),
+                               info.get('use_v6', default_v6))
+            self.nodes[n] = node
+            if kind == 'router':
+                lo = PlannedInterface(node, 'lo', -1, {})
+                # Router loopbacks inherit the /8 prefix of 127.0.0.1
+                lo.set_addresses(_parse_ips(info.get('lo_addresses'),
+                                            prefixLen=8))
+
+    def _add_links(self):
+        for node1, node2, _, info in sorted(
+                self.topo.iterLinks(withKeys=True, withInfo=True),
+                key=lambda x: (x[0], x[1], x[3]['port1'], x[3]['port2'])):
+            ends = []
+            for n, i in ((node1, '1'), (node2, '2')):
+                node = self.nodes[n]
+                port = info['port' + i]
+                params = dict(info.get('params' + i, {}))
+                # IPNet.addLink copies the link widths to the interfaces
+                for k in ('v4_width', 'v6_width'):
+                    params.setdefault(k, info.get(k, 1))
+                name = info.get('intfName' + i) or '%s-eth%s' % (n, port)
+                itf = PlannedInterface(node, name, port, params)
+                itf.set_addresses(_parse_ips(params.get('ip')))
+                ends.append(itf)
+            ends[0].peer, ends[1].peer = ends[1], ends[0]
+        # Hosts set their 'ip' parameter on their default interface
+        for node in self.nodes.values():
+            ip = self.topo.nodeInfo(node.name).get('ip')
+            if node.kind == 'host' and ip and node.intfs:
+                node.intfs[min(node.intfs)].set_addresses(
+                    _parse_ips(ip, prefixLen=8))
+
+    def _broadcast_domains(self) -> List[BroadcastDomain]:
+        """Group the interfaces in broadcast domains, as
+        IPNet._broadcast_domains() does"""
+        sets = DisjointSet()
+        interfaces = []  # type: List[PlannedInterface]
+        for name in sorted(self.nodes):
+            node = self.nodes[name]
+            itfs = node.intfList()
+            if node.kind != 'switch':
+                interfaces.extend(itfs)
+            else:
+                for i in itfs[1:]:
+                    sets.union(itfs[0], i)
+            for i in itfs:
+                if i.peer is not None:
+                    sets.union(i, i.peer)
+        groups = {}  # type: Dict[PlannedInterface, List[PlannedInterface]]
+        for intf in interfaces:
+            groups.setdefault(sets.find(intf), []).append(intf)
+        domains = []
+        for itfs in groups.values():
+            bd = BroadcastDomain.from_interfaces(itfs)
+            for i in itfs:
+                i.broadcast_domain = bd
+            domains.append(bd)
+        return domains
+
+    def plan(self) -> AddressPlan:
+        """Compute the address plan
+
+        :raise ValueError: if the address space is too small"""
+        self.nodes = {}
+        self._add_nodes()
+        self._add_links()
+        domains = self._broadcast_domains()
+        ipbase = [ip_network(self.ipBase)]
+        ip6base = [ip_network(self.ip6Base)]
+        fixed_net4s = [n for d in domains for n in d.fixed_net4s]
+        fixed_net6s = [n for d in domains for n in d.fixed_net6s]
+        if self.use_v4:
+            self._allocate(domains, ipbase, 4, fixed_net4s)
+        if self.use_v6:
+            self._allocate(domains, ip6base, 6, fixed_net6s)
+        return AddressPlan(domains, ipbase, ip6base)
+
+    def _allocate(self, domains: List[BroadcastDomain],
+                  subnets: List[Union[IPv4Network, IPv6Network]],
+                  version: int, allocated_subnets):
+        v4 = version == 4
+        IPNet._allocate_subnets(
+            subnets, list(domains),
+            domainlen='len_v4' if v4 else 'len_v6',
+            net_key='net' if v4 else 'net6',
+            size_key='max_v4prefixlen' if v4 else 'max_v6prefixlen',
+            max_prefixlen=self.max_v4_prefixlen if v4
+            else self.max_v6_prefixlen,
+            allocated_subnets=allocated_subnets)
+        for domain in domains:
+            if not domain.use_ip_version(version):
+                continue
+            # Allocate in a deterministic order
+            for intf in sorted(domain, key=lambda x: x.key):
+                if v4:
+                    if next(intf.ips(), None) is None and intf.node.use_v4:
+                        intf.set_addresses([
+                            domain.next_ipv4()
+                            for _ in range(intf.interface_width[0])])
+                elif next(intf.ip6s(exclude_lls=True), None) is None \
+                        and intf.node.use_v6:
+                    intf.set_addresses([
+                        domain.next_ipv6()
+                        for _ in range(intf.interface_width[1])])
+
+
+# Bump this when the plan format or the allocation logic changes
+PLAN_CACHE_VERSION = 1
+
+
+def _sorted(values) -> List:
+    """Sort canonical values, which can be of different types"""
+    return sorted(values, key=lambda v: json.dumps(v, sort_keys=True))
+
+
+def _canonical(x, seen: Optional[Set[int]] = None):
+    """Return a JSON-serializable value describing x, which does not depend
+    on memory addresses or on the ordering of sets and dicts"""
+    if x is None or isinstance(x, (bool, int, float, str)):
+        return x
+    if seen is None:
+        seen = set()
+    if id(x) in seen:
+        return '<cycle>'
+    seen = seen | {id(x)}
+    if isinstance(x, dict):
+        return _sorted([_canonical(k, seen), _canonical(v, seen)]
+                       for k, v in x.items())
+    if isinstance(x, (list, tuple)):
+        return [_canonical(v, seen) for v in x]
+    if isinstance(x, (set, frozenset)):
+        return _sorted(_canonical(v, seen) for v in x)
+    if isinstance(x, type) or callable(x):
+        return '%s.%s' % (getattr(x, '__module__', ''),
+                          getattr(x, '__qualname__', type(x).__name__))
+    if hasattr(x, '__dict__'):
+        return [type(x).__qualname__, _canonical(vars(x), seen)]
+    return str(x)
+
+
+def topology_fingerprint(topo: Topo, **settings) -> str:
+    """Return a digest of everything that influences the address plan of a
+    topology: its nodes, links, their parameters and its overlays, as well
+    as the allocation settings
+
+    :param topo: The topology
+    :param settings: The allocation settings, e.g., ipBase or use_v6"""
+    description = {
+        'version': PLAN_CACHE_VERSION,
+        'settings': _canonical(settings),
+        'nodes': [[n, _canonical(topo.nodeInfo(n))]
+                  for n in sorted(topo.nodes(sort=False))],
+        'links': _sorted(_canonical(info) for _, _, _, info in
+                         topo.iterLinks(withKeys=True, withInfo=True)),
+        'overlays': _canonical(getattr(topo, 'overlays', []))
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True)
+                          .encode()).hexdigest()
+
+
+class PlanCache:
+    """An on-disk cache of address plans, keyed by topology fingerprints"""
+
+    def __init__(self, directory: str):
+        """:param directory: The directory where the plans are stored"""
+        self.directory = directory
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, '%s.json' % fingerprint)
+
+    def load(self, fingerprint: str) -> Optional[AddressPlan]:
+        """Return the cached plan of a topology, if any"""
+        try:
+            with open(self._path(fingerprint)) as f:
+                return AddressPlan.deserialize(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            log.warning('*** Ignoring the invalid cached address plan %s: %s'
+                        '\n' % (self._path(fingerprint), e))
+            return None
+
+    def store(self, fingerprint: str, plan: AddressPlan):
+        """Store the plan of a topology"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write atomically as several runs may share the cache
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(plan.serialize(), f, sort_keys=True)
+            os.replace(tmp, self._path(fingerprint))
+        except OSError as e:
+            log.warning('*** Cannot store the address plan in %s: %s\n'
+                        % (self.directory, e))
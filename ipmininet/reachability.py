@@ -0,0 +1,236 @@
+"""This module measures the reachability between the nodes of a network.
+All sources are probed concurrently, each with a single prober process
+that sends its probes to all its destinations at once, and the results
+are gathered in a matrix of loss and round-trip time."""
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import ip_address
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from mininet.log import lg as log
+from mininet.node import Node
+
+from .utils import has_cmd
+
+# ping6 is not provided by default on newer systems
+PING6_CMD = 'ping6' if has_cmd('ping6') else 'ping -6'
+# The maximal number of probes in flight per source for the ping prober
+MAX_PROBES_PER_SOURCE = 32
+
+_FPING_LINE = re.compile(r'^(\S+)\s+: xmt/rcv/%loss = (\d+)/(\d+)/[^,]*'
+                         r'(?:, min/avg/max = [\d.]+/([\d.]+)/[\d.]+)?')
+_PING_SENT = re.compile(r'(\d+) packets transmitted, (\d+) (?:packets )?'
+                        r'received')
+_PING_RTT = re.compile(r'= [\d.]+/([\d.]+)/')
+
+# A destination: (node, IP version, address)
+Target = Tuple[Node, int, str]
+
+
+class ProbeResult:
+    """The outcome of the probes from a source to a destination address"""
+
+    def __init__(self, src: Node, dst: Node, family: int, address: str,
+                 sent=0, received=0, rtt: Optional[float] = None):
+        """:param src: The source node
+        :param dst: The destination node
+        :param family: The IP version, 4 or 6
+        :param address: The probed address of dst
+        :param sent: The number of probes sent
+        :param received: The number of replies received
+        :param rtt: The average round-trip time in ms, if any reply came"""
+        self.src = src
+        self.dst = dst
+        self.family = family
+        self.address = address
+        self.sent = sent
+        self.received = received
+        self.rtt = rtt
+
+    @property
+    def loss(self) -> float:
+        """The loss ratio, between 0 and 1"""
+        return 1.0 - self.received / self.sent if self.sent else 0.0
+
+    def __repr__(self):
+        return '%s -> %s (%s): %d/%d received, rtt %s' \
+               % (self.src.name, self.dst.name, self.address, self.received,
+                  self.sent, self.rtt)
+
+
+class ReachabilityMatrix:
+    """The results of the probes, per (source, destination, family)"""
+
+    def __init__(self, results: Sequence[ProbeResult] = ()):
+        self._results = {}  # type: Dict[Tuple[str, str, int], ProbeResult]
+        for r in results:
+            self.add(r)
+
+    def add(self, result: ProbeResult):
+        self._results[result.src.name, result.dst.name, result.family] = \
+            result
+
+    def get(self, src: str, dst: str, family: int) -> Optional[ProbeResult]:
+        """Return the result of the probes between two nodes
+
+        :param src: The source name
+        :param dst: The destination name
+        :param family: The IP version"""
+        return self._results.get((src, dst, family))
+
+    def __iter__(self) -> Iterator[ProbeResult]:
+        return iter(self._results.values())
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def sent(self) -> int:
+        return sum(r.sent for r in self)
+
+    @property
+    def received(self) -> int:
+        return sum(r.received for r in self)
+
+    @property
+    def loss(self) -> float:
+        """The overall loss ratio, between 0 and 1"""
+        return 1.0 - self.received / self.sent if self.sent else 0.0
+
+    def loss_matrix(self, family: int) -> Dict[str, Dict[str, float]]:
+        """Return {src: {dst: loss ratio}} for an IP version"""
+        matrix = {}  # type: Dict[str, Dict[str, float]]
+        for (src, dst, f), r in self._results.items():
+            if f == family:
+                matrix.setdefault(src, {})[dst] = r.loss
+        return matrix
+
+    def rtt_matrix(self, family: int) -> Dict[str, Dict[str, Optional[float]]]:
+        """Return {src: {dst: average rtt in ms}} for an IP version"""
+        matrix = {}  # type: Dict[str, Dict[str, Optional[float]]]
+        for (src, dst, f), r in self._results.items():
+            if f == family:
+                matrix.setdefault(src, {})[dst] = r.rtt
+        return matrix
+
+
+def _parse_fping(out: str) -> Dict[str, Tuple[int, int, Optional[float]]]:
+    """Parse the per-target summary of fping -q -c
+
+    :return: {address: (sent, received, rtt)}"""
+    results = {}
+    for line in out.splitlines():
+        m = _FPING_LINE.match(line.strip())
+        if m is None:
+            continue
+        try:
+            address = ip_address(m.group(1)).compressed
+        except ValueError:
+            continue
+        rtt = float(m.group(4)) if m.group(4) else None
+        results[address] = (int(m.group(2)), int(m.group(3)), rtt)
+    return results
+
+
+def _parse_ping(out: str) -> Tuple[int, int, Optional[float]]:
+    """Parse the summary of ping
+
+    :return: (sent, received, rtt)"""
+    m = _PING_SENT.search(out)
+    if m is None:
+        return 0, 0, None
+    rtt = _PING_RTT.search(out)
+    return int(m.group(1)), int(m.group(2)), \
+        float(rtt.group(1)) if rtt else None
+
+
+def _run(src: Node, cmd: List[str], stdin: Optional[str] = None) -> str:
+    p = src.popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                  stderr=subprocess.STDOUT, universal_newlines=True)
+    out, _ = p.communicate(stdin)
+    return out
+
+
+def _fping(src: Node, targets: Sequence[Target], timeout: Optional[str],
+           count: int) -> Dict[str, Tuple[int, int, Optional[float]]]:
+    cmd = ['fping', '-q', '-c', str(count)]
+    if timeout:
+        cmd.extend(['-t', str(int(float(timeout) * 1000))])
+    cmd.extend(sorted({address for _, _, address in targets}))
+    return _parse_fping(_run(src, cmd))
+
+
+def _ping(src: Node, targets: Sequence[Target], timeout: Optional[str],
+          count: int) -> Dict[str, Tuple[int, int, Optional[float]]]:
+    """Run one ping per target, at most MAX_PROBES_PER_SOURCE at a time,
+    from a single shell in the source"""
+    opts = '-n -c %d' % count
+    if timeout:
+        opts += ' -W %s' % timeout
+    probe = ('if [ "$2" = 6 ]; then c="%s"; else c=ping; fi; '
+             'r=$($c %s "$3" 2>&1 | tail -n 2 | tr "\\n" " "); '
+             'echo "$1 $r"' % (PING6_CMD, opts))
+    cmd = ['sh', '-c', "xargs -P %d -L 1 sh -c '%s' _"
+           % (MAX_PROBES_PER_SOURCE, probe)]
+    stdin = ''.join('%d %d %s\n' % (i, family, address)
+                    for i, (_, family, address) in enumerate(targets))
+    results = {}
+    for line in _run(src, cmd, stdin).splitlines():
+        index, _, out = line.partition(' ')
+        try:
+            address = targets[int(index)][2]
+        except (ValueError, IndexError):
+            continue
+        results[ip_address(address).compressed] = _parse_ping(out)
+    return results
+
+
+def probe(src: Node, targets: Sequence[Target], timeout: Optional[str] = None,
+          count=1, use_fping: Optional[bool] = None) -> List[ProbeResult]:
+    """Probe destinations from a source
+
+    :param src: The source node
+    :param targets: The destinations, as (node, IP version, address)
+    :param timeout: The time to wait for a reply, in seconds, as string
+    :param count: The number of probes per destination
+    :param use_fping: Whether to use fping, None uses it if available.
+                      The destinations that it did not report are probed
+                      with ping.
+    :return: The result for each destination"""
+    if use_fping is None:
+        use_fping = has_cmd('fping')
+    results = {}  # type: Dict[str, Tuple[int, int, Optional[float]]]
+    if use_fping and targets:
+        results.update(_fping(src, targets, timeout, count))
+    missing = [t for t in targets
+               if ip_address(t[2]).compressed not in results]
+    if missing:
+        results.update(_ping(src, missing, timeout, count))
+    return [ProbeResult(src, dst, family, address,
+                        *results.get(ip_address(address).compressed,
+                                     (count, 0, None)))
+            for dst, family, address in targets]
+
+
+def probe_all(targets: Mapping[Node, Sequence[Target]],
+              timeout: Optional[str] = None, count=1,
+              max_workers: Optional[int] = None,
+              use_fping: Optional[bool] = None) -> ReachabilityMatrix:
+    """Probe the destinations of all sources concurrently
+
+    :param targets: The destinations of each source node
+    :param timeout: The time to wait for a reply, in seconds, as string
+    :param count: The number of probes per destination
+    :param max_workers: The maximal number of sources probing at the same
+                        time, None lets the ThreadPoolExecutor choose
+    :param use_fping: Whether to use fping, see probe()"""
+    matrix = ReachabilityMatrix()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(probe, src, dsts, timeout, count, use_fping)
+                   for src, dsts in targets.items() if dsts]
+        for f in futures:
+            for r in f.result():
+                matrix.add(r)
+    log.debug('*** Probed %d destinations\n' % len(matrix))
+    return matrix
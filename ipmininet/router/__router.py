@@ -1,20 +1,35 @@
 """This modules defines a L3 router class,
    with a modular config system."""
-import sys
-import time
 from ipaddress import IPv4Interface, IPv6Interface
-from typing import Type, Optional, Tuple, Union, Dict, List, Sequence
+from typing import Callable, Type, Optional, Tuple, Union, Dict, List, \
+    Sequence, TYPE_CHECKING
 
 from ipmininet import DEBUG_FLAG
 from ipmininet.utils import L3Router, realIntfList, otherIntf
 from ipmininet.link import IPIntf
+from ipmininet.events import Event, EventStream, KINDS
+from ipmininet.execchannel import DEFAULT_WORKERS, ExecChannel
+from ipmininet.cgroup import Cgroup, TERM_GRACE, resource_limits
 from .config import BasicRouterConfig, NodeConfig, RouterConfig, \
     OpenrRouterConfig
 
-import mininet.clean
 from mininet.node import Node, Host
 from mininet.log import lg
+import asyncio
+import functools
 import shlex
+import threading
+
+if TYPE_CHECKING:
+    from ipmininet.components import ComponentIndex
+    from ipmininet.validation import DryRun
+
+
+def _in_background(args: Sequence) -> bool:
+    """Whether a command given to Node.cmd() ends with '&'"""
+    if len(args) == 1 and isinstance(args[0], (list, tuple)):
+        args = args[0]
+    return ' '.join(str(a) for a in args).rstrip().endswith('&')
 
 
 class ProcessHelper:
@@ -23,18 +38,95 @@ class ProcessHelper:
     currently in a mininet namespace, but could be extended to execute in
     a different environment."""
 
-    def __init__(self, node: 'IPNode'):
-        """:param node: The object to use to create subprocesses."""
+    def __init__(self, node: 'IPNode', channel_workers=DEFAULT_WORKERS):
+        """:param node: The object to use to create subprocesses.
+        :param channel_workers: The number of commands that the execution
+                                channel runs at the same time"""
         self.node = node
+        self.channel_workers = channel_workers
         self._pid_gen = 0
         self._processes = {}  # type: Dict[int, subprocess.Popen]
+        self._channel = None  # type: Optional[ExecChannel]
+        self._channel_lock = threading.Lock()
+        self._cgroup = None  # type: Optional[Cgroup]
+        self._unlimited = False
+        # No channel or cgroup is created anymore once terminated
+        self._terminated = False
+
+    @property
+    def cgroup(self) -> Optional[Cgroup]:
+        """The cgroup of the processes of the node, created on first use with
+        the resource limits of the node, or None if the network of the node
+        has no cgroup
+
+        :raise ValueError: if the limits cannot be set"""
+        if self._cgroup is None:
+            if self._terminated:
+                return None
+            parent = getattr(self.node, 'network_cgroup', None)
+            limits = getattr(self.node, 'resource_limits', None)
+            if parent is None:
+                if limits and not self._unlimited:
+                    lg.warning('Cannot limit the resources of %s without '
+                               'cgroup v2\n' % self.node.name)
+                    self._unlimited = True
+                return None
+            try:
+                cgroup = parent.child(self.node.name)
+            except OSError as e:
+                lg.warning('Cannot create the cgroup of %s: %s\n'
+                           % (self.node.name, e))
+                return None
+            if limits:
+                cgroup.limit(limits)
+            self._cgroup = cgroup
+        return self._cgroup
+
+    def resource_usage(self) -> Dict[str, int]:
+        """Return the resource usage counters of the processes of the node,
+        see Cgroup.usage(), or an empty dict if they are not tracked"""
+        return {} if self._cgroup is None else self._cgroup.usage()
+
+    @property
+    def channel(self) -> Optional[ExecChannel]:
+        """The execution channel of the node, started on first use, or None
+        if it cannot be used"""
+        with self._channel_lock:
+            if self._channel is None or not self._channel.alive:
+                if not getattr(self.node, 'exec_channel', True):
+                    return None  # Disabled
+                if self._terminated or not getattr(self.node, 'shell', None):
+                    return None  # The node is not running
+                try:
+                    self._channel = ExecChannel(self.node,
+                                                workers=self.channel_workers)
+                except OSError as e:
+                    lg.warning('Cannot start the execution channel of %s: '
+                               '%s\n' % (self.node.name, e))
+                    return None
+                cgroup = self.cgroup
+                if cgroup is not None:
+                    try:
+                        cgroup.attach(self._channel.pid)
+                    except OSError as e:
+                        lg.warning('Cannot move the execution channel of %s '
+                                   'in its cgroup: %s\n' % (self.node.name, e))
+            return self._channel
 
     def call(self, *args, **kwargs) -> Optional[str]:
         """Call a command, wait for it to end and return its output.
+        Unless kwargs are given or the command ends with '&', the command
+        runs in a new shell of the execution channel, in the working
+        directory of the network and without the state of the interactive
+        shell of the node, e.g., its variables or its current directory.
 
         :param args: the command + arguments
         :param kwargs: key-val arguments, as used in subprocess.Popen"""
-        return self.node.cmd(*args, **kwargs)
+        channel = self.channel
+        if channel is None or kwargs or _in_background(args):
+            # The channel waits for all the outputs of the command
+            return self.node.cmd(*args, **kwargs)
+        return channel.cmd(*args)
 
     def popen(self, *args, **kwargs) -> int:
         """Call a command and return a Popen handle to it.
@@ -42,6 +134,9 @@ class ProcessHelper:
         :param args: the command + arguments
         :param kwargs: key-val arguments, as used in subprocess.Popen
         :return: a process index in this family"""
+        cgroup = self.cgroup
+        if cgroup is not None:
+            kwargs['preexec_fn'] = cgroup.preexec_fn(kwargs.get('preexec_fn'))
         self._pid_gen += 1
         self._processes[self._pid_gen] = self.node.popen(*args, **kwargs)
         return self._pid_gen
@@ -49,7 +144,28 @@ class ProcessHelper:
     def pexec(self, *args, **kw) -> Tuple[str, str, int]:
         """Call a command, wait for it to terminate and save stdout, stderr and
         its return code"""
-        return self.node.pexec(*args, **kw)
+        channel = self.channel
+        if channel is None or set(kw) - {'shell', 'input'}:
+            return Node.pexec(self.node, *args, **kw)
+        return channel.pexec(*args, **kw)
+
+    async def acall(self, *args) -> Optional[str]:
+        """The asyncio version of call()"""
+        channel = self.channel
+        if channel is None or _in_background(args):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self.node.cmd, *args))
+        out, _, _ = await asyncio.wrap_future(
+            channel.submit(*args, shell=True, merge_stderr=True))
+        return out
+
+    async def apexec(self, *args, **kw) -> Tuple[str, str, int]:
+        """The asyncio version of pexec()"""
+        channel = self.channel
+        if channel is None or set(kw) - {'shell', 'input'}:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(Node.pexec, self.node, *args, **kw))
+        return await asyncio.wrap_future(channel.submit(*args, **kw))
 
     def get_process(self, pid):
         """Return a given process handle in this family
@@ -59,11 +175,20 @@ class ProcessHelper:
 
     def terminate(self):
         """Terminate all processes in this family"""
+        self._terminated = True
         for p in self._processes.values():
             try:
                 p.terminate()
             except OSError:
                 pass  # Process is already dead
+        with self._channel_lock:
+            if self._channel is not None:
+                self._channel.close()
+                self._channel = None
+        # Also stop the processes that left the handles, e.g., by daemonizing
+        if self._cgroup is not None:
+            self._cgroup.kill(grace=TERM_GRACE)
+            self._cgroup = None
 
 
 class IPNode(Node):
@@ -77,9 +202,15 @@ class IPNode(Node):
                  use_v4=True,
                  use_v6=True,
                  create_logdirs=True,
+                 cpu_quota: Optional[float] = None,
+                 cpu_weight: Optional[int] = None,
+                 memory_max: Union[None, int, str] = None,
+                 cpuset: Union[None, str, Sequence[int]] = None,
+                 exec_channel=True,
                  *args, **kwargs):
         """Most of the heavy lifting for this node should happen in the
-        associated config object.
+        associated config object. The resource limits of the processes of
+        the node are enforced through cgroup v2.
 
         :param config: The configuration generator for this node. Either a
                         class or a tuple (class, kwargs)
@@ -87,7 +218,23 @@ class IPNode(Node):
         :param process_manager: The class that will manage all the associated
                                 processes for this node
         :param use_v4: Whether this node has IPv4
-        :param use_v6: Whether this node has IPv6"""
+        :param use_v6: Whether this node has IPv6
+        :param cpu_quota: The number of CPUs that the processes of the node
+                          can use in total, e.g., 0.5
+        :param cpu_weight: The CPU share of the processes of the node when
+                           the CPUs are busy, from 1 to 10000 (default 100)
+        :param memory_max: The maximal memory of the processes of the node,
+                           in bytes or with a K, M, G or T suffix
+        :param cpuset: The CPUs on which the processes of the node run
+        :param exec_channel: Whether to run the commands of the node through
+                             a persistent worker process, see
+                             ipmininet.execchannel"""
+        # The interface files of the cgroup of the processes
+        self.resource_limits = resource_limits(cpu_quota=cpu_quota,
+                                               cpu_weight=cpu_weight,
+                                               memory_max=memory_max,
+                                               cpuset=cpuset)
+        self.exec_channel = exec_channel
         super().__init__(name, *args, **kwargs)
         self.use_v4 = use_v4
         self.use_v6 = use_v6
@@ -103,6 +250,9 @@ class IPNode(Node):
         else:
             self.nconfig = config(self)
         self._processes = process_manager(self)
+        # Set by IPNet, shared by all its nodes
+        self.components = None  # type: Optional[ComponentIndex]
+        self.network_cgroup = None  # type: Optional[Cgroup]
 
     def start(self):
         """Start the node: Configure the daemons, set the relevant sysctls,
@@ -111,37 +261,69 @@ class IPNode(Node):
         self.nconfig.build()
         # Check them
         err_code = False
-        for d in self.nconfig.daemons:
-            if self.create_logdirs and d.logdir:
-                self._mklogdirs(d.logdir)
-            out, err, code = self._processes.pexec(shlex.split(d.dry_run))
-            err_code = err_code or code
-            if code:
-                lg.error(d.NAME, 'configuration check failed ['
-                         'rcode:', code, ']\n'
-                         'stdout:', out, '\n'
-                         'stderr:', err)
+        for r in self.check_daemons():
+            err_code = err_code or r.code
+            if r.code:
+                lg.error(r.daemon, 'configuration check failed ['
+                         'rcode:', r.code, ']\n'
+                         'stdout:', r.out, '\n'
+                         'stderr:', r.err)
         if err_code:
-            lg.error('Config checks failed, aborting!')
-            mininet.clean.cleanup()
-            sys.exit(1)
+            raise ValueError('Config checks failed for node %s' % self.name)
         # Set relevant sysctls
         for opt, val in self.nconfig.sysctl:
             self._old_sysctl[opt] = self._set_sysctl(opt, val)
         # Fire up all daemons
         for d in self.nconfig.daemons:
             self._processes.popen(shlex.split(d.startup_line))
-            # Busy-wait if the daemon needs some time before being started
-            while not d.has_started():
-                time.sleep(.001)
+            # Wait if the daemon needs some time before being started
+            if not d.wait_ready():
+                raise ValueError('%s did not become ready on node %s after '
+                                 '%ss' % (d.NAME, self.name, d.READY_TIMEOUT))
+
+    def check_daemons(self) -> List['DryRun']:
+        """Check the configuration files of the daemons with their dry runs.
+        Configurations that were already successfully checked are skipped.
+
+        :return: The result of each dry run"""
+        from ipmininet.validation import dry_run  # Prevent circular imports
+        results = []
+        for d in self.nconfig.daemons:
+            if self.create_logdirs and d.logdir:
+                self._mklogdirs(d.logdir)
+            results.append(dry_run(self, d))
+        return results
+
+    def pexec(self, *args, **kwargs) -> Tuple[str, str, int]:
+        """Execute a command through the execution channel of the node,
+        for every caller of Node.pexec(). Set exec_channel=False to spawn a
+        process per command instead.
+
+        :return: (stdout, stderr, exit code)"""
+        processes = getattr(self, '_processes', None)
+        if processes is None:  # Still in Node.__init__()
+            return super().pexec(*args, **kwargs)
+        return processes.pexec(*args, **kwargs)
+
+    async def acmd(self, *args) -> Optional[str]:
+        """Run a command in a shell of the node without blocking the event
+        loop, and return its output as cmd() does"""
+        return await self._processes.acall(*args)
+
+    async def apexec(self, *args, **kwargs) -> Tuple[str, str, int]:
+        """Execute a command without blocking the event loop
+
+        :return: (stdout, stderr, exit code)"""
+        return await self._processes.apexec(*args, **kwargs)
 
     def terminate(self):
         """Stops this node and sets back all sysctls to their old values"""
-        self._processes.terminate()
-        if not DEBUG_FLAG:
-            self.nconfig.cleanup()
+        # Before terminating the processes, as this uses the execution channel
         for opt, val in self._old_sysctl.items():
             self._set_sysctl(opt, val)
+        if not DEBUG_FLAG:
+            self.nconfig.cleanup()
+        self._processes.terminate()
         super().terminate()
 
     def _set_sysctl(self, key: str, val: Union[str, int]):
@@ -175,6 +357,20 @@ class IPNode(Node):
                      '{}\n'.format(self.name, logdir, stderr))
         return (stdout, stderr, return_code)
 
+    def event_stream(self, kinds: Sequence[str] = KINDS,
+                     callback: Optional[Callable[[Event], None]] = None) \
+            -> EventStream:
+        """Stream the kernel events of this node, until the stream is closed
+
+        :param kinds: The kinds of events, see ipmininet.events
+        :param callback: A function called with each event"""
+        return EventStream([self], kinds=kinds, callback=callback)
+
+    def resource_usage(self) -> Dict[str, int]:
+        """Return the CPU, memory and process counters of the processes of
+        the node, e.g., usage_usec, nr_throttled, memory_current and pids"""
+        return self._processes.resource_usage()
+
     def get(self, key, val=None):
         """Check for a given key in the node parameters"""
         return self.params.get(key, val)
@@ -182,6 +378,8 @@ class IPNode(Node):
     def network_ips(self) -> Dict[str, List[str]]:
         """Return all the addresses of the nodes connected directly or not
         to this node"""
+        if self.components is not None:
+            return self.components.network_ips(self)
         ips = {}  # type: Dict[str, List[str]]
         visited = set()  # type: Set[str]
         to_visit = [self]
@@ -4,16 +4,22 @@ It also defines the base class for a daemon, as well as a minimalistic
 configuration for a router."""
 import os
 import abc
+import hashlib
+import json
+import re
+import tempfile
 from contextlib import closing
 from operator import attrgetter
-from ipaddress import ip_address
+from ipaddress import IPv4Interface
 from mako.lookup import TemplateLookup
 from typing import TYPE_CHECKING, Iterable, Optional, Dict, Union, Type, \
     Tuple, Sequence, List, Set
 
-from .utils import ConfigDict, ip_statement
-from ipmininet.utils import require_cmd, realIntfList
-from ipmininet.link import OrderedAddress, IPIntf
+from .utils import ConfigDict, ip_statement, config_digest
+from .readiness import ReadinessProbe, poll_until
+from ipmininet.allocator import RouterIdAllocator
+from ipmininet.utils import require_cmd
+from ipmininet.link import address_sort_key
 
 import mako.exceptions
 
@@ -21,15 +27,103 @@ from mininet.log import lg as log
 
 if TYPE_CHECKING:
     from ipmininet.router import IPNode, Router, OpenrRouter
+    from .bgp import IGPDistanceCache
     from ipmininet.iptopo import IPTopo
     from ipmininet.node_description import NodeDescription
 DaemonOption = Union['Daemon', Type['Daemon'],
                      Tuple[Union['Daemon', Type['Daemon']], Dict]]
 
-last_routerid = ip_address('0.0.0.1')
+# The compiled templates and their renderings are kept there across runs,
+# set IPMININET_TEMPLATE_CACHE to an empty string to disable it
+TEMPLATE_CACHE_DIR = os.environ.get('IPMININET_TEMPLATE_CACHE', os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'ipmininet', 'templates'))
+# The maximal number of cached renderings per template directory, the least
+# recently used ones are removed beyond
+RENDER_CACHE_SIZE = 4096
+
+# The templates that a template inherits, includes or imports
+_TEMPLATE_DEPENDENCY = re.compile(
+    r'<%\s*(?:inherit|include|namespace)\b[^>]*?\bfile\s*=\s*'
+    r'(["\'])(.*?)\1')
+# {(filename, last_modified): the uris of the templates it depends on}
+_template_dependencies = {}  # type: Dict[Tuple[str, float], List[str]]
+
+
+def template_lookup(directory: str) -> TemplateLookup:
+    """Return a lookup for the templates of a directory, whose compiled
+    modules are stored in TEMPLATE_CACHE_DIR if it is usable
+
+    :param directory: The template directory"""
+    module_directory = None
+    if TEMPLATE_CACHE_DIR:
+        # Different installations must not share their compiled templates
+        module_directory = os.path.join(
+            TEMPLATE_CACHE_DIR,
+            hashlib.sha1(os.path.abspath(directory).encode()).hexdigest())
+        try:
+            os.makedirs(module_directory, mode=0o700, exist_ok=True)
+            if not os.access(module_directory, os.W_OK):
+                module_directory = None
+            else:
+                _prune_renderings(os.path.join(module_directory, 'rendered'))
+        except OSError:
+            module_directory = None
+    return TemplateLookup(directories=[directory],
+                          module_directory=module_directory)
+
+
+def _prune_renderings(directory: str, size=None):
+    """Remove the least recently used renderings beyond RENDER_CACHE_SIZE"""
+    size = RENDER_CACHE_SIZE if size is None else size
+    try:
+        entries = sorted(os.scandir(directory),
+                         key=lambda e: e.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for entry in entries[size:]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _template_chain(lookup: TemplateLookup, template) -> Optional[List]:
+    """Return the filename and modification time of a template and of all
+    the templates that it inherits, includes or imports, recursively
+
+    :return: The list of [filename, modification time], or None if a
+             dependency is only known at rendering time"""
+    chain = []
+    seen = set()  # type: Set[str]
+    to_visit = [template]
+    while to_visit:
+        t = to_visit.pop()
+        if t.filename is None:
+            return None
+        if t.filename in seen:
+            continue
+        seen.add(t.filename)
+        chain.append([t.filename, t.last_modified])
+        key = (t.filename, t.last_modified)
+        uris = _template_dependencies.get(key)
+        if uris is None:
+            uris = [m.group(2) for m in
+                    _TEMPLATE_DEPENDENCY.finditer(t.source)]
+            _template_dependencies[key] = uris
+        for uri in uris:
+            if '${' in uri:
+                return None
+            try:
+                to_visit.append(lookup.get_template(
+                    lookup.adjust_uri(uri, t.uri)))
+            except mako.exceptions.TemplateLookupException:
+                return None
+    return chain
+
 
 __TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
-router_template_lookup = TemplateLookup(directories=[__TEMPLATES_DIR])
+router_template_lookup = template_lookup(__TEMPLATES_DIR)
 
 
 class NodeConfig:
@@ -53,19 +147,46 @@ class NodeConfig:
             self.register_daemon(d)
         self._cfg = ConfigDict()  # Our root config object
         self._sysctl = sysctl if sysctl is not None else {}
+        # The configuration files compiled ahead of time,
+        # see ipmininet.compiler
+        self.compiled = None  # type: Optional[Dict[str, Dict[str, Dict]]]
+        # Whether the daemons were prepared since the last build
+        self._prepared = False
 
     def build(self):
         """Build the configuration for each daemon, then write the
         configuration files"""
+        self.prepare()
+        if not self.load_compiled():
+            self.write(self.compile())
 
+    def prepare(self):
+        """Set up the private files of the node"""
         # Mount a separate /etc/resolv.conf and /etc/hosts for the node
         resolv_file_mount = os.path.join(self._node.cwd, 'resolv_%(name)s.conf')
         open(resolv_file_mount % self._node.__dict__, "w").close()
-        host_file_mount = os.path.join(self._node.cwd, 'hosts_%(name)s')
-        self.build_host_file(host_file_mount % self._node.__dict__)
+        components = getattr(self._node, 'components', None)
+        if components is not None:
+            # Shared by all the nodes of the component
+            host_file_mount = components.hosts_file(self._node)
+        else:
+            host_file_mount = os.path.join(self._node.cwd,
+                                           'hosts_%s' % self._node.name)
+            self.build_host_file(host_file_mount)
         self.add_private_fs_path([('/etc/resolv.conf', resolv_file_mount),
                                   ('/etc/hosts', host_file_mount)])
 
+    def compile(self) -> Dict[str, Dict[str, str]]:
+        """Build and render the configuration of each daemon
+
+        :return: The content of each configuration file, per daemon"""
+        self.prepare_daemons()
+        return self.render_daemons()
+
+    def prepare_daemons(self):
+        """Register the missing daemon dependencies and execute the post
+        registering actions. This has to happen in the main process as it
+        changes the state of the configuration."""
         self._cfg.clear()
         self._cfg.name = self._node.name
         # Check that all daemons have their dependencies satisfied
@@ -75,18 +196,71 @@ class NodeConfig:
                     self.register_daemon(c)
         # Execute any post registering action
         self.post_register_daemons()
+        self._prepared = True
+
+    def render_daemons(self) -> Dict[str, Dict[str, str]]:
+        """Build and render the configuration of each daemon, without
+        touching the node. This can run in a forked process.
+
+        :return: The content of each configuration file, per daemon"""
         # Build their config
         for name, d in self._daemons.items():
             self._cfg[name] = d.build()
-        # Write their config, using the global ConfigDict to handle
+        # Render their config, using the global ConfigDict to handle
         # dependencies
-        for d in self._daemons.values():
-            cfg = d.render(self._cfg)
+        return {name: d.render(self._cfg)
+                for name, d in self._daemons.items()}
+
+    def write(self, rendered: Dict[str, Dict[str, str]]):
+        """Write the configuration files of the daemons
+
+        :param rendered: The content of each configuration file, per daemon"""
+        for name, cfg in rendered.items():
+            d = self._daemons[name]
+            # The rendering may have happened in another process
+            d.files.extend(f for f in cfg if f not in d.files)
             d.write(cfg)
 
+    def load_compiled(self) -> bool:
+        """Write the configuration files compiled ahead of time, if they
+        match the current daemons and their manifest
+
+        :return: Whether the compiled files were used"""
+        compiled, self.compiled = self.compiled, None
+        prepared, self._prepared = self._prepared, False
+        if not compiled:
+            return False
+        # Preparing again would recompute the state that the files were
+        # compiled with, e.g., allocate another router id
+        if not prepared:
+            self.prepare_daemons()
+        if set(compiled) != set(self._daemons):
+            log.warning('*** The daemons of %s changed since its '
+                        'configuration was compiled\n' % self._node.name)
+            return False
+        rendered = {}  # type: Dict[str, Dict[str, str]]
+        for name, files in compiled.items():
+            for target, entry in files.items():
+                content = _read_file(entry['file'])
+                if content is None or hashlib.sha256(content.encode())\
+                        .hexdigest() != entry['sha256']:
+                    log.warning('*** The compiled configuration file %s of %s '
+                                'is missing or was modified\n'
+                                % (entry['file'], self._node.name))
+                    return False
+                rendered.setdefault(name, {})[target] = content
+        self.write(rendered)
+        return True
+
     def post_register_daemons(self):
         """Method called after all daemon classes were instantiated"""
 
+    def startup_dependencies(self) -> Set[str]:
+        """Return the names of the nodes that must be started before this
+        one, as required by its daemons"""
+        return {n for d in self._daemons.values()
+                for n in d.startup_dependencies()}
+
     def cleanup(self):
         """Cleanup all temporary files for the daemons"""
         for d in self._daemons.values():
@@ -187,42 +361,35 @@ class RouterConfig(NodeConfig):
             self._sysctl.update(sysctl)
         super().__init__(node, sysctl=self._sysctl, *args, **kwargs)
         self.routerid = None
+        # The router id of a cached address plan, used while the network starts
+        self.planned_routerid = None  # type: Optional[str]
+        # The router id given by the allocator, kept across builds
+        self._allocated_routerid = None  # type: Optional[str]
+        # Set by IPNet, shared by all its routers
+        self.routerid_allocator = None  # type: Optional[RouterIdAllocator]
+        self.igp_distances = None  # type: Optional[IGPDistanceCache]
 
     def post_register_daemons(self):
         self._cfg.password = self._node.password
         # Set the router id
         self.routerid = self.compute_routerid()
 
-    @staticmethod
-    def incr_last_routerid():
-        global last_routerid
-        last_routerid += 1
-
-    def _equal_routerid(self, n: 'Router') -> bool:
-
-        # Router id of 'n' already set
-        if n.nconfig.routerid:
-            return str(n.nconfig.routerid) != str(last_routerid)
-
-        # Check that a router id explicitly set
-        # in any other daemon is not in conflict
-        # with the current router id
-        for d in n.nconfig.daemons:
-            if d != self \
-                    and d.options.routerid \
-                    and str(d.options.routerid) == str(last_routerid):
-                return True
-
-        # Check that the most-visible IPv4 address is not in conflict
-        # with the current router id
-        ip_list = sorted((ip for itf in n.intfList()
-                          for ip in itf.ips()),
-                         key=OrderedAddress)
-        if len(ip_list) != 0 \
-                and str(ip_list.pop().ip) == str(last_routerid):
-            return True
-
-        return False
+    def known_routerids(self) -> List[str]:
+        """Return the router ids that this router uses or will use
+        without asking for a new one"""
+        routerids = [str(d.options.routerid) for d in self.daemons
+                     if d.options.routerid]
+        for routerid in (self.routerid, self.planned_routerid):
+            if routerid:
+                routerids.append(str(routerid))
+        ip = self._most_visible_ip()
+        if ip is not None:
+            routerids.append(ip.ip.compressed)
+        return routerids
+
+    def _most_visible_ip(self) -> Optional[IPv4Interface]:
+        return max((ip for itf in self._node.intfList() for ip in itf.ips()),
+                   key=address_sort_key, default=None)
 
     def compute_routerid(self) -> str:
         """Computes the default router id for all daemons.
@@ -231,34 +398,70 @@ class RouterConfig(NodeConfig):
         as the global router id.
         Otherwise if it has IPv4 addresses, it returns the most-visible one
         among its router interfaces.
-        If both conditions are wrong, it generates a unique router id."""
-
+        If both conditions are wrong, it gets a unique router id from the
+        allocator of the network, once."""
         for d in self.daemons:
             if d.options.routerid:
                 return d.options.routerid
+        ip = self._most_visible_ip()
+        # Already known from a cached address plan while the network starts,
+        # later builds recompute it as the addresses may have changed
+        if self.planned_routerid:
+            if ip is None:
+                # The previous run got it from the allocator
+                self._allocated_routerid = self.planned_routerid
+            return self.planned_routerid
+        if ip is not None:
+            return ip.ip.compressed
+        if self._allocated_routerid is None:
+            if self.routerid_allocator is None:
+                # The router is not part of an IPNet
+                self.routerid_allocator = RouterIdAllocator()
+                self.routerid_allocator.reserve(*self.known_routerids())
+            self._allocated_routerid = self.routerid_allocator.allocate()
+        return self._allocated_routerid
+
+
+def _read_file(path: Optional[str]) -> Optional[str]:
+    """Return the content of a file, or None if it cannot be read"""
+    if path is None:
+        return None
+    try:
+        with closing(open(path)) as f:
+            return f.read()
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
 
-        ip_list = sorted((ip for itf in self._node.intfList()
-                          for ip in itf.ips()),
-                         key=OrderedAddress)
-        if len(ip_list) == 0:
-
-            to_visit = realIntfList(self._node)
-            # Explore all routers to check that none has the same router id
-            while to_visit:
-                self.incr_last_routerid()
-                visited = set()  # type: Set[IPIntf]
-                while to_visit:
-                    i = to_visit.pop()
-                    if i in visited:
-                        continue
-                    visited.add(i)
-                    for n in i.broadcast_domain.routers:
-                        if self._equal_routerid(n.node):
-                            break  # We need to change the router id
-                        to_visit.extend(realIntfList(n.node))
-                to_visit = realIntfList(self._node) if to_visit else []
-            return last_routerid.compressed
-        return ip_list.pop().ip.compressed
+
+def _touch(path: str):
+    """Mark a cache entry as recently used"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _write_file(path: Optional[str], content: str, atomic=False):
+    """Write a file. Atomic writes never expose partial content but failures
+    are ignored, as befits cache entries."""
+    if path is None:
+        return
+    if not atomic:
+        with closing(open(path, 'w')) as f:
+            f.write(content)
+        return
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except (IOError, OSError) as e:
+        log.debug('Cannot cache a rendered template in %s: %s\n' % (path, e))
 
 
 class Daemon(metaclass=abc.ABCMeta):
@@ -272,6 +475,8 @@ class Daemon(metaclass=abc.ABCMeta):
     DEPENDS = ()  # type: Sequence[Type[Daemon]]
     # The kill patterns to cleanup any processes started by this daemon
     KILL_PATTERNS = ()  # type: Sequence[str]
+    # The maximal time to wait for this daemon to be ready, in seconds
+    READY_TIMEOUT = 30
 
     def __init__(self, node: 'IPNode',
                  template_lookup: TemplateLookup = router_template_lookup,
@@ -323,14 +528,22 @@ class Daemon(metaclass=abc.ABCMeta):
         self.files.extend(self.cfg_filenames)
         cfg_content = {}
         for i, filename in enumerate(self.cfg_filenames):
-            log.debug('Generating %s\n' % filename)
             try:
                 cfg.current_filename = filename
-                kwargs["node"] = cfg
-                kwargs["ip_statement"] = ip_statement
                 template = self.template_lookup.get_template(
                     self.template_filenames[i])
+                cache_path = self._render_cache_path(template, cfg, kwargs)
+                content = _read_file(cache_path)
+                if content is not None:
+                    log.debug('Reusing the rendering of %s\n' % filename)
+                    _touch(cache_path)
+                    cfg_content[filename] = content
+                    continue
+                log.debug('Generating %s\n' % filename)
+                kwargs["node"] = cfg
+                kwargs["ip_statement"] = ip_statement
                 cfg_content[filename] = template.render(**kwargs)
+                _write_file(cache_path, cfg_content[filename], atomic=True)
             except Exception:
                 # Display template errors in a less cryptic way
                 log.error('Couldn''t render a config file(',
@@ -340,13 +553,34 @@ class Daemon(metaclass=abc.ABCMeta):
                     self._node.name, self.NAME))
         return cfg_content
 
+    def _render_cache_path(self, template, cfg, kwargs) -> Optional[str]:
+        """Return the path where the rendering of a template with the given
+        inputs is cached, if the lookup has a cache directory and if the
+        inputs can be hashed"""
+        directory = self.template_lookup.template_args.get('module_directory')
+        if directory is None:
+            return None
+        # A derived template must be rendered again when its bases change
+        chain = _template_chain(self.template_lookup, template)
+        if chain is None:
+            return None
+        kwargs = {k: v for k, v in kwargs.items()
+                  if k not in ('node', 'ip_statement')}
+        digest = config_digest([cfg, kwargs])
+        if digest is None:
+            return None
+        key = json.dumps([chain, digest])
+        return os.path.join(directory, 'rendered',
+                            hashlib.sha256(key.encode()).hexdigest())
+
     def write(self, cfg: Dict[str, str]):
-        """Write down the configuration files for this daemon
+        """Write down the configuration files for this daemon. The files
+        that already have the right content are left untouched.
 
         :param cfg: The configuration string for each filename"""
         for filename in self.cfg_filenames:
-            with closing(open(filename, 'w')) as f:
-                f.write(cfg[filename])
+            if _read_file(filename) != cfg[filename]:
+                _write_file(filename, cfg[filename])
 
     @property
     @abc.abstractmethod
@@ -404,9 +638,36 @@ class Daemon(metaclass=abc.ABCMeta):
     def set_defaults(self, defaults):
         """Update defaults to contain the defaults specific to this daemon"""
 
+    def readiness_probe(self) -> Optional[ReadinessProbe]:
+        """Return the probe telling whether this daemon is ready,
+        or None if it is ready as soon as it is launched"""
+        return None
+
     def has_started(self) -> bool:
         """Return whether this daemon has started or not"""
-        return True
+        probe = self.readiness_probe()
+        return probe is None or probe.check()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until this daemon is ready
+
+        :param timeout: The maximal time to wait, in seconds, defaults to
+                        READY_TIMEOUT
+        :return: Whether the daemon is ready"""
+        if timeout is None:
+            timeout = self.READY_TIMEOUT
+        probe = self.readiness_probe()
+        if probe is None:
+            # Subclasses may still override has_started()
+            return poll_until(self.has_started, timeout)
+        log.debug('Waiting for', self.NAME, 'on', self._node.name, 'with',
+                  str(probe), '\n')
+        return probe.wait(timeout)
+
+    def startup_dependencies(self) -> Sequence[str]:
+        """Return the names of the nodes that must be started before the
+        node of this daemon"""
+        return ()
 
     @classmethod
     def get_config(cls, topo: 'IPTopo', node: 'NodeDescription', **kwargs):
@@ -1,6 +1,8 @@
 """Base classes to configure a BGP daemon"""
 import heapq
-from typing import Sequence, TYPE_CHECKING, Optional, Union, Tuple, List, Set
+import threading
+from typing import Sequence, TYPE_CHECKING, Optional, Union, Tuple, List, \
+    Set, Dict
 
 import itertools
 
@@ -9,6 +11,7 @@ from ipaddress import ip_network, ip_address, IPv4Network, IPv6Network
 from ipmininet.link import IPIntf
 from ipmininet.overlay import Overlay
 from ipmininet.utils import realIntfList
+from .readiness import ListeningPortProbe
 from .zebra import QuaggaDaemon, Zebra, RouteMap, AccessList, \
     RouteMapMatchCond, CommunityList, RouteMapSetAction, PERMIT, DENY
 
@@ -360,6 +363,9 @@ class BGP(QuaggaDaemon):
         super().__init__(node=node, *args, **kwargs)
         self.port = port
 
+    def readiness_probe(self):
+        return ListeningPortProbe(self._node, self.port)
+
     def build(self):
         cfg = super().build()
         cfg.asn = self._node.asn
@@ -511,28 +517,61 @@ class Peer:
             -> Tuple[Optional[str], Optional['Router']]:
         """Return the IP address that base should try to contact to establish
         a peering"""
-        visited = set()  # type: Set[IPIntf]
+        distances = getattr(base.nconfig, 'igp_distances', None)
+        if distances is None:  # The router is not part of an IPNet
+            distances = IGPDistanceCache()
+        n = distances.peer_interface(base, peer)
+        if n is None:
+            return None, None
+        if not v6:
+            return n.ip, n.node
+        if n.ip6 and not ip_address(n.ip6).is_link_local:
+            return n.ip6, n.node
+        return None, None
+
+
+class IGPDistanceCache:
+    """The closest interface of every router, as seen by a given router
+    through the IGP of its AS. The shortest paths from a router are only
+    computed once and are shared by all its BGP sessions."""
+
+    def __init__(self):
+        # {base router: {router: its closest interface}}
+        self._closest = {}  # type: Dict[str, Dict[str, IPIntf]]
+        self._lock = threading.Lock()
+
+    def peer_interface(self, base: 'Router', peer: str) -> Optional[IPIntf]:
+        """Return the interface of peer that is the closest to base
+
+        :param base: The router looking for the peer
+        :param peer: The name of the peer"""
+        with self._lock:
+            closest = self._closest.get(base.name)
+            if closest is None:
+                closest = self._closest[base.name] = self._explore(base)
+        return closest.get(peer)
+
+    @staticmethod
+    def _explore(base: 'Router') -> Dict[str, IPIntf]:
+        """Explore all interfaces in the AS of base by increasing IGP
+        distance, and record the first interface of each router reached"""
+        closest = {}  # type: Dict[str, IPIntf]
+        visited = set()  # type: Set[str]
         to_visit = {i.name: i for i in realIntfList(base)}
         prio_queue = [(0, i) for i in to_visit.keys()]
         heapq.heapify(prio_queue)
-        # Explore all interfaces in base ASN recursively, until we find one
-        # connected to the peer
-        while to_visit:
-            path_cost, i = heapq.heappop(prio_queue)
-            if i in visited:
+        while prio_queue:
+            path_cost, name = heapq.heappop(prio_queue)
+            if name in visited:
                 continue
-            i = to_visit.pop(i)
-            visited.add(i)
-            for n in i.broadcast_domain.routers:
-                if n.node.name == peer:
-                    if not v6:
-                        return n.ip, n.node
-                    if n.ip6 and not ip_address(n.ip6).is_link_local:
-                        return n.ip6, n.node
-                    return None, None
+            visited.add(name)
+            for n in to_visit[name].broadcast_domain.routers:
+                closest.setdefault(n.node.name, n)
+                # Only go through the routers of the AS
                 if n.node.asn == base.asn or not n.node.asn:
                     for i in realIntfList(n.node):
-                        to_visit[i.name] = i
-                        heapq.heappush(prio_queue, (path_cost + i.igp_metric,
-                                                    i.name))
-        return None, None
+                        if i.name not in visited:
+                            to_visit[i.name] = i
+                            heapq.heappush(prio_queue,
+                                           (path_cost + i.igp_metric, i.name))
+        return closest
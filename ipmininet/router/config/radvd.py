@@ -74,11 +74,11 @@ class RADVD(RouterDaemon):
         # Update with preset defaults
         cfg.update(self.options)
         # Track interfaces
-        cfg.interfaces = (ConfigDict(name=itf.name, description=itf.describe,
+        cfg.interfaces = [ConfigDict(name=itf.name, description=itf.describe,
                                      ra_prefixes=itf.ra_prefixes,
                                      rdnss_list=itf.rdnss_list)
                           for itf in realIntfList(self._node)
-                          if itf.ra_prefixes)
+                          if itf.ra_prefixes]
         # Fill AdvConnectedPrefix prefixes
         self._fill_connected_prefixes()
         # Fill AdvRDNSS IP addresses
@@ -0,0 +1,202 @@
+"""This module defines readiness probes, i.e. objects telling whether a
+daemon is ready to serve requests. They wait on kernel events when possible
+(e.g. inotify for unix sockets) or poll with an exponential backoff,
+instead of busy-waiting."""
+import abc
+import ctypes
+import ctypes.util
+import os
+import select
+import shlex
+import socket
+import time
+from typing import TYPE_CHECKING
+
+from mininet.log import lg as log
+
+if TYPE_CHECKING:
+    from ipmininet.router import IPNode
+
+# The initial and maximal delays between two polls, in seconds
+MIN_POLL_DELAY = .001
+MAX_POLL_DELAY = .1
+
+# inotify(7) constants
+IN_CREATE = 0x100
+IN_MOVED_TO = 0x80
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# TCP and UDP socket states, as reported in /proc/net/{tcp,udp}
+TCP_LISTEN = '0A'
+UDP_UNCONNECTED = '07'
+
+
+class ReadinessProbe(metaclass=abc.ABCMeta):
+    """A check telling whether a daemon is ready"""
+
+    @abc.abstractmethod
+    def check(self) -> bool:
+        """Return whether the daemon is ready right now"""
+
+    def wait(self, timeout: float) -> bool:
+        """Wait until the daemon is ready
+
+        :param timeout: The maximal time to wait, in seconds
+        :return: Whether the daemon became ready before the timeout"""
+        return poll_until(self.check, timeout)
+
+    def __str__(self):
+        return '<%s>' % type(self).__name__
+
+
+def poll_until(check, timeout: float) -> bool:
+    """Call check() until it returns True, with an exponential backoff
+    between the calls
+
+    :param check: The function to call
+    :param timeout: The maximal time to wait, in seconds
+    :return: Whether check() returned True before the timeout"""
+    deadline = time.monotonic() + timeout
+    delay = MIN_POLL_DELAY
+    while not check():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(2 * delay, MAX_POLL_DELAY)
+    return True
+
+
+class UnixSocketProbe(ReadinessProbe):
+    """Wait until a unix socket accepts connections. The creation of the
+    socket file is awaited through inotify if it is available."""
+
+    def __init__(self, path: str):
+        """:param path: The path to the unix socket"""
+        self.path = path
+
+    def check(self) -> bool:
+        return os.path.exists(self.path) and self.connectable()
+
+    def connectable(self) -> bool:
+        """Return whether a connection to the socket can be established"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            return True
+        except socket.error:
+            return False
+        finally:
+            sock.close()
+
+    def wait(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        if not os.path.exists(self.path):
+            try:
+                created = self._wait_creation(timeout)
+            except OSError as e:
+                log.debug('Cannot watch %s with inotify (%s), polling '
+                          'instead\n' % (self.path, e))
+                created = poll_until(lambda: os.path.exists(self.path),
+                                     timeout)
+            if not created:
+                return False
+        # The socket is bound before the daemon listens on it
+        return poll_until(self.connectable,
+                          max(0., deadline - time.monotonic()))
+
+    def _wait_creation(self, timeout: float) -> bool:
+        """Block until the socket file is created, using inotify and epoll
+
+        :raise OSError: if inotify is not available"""
+        libc = _libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if libc.inotify_add_watch(fd, directory.encode(),
+                                      IN_CREATE | IN_MOVED_TO) < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+            deadline = time.monotonic() + timeout
+            with select.epoll() as ep:
+                ep.register(fd, select.EPOLLIN)
+                # The watch is set, so the file cannot appear unnoticed
+                while not os.path.exists(self.path):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    if ep.poll(remaining):
+                        # We only use events as wake-ups, drain them
+                        try:
+                            os.read(fd, 4096)
+                        except BlockingIOError:
+                            pass
+            return True
+        finally:
+            os.close(fd)
+
+    def __str__(self):
+        return '<%s %s>' % (type(self).__name__, self.path)
+
+
+def _libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError('inotify is not supported by the C library')
+    return libc
+
+
+class ListeningPortProbe(ReadinessProbe):
+    """Wait until a socket is bound to the given port in the network
+    namespace of a node. The socket tables of the namespace are read from
+    /proc, hence no process is spawned to perform the check."""
+
+    def __init__(self, node: 'IPNode', port: int, proto='tcp'):
+        """:param node: The node in which the daemon runs
+        :param port: The port on which the daemon listens
+        :param proto: Either 'tcp' or 'udp'"""
+        self.node = node
+        self.port = port
+        self.proto = proto
+
+    def check(self) -> bool:
+        state = TCP_LISTEN if self.proto == 'tcp' else UDP_UNCONNECTED
+        port = '%04X' % self.port
+        for suffix in ('', '6'):
+            path = '/proc/%d/net/%s%s' % (self.node.pid, self.proto, suffix)
+            try:
+                with open(path) as f:
+                    next(f)  # Skip the header
+                    for line in f:
+                        fields = line.split()
+                        if fields[1].rsplit(':', 1)[1] == port \
+                                and fields[3] == state:
+                            return True
+            except (IOError, OSError, StopIteration, IndexError):
+                continue
+        return False
+
+    def __str__(self):
+        return '<%s %s/%s on %s>' % (type(self).__name__, self.proto,
+                                     self.port, self.node.name)
+
+
+class CommandProbe(ReadinessProbe):
+    """Wait until a command succeeds in the node,
+    e.g. a vtysh or rndc liveness check"""
+
+    def __init__(self, node: 'IPNode', cmd: str):
+        """:param node: The node in which the command is run
+        :param cmd: The command to run"""
+        self.node = node
+        self.cmd = cmd
+
+    def check(self) -> bool:
+        _, _, code = self.node._processes.pexec(shlex.split(self.cmd))
+        return code == 0
+
+    def __str__(self):
+        return '<%s "%s" on %s>' % (type(self).__name__, self.cmd,
+                                    self.node.name)
@@ -5,6 +5,9 @@ import os
 import tempfile
 
 from .base import Daemon
+from .readiness import ListeningPortProbe
+
+SSHD_DEFAULT_PORT = 22
 
 
 # Generate a new ssh keypair at each run
@@ -34,6 +37,9 @@ class SSHd(Daemon):
     def dry_run(self):
         return '%s -t' % self.startup_line
 
+    def readiness_probe(self):
+        return ListeningPortProbe(self._node, SSHD_DEFAULT_PORT)
+
     def set_defaults(self, defaults):
         super().set_defaults(defaults)
 
@@ -1,6 +1,13 @@
 """This modules contains various utilities to streamline config generation"""
-from ipaddress import ip_interface, IPv6Address, IPv4Address
-from typing import Union
+import hashlib
+import json
+from types import FunctionType, BuiltinFunctionType
+from ipaddress import ip_interface, IPv6Address, IPv4Address, \
+    _BaseAddress, _BaseNetwork
+from typing import Union, Optional, Dict, Set
+
+from mininet.link import Intf
+from mininet.node import Node
 
 
 class ConfigDict(dict):
@@ -36,3 +43,86 @@ def ip_statement(ip: Union[int, str, IPv6Address, IPv4Address]):
     if not isinstance(ip, int):
         ip = ip_interface(str(ip)).version
     return 'ipv6' if ip == 6 else 'ip'
+
+
+# The attributes of the nodes describing their running shell, not their
+# configuration
+_RUNTIME_ATTRIBUTES = frozenset(('decoder', 'execed', 'lastCmd', 'lastPid',
+                                 'pid', 'pollOut', 'readbuf', 'shell',
+                                 'slave', 'stdin', 'stdout', 'waitExited',
+                                 'waiting'))
+
+
+def _plain(x) -> bool:
+    """Return whether x only holds values without references to other
+    objects, e.g., a list of addresses"""
+    if x is None or isinstance(x, (bool, int, float, str, _BaseAddress,
+                                   _BaseNetwork)):
+        return True
+    if isinstance(x, dict):
+        return all(_plain(k) and _plain(v) for k, v in x.items())
+    if isinstance(x, (list, tuple, set, frozenset)):
+        return all(_plain(v) for v in x)
+    return False
+
+
+def _canonical(x, memo: Dict[int, object], path: Set[int]):
+    """Return a JSON-serializable value describing x
+
+    :raise TypeError: if x cannot be described reliably"""
+    if x is None or isinstance(x, (bool, int, float, str)):
+        return x
+    if isinstance(x, (_BaseAddress, _BaseNetwork)):
+        return ['ip', str(x)]
+    if isinstance(x, (Node, Intf)):
+        # Do not explore the whole network through their links and nodes,
+        # but describe the plain attributes that templates could read
+        attributes = {k: v for k, v in vars(x).items()
+                      if not k.startswith('_') and k not in _RUNTIME_ATTRIBUTES
+                      and _plain(v)}
+        attributes['params'] = {k: v for k, v in
+                                getattr(x, 'params', {}).items()
+                                if _plain(v)}
+        return [type(x).__qualname__, x.name,
+                _canonical(attributes, memo, path)]
+    if isinstance(x, (type, FunctionType, BuiltinFunctionType)):
+        return ['f', '%s.%s' % (getattr(x, '__module__', ''),
+                                getattr(x, '__qualname__', repr(x)))]
+    if id(x) in memo:
+        return memo[id(x)]
+    if id(x) in path:
+        return ['cycle']
+    path.add(id(x))
+    try:
+        if isinstance(x, dict):
+            items = [[_canonical(k, memo, path), _canonical(v, memo, path)]
+                     for k, v in x.items()]
+            value = ['d', sorted(items, key=json.dumps)]
+        elif isinstance(x, (list, tuple)):
+            value = ['l', [_canonical(v, memo, path) for v in x]]
+        elif isinstance(x, (set, frozenset)):
+            value = ['s', sorted((_canonical(v, memo, path) for v in x),
+                                 key=json.dumps)]
+        elif hasattr(x, '__dict__'):
+            value = ['o', type(x).__qualname__,
+                     _canonical(vars(x), memo, path)]
+        else:
+            # e.g., generators, which could only be rendered once anyway
+            raise TypeError('Cannot describe %s' % type(x))
+    finally:
+        path.discard(id(x))
+    memo[id(x)] = value
+    return value
+
+
+def config_digest(cfg) -> Optional[str]:
+    """Return a digest of a configuration tree, which only changes when the
+    tree does
+
+    :param cfg: The ConfigDict-like object
+    :return: The digest or None if some values could not be described"""
+    try:
+        description = _canonical(cfg, {}, set())
+    except TypeError:
+        return None
+    return hashlib.sha256(json.dumps(description).encode()).hexdigest()
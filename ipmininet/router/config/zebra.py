@@ -1,9 +1,9 @@
 import os
-import socket
 from ipaddress import IPv4Network, IPv6Network
 from typing import Optional, Union, Sequence, Tuple
 
 from .base import RouterDaemon
+from .readiness import UnixSocketProbe
 from .utils import ConfigDict
 
 #  Route Map actions
@@ -66,9 +66,9 @@ class Zebra(QuaggaDaemon):
         # Update with preset defaults
         cfg.update(self.options)
         # Track interfaces
-        cfg.interfaces = (ConfigDict(name=itf.name,
+        cfg.interfaces = [ConfigDict(name=itf.name,
                                      description=itf.describe)
-                          for itf in self._node.intfList())
+                          for itf in self._node.intfList()]
         return cfg
 
     def set_defaults(self, defaults):
@@ -80,19 +80,12 @@ class Zebra(QuaggaDaemon):
         defaults.route_maps = []
         super().set_defaults(defaults)
 
-    def has_started(self):
-        # We override this such that we wait until we have the API socket
-        # and until wa can connect to it
-        return os.path.exists(self.zebra_socket) and self.listening()
+    def readiness_probe(self):
+        # We wait until we have the API socket and until we can connect to it
+        return UnixSocketProbe(self.zebra_socket)
 
     def listening(self) -> bool:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        try:
-            sock.connect(self.zebra_socket)
-            sock.close()
-            return True
-        except socket.error:
-            return False
+        return UnixSocketProbe(self.zebra_socket).connectable()
 
 
 class CommunityList:
@@ -0,0 +1,135 @@
+"""This module defines a scheduler that starts the nodes of a network on a
+bounded pool of workers, while respecting the ordering constraints that
+exist between them (e.g. DNS masters have to be running before their
+slaves)."""
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, \
+    wait
+from operator import methodcaller
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from mininet.log import lg as log
+from mininet.node import Node
+
+
+class StartupError(Exception):
+    """Raised when a node could not be started by the scheduler"""
+
+
+class StartupScheduler:
+    """Start a set of nodes, possibly several at the same time.
+    A node is only started once all the nodes it depends on have successfully
+    started. The failures are collected and reported at the end of the run
+    instead of aborting at the first one."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """:param max_workers: The maximal number of nodes starting at the
+                               same time. None lets the ThreadPoolExecutor
+                               choose a default. With 1 worker, the nodes are
+                               started one after the other, in the order in
+                               which they were added, from the calling
+                               thread."""
+        self.max_workers = max_workers
+        self._nodes = {}  # type: Dict[str, Node]
+        self._depends = {}  # type: Dict[str, Set[str]]
+
+    def add(self, node: Node, after: Iterable[str] = ()):
+        """Register a node to start
+
+        :param node: The node to start
+        :param after: The names of the nodes that must be started before"""
+        self._nodes[node.name] = node
+        self._depends.setdefault(node.name, set()).update(after)
+
+    def add_dependency(self, node: str, after: str):
+        """Require that a node only starts once another one has started
+
+        :param node: The name of the node that has to wait
+        :param after: The name of the node that has to start first"""
+        self._depends.setdefault(node, set()).add(after)
+
+    def _waiting_for(self) -> Dict[str, Set[str]]:
+        """Return, for each node, the set of known nodes it waits for"""
+        waiting = {}  # type: Dict[str, Set[str]]
+        for name in self._nodes:
+            deps = self._depends.get(name, set())
+            for d in deps:
+                if d not in self._nodes:
+                    log.warning('*** Ignoring unknown startup dependency',
+                                d, 'of', name, '\n')
+            waiting[name] = {d for d in deps if d in self._nodes and d != name}
+        return waiting
+
+    def run(self, start: Callable[[Node], None] = methodcaller('start')) \
+            -> Dict[str, BaseException]:
+        """Start all registered nodes
+
+        :param start: The function to call to start a node
+        :return: The nodes that failed to start, with the associated error.
+                 Nodes depending on a failed node are never started and
+                 are also reported."""
+        waiting = self._waiting_for()
+        dependents = {name: [] for name in self._nodes}  # type: Dict
+        for name, deps in waiting.items():
+            for d in deps:
+                dependents[d].append(name)
+        # Dicts keep their insertion order, so ready nodes are launched in
+        # the order in which they were added
+        ready = [name for name in self._nodes if not waiting[name]]
+        failures = {}  # type: Dict[str, BaseException]
+
+        def _start(name: str) -> Optional[BaseException]:
+            log.info(name + ' ')
+            try:
+                start(self._nodes[name])
+            except KeyboardInterrupt:
+                raise
+            except BaseException as e:  # Also catches sys.exit()
+                return e
+            return None
+
+        def _done(name: str, error: Optional[BaseException]):
+            if error is not None:
+                failures[name] = error
+                self._skip_dependents(name, dependents, failures)
+                return
+            for n in dependents[name]:
+                waiting[n].discard(name)
+                if not waiting[n] and n not in failures:
+                    ready.append(n)
+
+        if self.max_workers == 1:
+            while ready:
+                name = ready.pop(0)
+                _done(name, _start(name))
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                running = {}  # type: Dict[Future, str]
+                while ready or running:
+                    while ready:
+                        name = ready.pop(0)
+                        running[pool.submit(_start, name)] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        _done(running.pop(f), f.result())
+
+        # Whatever is left waits on a dependency cycle
+        for name in self._nodes:
+            if waiting[name] and name not in failures:
+                failures[name] = StartupError('Unsatisfiable startup '
+                                              'dependencies (cycle?): '
+                                              'waiting for %s' %
+                                              sorted(waiting[name]))
+        return failures
+
+    @staticmethod
+    def _skip_dependents(name: str, dependents: Dict[str, List[str]],
+                         failures: Dict[str, BaseException]):
+        """Mark all the nodes depending, directly or not, on a failed node"""
+        to_visit = list(dependents[name])
+        while to_visit:
+            n = to_visit.pop()
+            if n in failures:
+                continue
+            failures[n] = StartupError('Not started as it depends on %s, '
+                                       'which failed to start' % name)
+            to_visit.extend(dependents[n])
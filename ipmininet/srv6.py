@@ -86,7 +86,7 @@ class LocalSIDTable:
 
         # Find Free table number
         tables = []
-        out = self.node.cmd("ip rule list")
+        out = self.node.pexec(shlex.split("ip rule list"))[0]
         lines = out.split("\n")
         for line in lines:
             if "lookup " in line:
@@ -122,10 +122,11 @@ class LocalSIDTable:
                       .format(cmd=cmd, out=out, err=err))
 
     def clean(self):
-        self.node.cmd("ip -6 route flush table {num}".format(num=self.num))
+        self.node.pexec(shlex.split("ip -6 route flush table {num}"
+                                    .format(num=self.num)))
         for prefix in self.prefixes:
-            self.node.cmd(shlex.split("ip rule del to {prefix} table {num}"
-                                      .format(prefix=prefix, num=self.num)))
+            self.node.pexec(shlex.split("ip rule del to {prefix} table {num}"
+                                        .format(prefix=prefix, num=self.num)))
 
 
 class SRv6Route(metaclass=abc.ABCMeta):
@@ -1,5 +1,9 @@
+import time
+from ipaddress import ip_network
+
 import pytest
 
+from ipmininet.allocator import RouterIdAllocator
 from ipmininet.clean import cleanup
 from ipmininet.examples.simple_bgp_network import SimpleBGPTopo
 from ipmininet.examples.simple_ospf_network import SimpleOSPFNet
@@ -40,6 +44,69 @@ def test_v4_and_v6_only_network(topo, use_v4, use_v6):
                     assert len(list(itf.ip6s(exclude_lls=True))) == 0, \
                         "Should not allocate IPv6 addresses on interface " \
                         "{}".format(itf)
+        routerids = [r.nconfig.routerid for r in net.routers]
+        assert len(set(routerids)) == len(routerids), \
+            "The router ids are not unique"
         net.stop()
     finally:
         cleanup()
+
+
+class FakeDomain:
+
+    def __init__(self, prefixlen, use_v4=True):
+        self.max_v4prefixlen = prefixlen
+        self.use_v4 = use_v4
+        self.interfaces = set()
+        self.net = None
+
+    def len_v4(self):
+        return 2 ** (32 - self.max_v4prefixlen)
+
+    def use_ip_version(self, ip_version):
+        return self.use_v4
+
+
+def test_allocate_subnets():
+    subnets = [ip_network('10.0.0.0/24')]
+    domains = [FakeDomain(30), FakeDomain(26), FakeDomain(31),
+               FakeDomain(30, use_v4=False), FakeDomain(28)]
+    IPNet._allocate_subnets(subnets, domains, max_prefixlen=30,
+                            allocated_subnets=[ip_network('10.0.0.64/28'),
+                                               ip_network('10.0.0.72/29')])
+    nets = sorted(str(d.net) for d in domains if d.net is not None)
+    # The biggest domains come first and take the smallest blocks that can
+    # contain them, around the pre-allocated subnets
+    assert nets == ['10.0.0.0/26', '10.0.0.100/30', '10.0.0.80/28',
+                    '10.0.0.96/30']
+    assert [str(n) for n in subnets] == ['10.0.0.104/29', '10.0.0.112/28',
+                                         '10.0.0.128/25']
+
+    with pytest.raises(ValueError):
+        IPNet._allocate_subnets(subnets, [FakeDomain(25)])
+
+
+def test_allocate_subnets_scaling():
+    subnets = [ip_network('10.0.0.0/8')]
+    domains = [FakeDomain(31) for _ in range(50000)]
+    t = time.time()
+    IPNet._allocate_subnets(subnets, domains, max_prefixlen=31)
+    assert time.time() - t < 5
+    assert len({d.net for d in domains}) == len(domains)
+    assert max(d.net for d in domains) == ip_network('10.1.134.158/31')
+
+
+def test_routerid_allocator():
+    allocator = RouterIdAllocator()
+    allocator.reserve('0.0.0.2', '0.0.0.4', '10.0.0.1')
+    assert [allocator.allocate() for _ in range(4)] == \
+        ['0.0.0.1', '0.0.0.3', '0.0.0.5', '0.0.0.6']
+
+    allocator = RouterIdAllocator()
+    allocator.reserve(*('0.0.%d.%d' % (i // 256, i % 256)
+                        for i in range(1, 50001)))
+    t = time.process_time()
+    routerids = [allocator.allocate() for _ in range(50000)]
+    assert time.process_time() - t < 1, "Router id allocation is too slow"
+    assert routerids[0] == '0.0.195.81'
+    assert len(set(routerids)) == len(routerids)
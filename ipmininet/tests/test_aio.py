@@ -0,0 +1,75 @@
+import asyncio
+import subprocess
+import time
+from unittest import mock
+
+import pytest
+
+from ipmininet.ipnet import IPNet
+from ipmininet.router import IPNode, ProcessHelper
+
+
+class FakeNode:
+    """Runs the commands in the current namespaces"""
+    shell = True
+
+    def __init__(self, name, exec_channel=True):
+        self.name = name
+        self.exec_channel = exec_channel
+
+    def popen(self, cmd, **kwargs):
+        return subprocess.Popen(cmd, **kwargs)
+
+    def cmd(self, *args):
+        return subprocess.run(' '.join(args), shell=True,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
+                              universal_newlines=True).stdout
+
+
+def fake_ipnode(name: str) -> IPNode:
+    """An IPNode running its commands through the execution channel of a
+    FakeNode"""
+    node = mock.Mock(spec=IPNode)
+    node.name = name
+    node._processes = ProcessHelper(FakeNode(name), channel_workers=4)
+    node.acmd = node._processes.acall
+    return node
+
+
+@pytest.mark.parametrize('exec_channel', [True, False])
+def test_process_helper(exec_channel):
+    helper = ProcessHelper(FakeNode('n1', exec_channel=exec_channel))
+
+    async def run():
+        out = await helper.acall('echo out; echo err >&2')
+        result = await helper.apexec(['sh', '-c', 'echo $0; exit 2', 'x'])
+        return out, result
+
+    try:
+        assert asyncio.run(run()) == ('out\nerr\n', ('x\n', '', 2))
+        # Without channel, the commands run in the executor of the loop
+        assert (helper._channel is not None) == exec_channel
+    finally:
+        helper.terminate()
+
+
+def test_gather_cmd():
+    net = mock.Mock(spec=IPNet)
+    net.routers = [fake_ipnode('r%d' % i) for i in range(3)]
+    # Not an IPNode, its commands run in the executor of the loop
+    net.hosts = [FakeNode('h1')]
+    nodes = net.routers + net.hosts
+    try:
+        start = time.time()
+        outputs = asyncio.run(IPNet.gather_cmd(net, None,
+                                               'sleep .5; echo done'))
+        assert outputs == {n.name: 'done\n' for n in nodes}
+        assert time.time() - start < 2.
+
+        outputs = asyncio.run(IPNet.gather_cmd(net, net.routers, 'echo', 'x',
+                                               limit=2))
+        assert outputs == {n.name: 'x\n' for n in net.routers}
+    finally:
+        for r in net.routers:
+            r._processes.terminate()
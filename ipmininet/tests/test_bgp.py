@@ -1,4 +1,5 @@
 """This module tests the BGP daemon"""
+import time
 
 import pytest
 
@@ -18,7 +19,9 @@ from ipmininet.ipnet import IPNet
 from ipmininet.iptopo import IPTopo
 from ipmininet.router.config import BGP, bgp_peering, AS, iBGPFullMesh
 from ipmininet.router.config.base import RouterConfig
-from ipmininet.router.config.bgp import AF_INET, AF_INET6, CLIENT_PROVIDER
+from ipmininet.router.config.bgp import AF_INET, AF_INET6, CLIENT_PROVIDER, \
+    Peer, IGPDistanceCache
+from ipmininet.router.config.utils import ConfigDict
 from ipmininet.tests.utils import assert_connectivity, assert_path
 from . import require_root
 
@@ -293,3 +296,76 @@ def test_bgp_policies_adjust():
         net.stop()
     finally:
         cleanup()
+
+
+class FakeDomain:
+
+    def __init__(self):
+        self.routers = []
+
+
+class FakeIntf:
+
+    def __init__(self, node, domain, ip, ip6, igp_metric=1):
+        self.node = node
+        self.name = '%s-eth%d' % (node.name, len(node.intfs))
+        self.broadcast_domain = domain
+        self.ip = ip
+        self.ip6 = ip6
+        self.igp_metric = igp_metric
+        node.intfs.append(self)
+        domain.routers.append(self)
+
+
+class FakeRouter:
+
+    def __init__(self, name, asn):
+        self.name = name
+        self.asn = asn
+        self.intfs = []
+        self.nconfig = None
+
+    def intfList(self):
+        return self.intfs
+
+
+def _link(r1, r2, i, igp_metric=1):
+    d = FakeDomain()
+    FakeIntf(r1, d, '10.0.%d.1' % i, 'fc00:%d::1' % i, igp_metric)
+    FakeIntf(r2, d, '10.0.%d.2' % i, 'fe80::%d:2' % i, igp_metric)
+
+
+def test_find_peer_address():
+    r1, r2, r3, r4 = (FakeRouter('r%d' % i, 1) for i in range(1, 5))
+    x = FakeRouter('x', 2)
+    _link(r1, r2, 1)
+    _link(r2, r3, 2)
+    _link(r1, r4, 3, igp_metric=10)
+    _link(r4, r3, 4, igp_metric=10)
+    _link(x, r3, 5)
+    find = Peer._find_peer_address
+    # The shortest IGP path is used to reach r3
+    assert find(r1, 'r3') == ('10.0.2.2', r3)
+    # Link-local addresses are not used
+    assert find(r1, 'r3', v6=True) == (None, None)
+    assert find(r3, 'r4', v6=True) == ('fc00:4::1', r4)
+    # The routers of other ASes are reached but not crossed
+    assert find(r1, 'x') == ('10.0.5.1', x)
+    assert find(x, 'r1') == (None, None)
+
+
+def test_find_peer_address_scaling():
+    """A full mesh of iBGP sessions only explores the AS once per router"""
+    routers = [FakeRouter('r%d' % i, 1) for i in range(300)]
+    for i in range(len(routers) - 1):
+        _link(routers[i], routers[i + 1], i)
+    distances = IGPDistanceCache()
+    for r in routers:
+        r.nconfig = ConfigDict(igp_distances=distances)
+    t = time.process_time()
+    for r in routers:
+        for peer in routers:
+            if peer is not r:
+                assert Peer._find_peer_address(r, peer.name)[1] is peer
+    assert time.process_time() - t < 5, \
+        "Peer address resolution does not scale"
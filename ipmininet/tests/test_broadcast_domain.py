@@ -0,0 +1,174 @@
+import time
+
+import pytest
+
+from ipmininet.components import ComponentIndex
+from ipmininet.ipnet import IPNet
+from ipmininet.router import Router
+from ipmininet.utils import DisjointSet
+
+from mininet.node import Host
+
+
+class FakeIntf:
+
+    def __init__(self, node, name):
+        self.node = node
+        self.name = name
+        self.link = None
+        self.broadcast_domain = None
+        node.intfs[len(node.intfs)] = self
+
+    def ips(self):
+        return iter(())
+
+    def ip6s(self, exclude_lls=False):
+        return iter(())
+
+    def __repr__(self):
+        return self.name
+
+
+class FakeLink:
+
+    def __init__(self, node1, node2):
+        self.intf1 = FakeIntf(node1, '%s-eth%d' % (node1.name,
+                                                   len(node1.intfs)))
+        self.intf2 = FakeIntf(node2, '%s-eth%d' % (node2.name,
+                                                   len(node2.intfs)))
+        self.intf1.link = self.intf2.link = self
+
+
+class FakeHost(Host):
+
+    def __init__(self, name):  # Does not create a namespace
+        self.name = name
+        self.intfs = {}
+
+
+class FakeSwitch:
+
+    def __init__(self, name):
+        self.name = name
+        self.intfs = {}
+
+    def intfList(self):
+        return [self.intfs[p] for p in sorted(self.intfs.keys())]
+
+
+class FakeNet:
+    """Switches in a chain, with hosts hanging from them"""
+
+    routers = []
+
+    def __init__(self, n_switches, n_hosts_per_switch):
+        self.nodes = []
+        prev = None
+        for i in range(n_switches):
+            s = FakeSwitch('s%d' % i)
+            self.nodes.append(s)
+            if prev is not None:
+                FakeLink(prev, s)
+            prev = s
+            for j in range(n_hosts_per_switch):
+                h = FakeHost('h%d-%d' % (i, j))
+                self.nodes.append(h)
+                FakeLink(h, s)
+        # An isolated pair of hosts
+        h1, h2 = FakeHost('x1'), FakeHost('x2')
+        FakeLink(h1, h2)
+        self.nodes.extend((h1, h2))
+
+    def values(self):
+        return self.nodes
+
+
+def test_disjoint_set():
+    sets = DisjointSet()
+    for i in range(0, 10, 2):
+        sets.union(i, i + 2)
+    sets.union(1, 3)
+    assert sets.find(0) is sets.find(10)
+    assert sets.find(1) is sets.find(3)
+    assert sets.find(0) is not sets.find(1)
+    assert sets.find(5) == 5
+
+
+def test_broadcast_domains():
+    net = FakeNet(3, 2)
+    domains = IPNet._broadcast_domains(net)
+    assert len(domains) == 2
+    assert sorted(i.name for i in domains[0]) == \
+        ['h%d-%d-eth0' % (i, j) for i in range(3) for j in range(2)]
+    assert sorted(i.name for i in domains[1]) == ['x1-eth0', 'x2-eth0']
+    for d in domains:
+        for i in d:
+            assert i.broadcast_domain is d
+
+
+def _discovery_time(n_hosts):
+    net = FakeNet(n_hosts // 100, 100)
+    t = time.process_time()
+    domains = IPNet._broadcast_domains(net)
+    elapsed = time.process_time() - t
+    assert len(domains) == 2
+    return elapsed
+
+
+@pytest.mark.parametrize("n_hosts", [10000, 50000])
+def test_broadcast_domains_scaling(n_hosts):
+    """The discovery should scale linearly with the number of interfaces
+    (each host adds two interfaces, its own and the one of the switch)"""
+    small = _discovery_time(n_hosts // 10)
+    big = _discovery_time(n_hosts)
+    assert big < 30 * max(small, .001), \
+        "Broadcast domain discovery does not scale linearly"
+
+
+class FakeRouter(Router):
+
+    def __init__(self, name):  # Does not create a namespace
+        self.name = name
+        self.intfs = {}
+        FakeIntf(self, 'lo')
+
+    def intf(self, intf=None):
+        return next(i for i in self.intfs.values() if i.name == intf)
+
+
+class FakeRoutedNet(FakeNet):
+    """h1 and h2 hang from a switch, connected through r1 and r2 to h3,
+    while x1 and x2 are isolated"""
+
+    def __init__(self):
+        super().__init__(0, 0)
+        self.h1, self.h2, self.h3 = (FakeHost('h%d' % i) for i in (1, 2, 3))
+        self.s1 = FakeSwitch('s1')
+        self.routers = [FakeRouter('r1'), FakeRouter('r2')]
+        r1, r2 = self.routers
+        for n1, n2 in ((self.h1, self.s1), (self.h2, self.s1), (r1, self.s1),
+                       (r1, r2), (r2, self.h3)):
+            FakeLink(n1, n2)
+        self.nodes.extend([self.h1, self.h2, self.h3, self.s1, r1, r2])
+
+
+def test_component_index(tmp_path):
+    net = FakeRoutedNet()
+    index = ComponentIndex(net.values(), IPNet._broadcast_domains(net))
+    r1, r2 = net.routers
+    x1, x2 = net.nodes[:2]
+    assert index.find_node(net.h1, 'h3') is net.h3.intfs[0]
+    assert index.find_node(net.h3, 'h2') is net.h2.intfs[0]
+    assert index.find_node(net.h3, 'r1') in r1.intfList()
+    assert index.find_node(x1, 'x2') is x2.intfs[0]
+    assert index.find_node(x1, 'h1') is None
+    assert index.find_node(net.h1, 'unknown') is None
+    assert sorted(index._members[index._component['h1']]) == \
+        ['h1', 'h2', 'h3', 'r1', 'r2', 's1']
+    assert index._component['x1'] == index._component['x2'] != \
+        index._component['h1']
+    # The hosts file is shared by the nodes of a component
+    for n in net.values():
+        n.cwd = str(tmp_path)
+    assert index.hosts_file(net.h1) == index.hosts_file(net.h3) \
+        != index.hosts_file(x1)
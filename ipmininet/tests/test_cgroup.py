@@ -0,0 +1,163 @@
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+import ipmininet.cgroup as cgroup
+import ipmininet.clean as clean
+from ipmininet.clean import killprocs
+from ipmininet.router import ProcessHelper
+from ipmininet.tests import require_root
+
+
+def sleeper(*args):
+    return subprocess.Popen([sys.executable, '-c',
+                             'import time; time.sleep(30)'] + list(args))
+
+
+def own_network_name(index=0):
+    return '%d-%s-%d' % (os.getpid(), cgroup._start_time(os.getpid()), index)
+
+
+def fake_network(base, name, *pids):
+    path = base / cgroup.BASE / name / 'r1'
+    path.mkdir(parents=True)
+    (path / 'cgroup.procs').write_text(''.join('%d\n' % p for p in pids))
+
+
+class FakeNode:
+
+    def __init__(self, name, network_cgroup, **limits):
+        self.name = name
+        self.network_cgroup = network_cgroup
+        self.resource_limits = cgroup.resource_limits(**limits)
+
+
+def test_owner_alive():
+    assert cgroup.owner_alive(own_network_name())
+    assert cgroup.owner_alive(own_network_name(3))
+    assert not cgroup.owner_alive('%d-0-0' % os.getpid())
+    assert not cgroup.owner_alive('invalid')
+
+
+def test_wait_pids():
+    short, long = sleeper(), sleeper()
+    try:
+        short.kill()
+        start = time.monotonic()
+        assert cgroup.wait_pids({short.pid, long.pid}, .5) == {long.pid}
+        assert time.monotonic() - start < 2
+        assert cgroup.wait_pids({short.pid}, 10) == set()
+    finally:
+        long.kill()
+        short.wait()
+        long.wait()
+
+
+def test_killprocs_spares_running_networks(tmp_path, monkeypatch):
+    monkeypatch.setattr(cgroup, 'cgroup2_mount', lambda: str(tmp_path))
+    marker = 'ipmininet-test-%s' % uuid.uuid4().hex
+    running, stale, other = sleeper(marker), sleeper(marker), sleeper(marker)
+    try:
+        fake_network(tmp_path, own_network_name(), running.pid)
+        fake_network(tmp_path, '1-0-0', stale.pid)
+        assert cgroup.running_pids() == {running.pid}
+        assert sorted(n.name for n in cgroup.networks()) \
+            == sorted([own_network_name(), '1-0-0'])
+
+        start = time.monotonic()
+        killprocs([marker], timeout=5)
+        assert stale.wait(1) is not None
+        assert other.wait(1) is not None
+        assert running.poll() is None
+        assert time.monotonic() - start < 5
+    finally:
+        for p in (running, stale, other):
+            p.kill()
+            p.wait()
+
+
+def test_cleanup_spares_running_networks(tmp_path, monkeypatch):
+    monkeypatch.setattr(cgroup, 'cgroup2_mount', lambda: str(tmp_path))
+    calls = []
+    monkeypatch.setattr(clean.mnclean, 'cleanup', lambda: calls.append(1))
+    monkeypatch.setattr(clean, 'killprocs', lambda patterns: None)
+
+    clean.cleanup()
+    assert calls == [1]
+
+    fake_network(tmp_path, own_network_name())
+    clean.cleanup()
+    assert calls == [1]
+
+
+def test_resource_limits():
+    assert cgroup.resource_limits() == {}
+    assert cgroup.resource_limits(cpu_quota=.5, cpu_weight=50,
+                                  memory_max='256M', cpuset=[0, 2]) == {
+        'cpu.max': '50000 100000', 'cpu.weight': '50',
+        'memory.max': '256M', 'cpuset.cpus': '0,2'}
+    assert cgroup.resource_limits(cpu_quota=2, memory_max=1 << 20,
+                                  cpuset='0-3,5') == {
+        'cpu.max': '200000 100000', 'memory.max': '1048576',
+        'cpuset.cpus': '0-3,5'}
+    for limits in ({'cpu_quota': 0}, {'cpu_weight': 0},
+                   {'cpu_weight': 10001}, {'memory_max': '1X'},
+                   {'memory_max': -1}, {'cpuset': '0-'}):
+        with pytest.raises(ValueError):
+            cgroup.resource_limits(**limits)
+
+
+def test_node_limits_and_usage(tmp_path, monkeypatch):
+    monkeypatch.setattr(cgroup, 'cgroup2_mount', lambda: str(tmp_path))
+    network = cgroup.Cgroup(str(tmp_path / cgroup.BASE / 'net'))
+    helper = ProcessHelper(FakeNode('r1', network, cpu_quota=.25,
+                                    memory_max='64M'))
+    assert helper.resource_usage() == {}
+
+    node = helper.cgroup
+    assert node.path == str(tmp_path / cgroup.BASE / 'net' / 'r1')
+    for path in (tmp_path, tmp_path / cgroup.BASE, tmp_path / cgroup.BASE
+                 / 'net'):
+        assert (path / 'cgroup.subtree_control').read_text() \
+            == '+cpu +memory'
+    assert node.read('cpu.max') == '25000 100000'
+    assert node.read('memory.max') == '64M'
+
+    node.write('cpu.stat', 'usage_usec 1500\nnr_throttled 3\n')
+    node.write('memory.current', '4096\n')
+    node.write('memory.events', 'max 2\noom_kill 1\n')
+    node.write('cgroup.procs', '%d\n' % os.getpid())
+    assert helper.resource_usage() == {'usage_usec': 1500, 'nr_throttled': 3,
+                                       'memory_current': 4096, 'oom_kill': 1,
+                                       'pids': 1}
+
+    # Without cgroup v2, the limits cannot be applied
+    assert ProcessHelper(FakeNode('r2', None, cpu_weight=10)).cgroup is None
+
+
+@require_root
+def test_cgroup_kill():
+    network = cgroup.network_cgroup()
+    if network is None:
+        pytest.skip('cgroup v2 is not available')
+    try:
+        node = network.child('n1')
+        p = subprocess.Popen(['sh', '-c', 'sleep 30 & sleep 30'],
+                             preexec_fn=node.preexec_fn())
+        time.sleep(.2)
+        assert p.pid in node.pids()
+        assert len(network.pids()) == 3
+        assert cgroup.owner_alive(network.name)
+        assert network.name in [n.name for n in cgroup.networks()]
+
+        start = time.monotonic()
+        assert network.kill()
+        assert time.monotonic() - start < 2
+        assert p.wait(1) is not None
+        assert not network.exists()
+    finally:
+        network.kill()
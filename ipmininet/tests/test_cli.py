@@ -58,6 +58,14 @@ def perm(*args):
     ("route 2001:1a::2",
      [re.compile(r"\[r1\] 2001:1a::2.*dev +r1-eth0.*"),
       re.compile(r"\[r2\] 2001:1a::2.*dev +r2-eth0.*")]),
+    ("pall r* echo h4",
+     [re.compile(r"\*\*\* \[r1\] [0-9.]+s"),
+      re.compile(r"\*\*\* \[r2\] [0-9.]+s"), "10.2.0.3"]),
+    ("pall h[14],s2 echo hello",
+     [re.compile(r"\*\*\* \[h1\] [0-9.]+s"),
+      re.compile(r"\*\*\* \[h4\] [0-9.]+s"),
+      re.compile(r"\*\*\* \[s2\] [0-9.]+s"), "hello"]),
+    ("pall x* echo hello", ["*** No node matches x*"]),
     ("ip 2001:1a::1/64 2001:1a::1 10.2.0.3 10.2.0.3/24 2001::3/64 invalid",
      ["2001:1a::1/64 | r1 ", "2001:1a::1 | r1 ",
       "10.2.0.3/24 | h4 ", "10.2.0.3 | h4 ",
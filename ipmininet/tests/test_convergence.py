@@ -0,0 +1,39 @@
+import subprocess
+import time
+
+from ipmininet.convergence import wait_converged
+
+
+class FakeNode:
+    """Prints a route change after each delay, then keeps quiet"""
+
+    def __init__(self, name, *delays):
+        self.name = name
+        self.script = ''.join('sleep %s; echo "{}"; ' % d for d in delays) \
+            + 'exec sleep 60'
+
+    def popen(self, cmd, **kwargs):
+        return subprocess.Popen(['sh', '-c', self.script], **kwargs)
+
+
+def test_wait_converged():
+    start = time.time()
+    converged, last_change = wait_converged(
+        [FakeNode('r1', .1, .2), FakeNode('r2', .5), FakeNode('r3')],
+        quiet_period=.5, timeout=10)
+    elapsed = time.time() - start
+
+    assert converged
+    assert 1. <= elapsed < 5.
+    assert last_change['r3'] is None
+    assert start < last_change['r1'] < last_change['r2']
+
+
+def test_wait_converged_timeout():
+    start = time.time()
+    converged, last_change = wait_converged(
+        [FakeNode('r1', *[.1] * 50)], quiet_period=.5, timeout=1)
+
+    assert not converged
+    assert time.time() - start < 3.
+    assert last_change['r1'] is not None
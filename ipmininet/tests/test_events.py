@@ -0,0 +1,64 @@
+import subprocess
+import threading
+
+import pytest
+
+from ipmininet.events import Event, EventStream, ROUTE, LINK, ADDRESS, \
+    NEIGHBOR
+
+
+class FakeNode:
+    """Prints the given 'ip monitor label' lines, then keeps quiet"""
+
+    def __init__(self, name, *lines):
+        self.name = name
+        self.script = ''.join("sleep .05; echo '%s'; " % line
+                              for line in lines) + 'exec sleep 60'
+
+    def popen(self, cmd, **kwargs):
+        return subprocess.Popen(['sh', '-c', self.script], **kwargs)
+
+
+def test_parse():
+    e = Event.parse('r1', '[ROUTE]10.0.0.0/24 via 10.1.0.2 dev r1-eth0 '
+                          'proto ospf metric 20', 1.)
+    assert (e.node, e.kind, e.deleted, e.dev, e.timestamp) \
+        == ('r1', ROUTE, False, 'r1-eth0', 1.)
+    e = Event.parse('r1', '[ROUTE]Deleted 10.0.0.0/24 dev r1-eth1')
+    assert e.deleted and e.line == '10.0.0.0/24 dev r1-eth1'
+    e = Event.parse('r1', '[LINK]3: r1-eth1@if2: <BROADCAST,UP> mtu 1500')
+    assert (e.kind, e.dev) == (LINK, 'r1-eth1')
+    e = Event.parse('r1', '[ADDR]3: r1-eth1    inet 10.0.0.1/24 scope global')
+    assert (e.kind, e.dev) == (ADDRESS, 'r1-eth1')
+    assert Event.parse('r1', '[NEIGH]10.0.0.2 dev r1-eth1 REACHABLE').kind \
+        == NEIGHBOR
+    assert Event.parse('r1', 'Timestamp: Thu Jan  1 00:00:00 1970') is None
+
+
+def test_event_stream():
+    r1 = FakeNode('r1', '[ROUTE]10.0.0.0/24 dev r1-eth0', 'garbage',
+                  '[ROUTE]Deleted 10.0.0.0/24 dev r1-eth0')
+    r2 = FakeNode('r2', '[LINK]2: r2-eth0: <UP> mtu 1500')
+    received = []
+    done = threading.Event()
+
+    def callback(event):
+        received.append(event)
+        if len(received) == 3:
+            done.set()
+
+    with EventStream([r1, r2], callback=callback) as stream:
+        events = [stream.get(timeout=5) for _ in range(3)]
+        assert done.wait(5)
+    assert stream.get(timeout=.1) is None
+    assert list(stream) == []
+
+    assert sorted((e.node, e.kind, e.deleted) for e in events) \
+        == [('r1', ROUTE, False), ('r1', ROUTE, True), ('r2', LINK, False)]
+    assert [e.deleted for e in events if e.node == 'r1'] == [False, True]
+    assert sorted(map(repr, received)) == sorted(map(repr, events))
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        EventStream([], kinds=['rule'])
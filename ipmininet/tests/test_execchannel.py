@@ -0,0 +1,115 @@
+import subprocess
+import threading
+import time
+
+import pytest
+
+from ipmininet.execchannel import ExecChannel
+from ipmininet.router import ProcessHelper
+
+
+class FakeNode:
+    """Runs the commands in the current namespaces"""
+    name = 'n1'
+    shell = True
+
+    def popen(self, cmd, **kwargs):
+        return subprocess.Popen(cmd, **kwargs)
+
+    def cmd(self, *args):
+        return subprocess.run(' '.join(args), shell=True,
+                              stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout
+
+
+@pytest.fixture
+def channel():
+    c = ExecChannel(FakeNode(), workers=4)
+    yield c
+    c.close()
+
+
+def test_exec(channel):
+    assert channel.pexec(['sh', '-c', 'echo out; echo err >&2; exit 3']) \
+        == ('out\n', 'err\n', 3)
+    assert channel.pexec('echo a  b') == ('a b\n', '', 0)
+    assert channel.pexec('cat', input='data') == ('data', '', 0)
+    assert channel.cmd('echo out; echo err >&2') == 'out\nerr\n'
+    out, err, code = channel.pexec(['/nonexistent/command'])
+    assert code == 127 and err
+
+
+def test_large_output(channel):
+    out, _, code = channel.pexec(['head', '-c', str(8 << 20), '/dev/zero'])
+    assert code == 0 and len(out) == 8 << 20
+
+
+def test_concurrent(channel):
+    start = time.time()
+    futures = [channel.submit('sleep', '.5') for _ in range(4)]
+    assert [f.result()[2] for f in futures] == [0] * 4
+    assert time.time() - start < 1.5
+
+    results = []
+
+    def run(i):
+        results.append(channel.pexec(['echo', str(i)])[0])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == sorted('%d\n' % i for i in range(20))
+
+
+def test_close():
+    c = ExecChannel(FakeNode())
+    pending = c.submit('sleep', '.2')
+    c.close()
+    assert pending.result() == ('', '', 0)
+    assert not c.alive
+    with pytest.raises(OSError):
+        c.submit('true')
+
+
+def test_no_channel_after_terminate():
+    helper = ProcessHelper(FakeNode())
+    assert helper.call('echo', 'a') == 'a\n'
+    channel = helper.channel
+    assert channel.alive
+    helper.terminate()
+    assert not channel.alive
+    # The shell of the node is still there but no worker is started again
+    assert helper.call('echo', 'b') == 'b\n'
+    assert helper.channel is None
+
+
+def test_disabled_channel():
+    node = FakeNode()
+    node.exec_channel = False
+    helper = ProcessHelper(node)
+    assert helper.channel is None
+    assert helper.call('echo', 'a') == 'a\n'
+    helper.terminate()
+
+
+def test_background_command():
+    node = FakeNode()
+    calls = []
+
+    def cmd(*args):
+        calls.append(args)
+        return ''
+
+    node.cmd = cmd
+    helper = ProcessHelper(node)
+    try:
+        # The shell of the node runs the commands sent in the background
+        assert helper.call('sleep 30 &') == ''
+        assert helper.call(['sleep', '30', '&']) == ''
+        assert calls == [('sleep 30 &',), (['sleep', '30', '&'],)]
+        assert helper.call('echo a && echo b') == 'a\nb\n'
+        assert len(calls) == 2
+    finally:
+        helper.terminate()
@@ -0,0 +1,82 @@
+import json
+import subprocess
+import time
+
+from ipmininet.fib import fib_snapshot, diff, parse_routes
+
+ROUTES4 = [{'dst': 'default', 'gateway': '10.0.0.2', 'dev': 'r1-eth0',
+            'protocol': 'static', 'flags': []},
+           {'dst': '10.0.0.0/24', 'dev': 'r1-eth0', 'protocol': 'kernel',
+            'scope': 'link', 'prefsrc': '10.0.0.1', 'flags': []},
+           {'dst': '10.1.0.1', 'protocol': 'ospf', 'metric': 20,
+            'flags': [], 'nexthops': [
+                {'gateway': '10.0.1.2', 'dev': 'r1-eth1', 'weight': 1},
+                {'gateway': '10.0.0.2', 'dev': 'r1-eth0', 'weight': 1}]}]
+ROUTES6 = [{'type': 'unreachable', 'dst': 'fc00::/48', 'dev': 'lo',
+            'protocol': 'static', 'metric': 1024, 'flags': []},
+           {'dst': 'default', 'gateway': 'fe80::1', 'dev': 'r1-eth0',
+            'protocol': 'ra', 'metric': 1024, 'flags': []}]
+
+
+class FakeNode:
+    """Dumps the given routes, or fails if they are None"""
+
+    def __init__(self, directory, name, routes4, routes6=()):
+        self.name = name
+        self.routes = {}
+        for family, routes in (('-4', routes4), ('-6', routes6)):
+            if routes is not None:
+                path = directory / ('%s%s.json' % (name, family))
+                path.write_text(json.dumps(list(routes)))
+                self.routes[family] = str(path)
+
+    def popen(self, cmd, **kwargs):
+        if cmd[2] not in self.routes:
+            return subprocess.Popen(['sh', '-c', 'exit 2'], **kwargs)
+        return subprocess.Popen(['cat', self.routes[cmd[2]]], **kwargs)
+
+
+def test_parse_routes():
+    table = parse_routes(json.dumps(ROUTES4), 4)
+    assert table == {
+        '0.0.0.0/0': (((('10.0.0.2', 'r1-eth0'),), 'static', 0, 'unicast'),),
+        '10.0.0.0/24': (((('', 'r1-eth0'),), 'kernel', 0, 'unicast'),),
+        '10.1.0.1/32': (((('10.0.0.2', 'r1-eth0'), ('10.0.1.2', 'r1-eth1')),
+                         'ospf', 20, 'unicast'),)}
+    table = parse_routes(json.dumps(ROUTES6), 6)
+    assert table['fc00::/48'][0][3] == 'unreachable'
+    assert table['::/0'][0][0] == (('fe80::1', 'r1-eth0'),)
+    assert parse_routes('', 4) == {}
+
+
+def test_snapshot_diff(tmp_path):
+    before = fib_snapshot([FakeNode(tmp_path, 'r1', ROUTES4, ROUTES6),
+                           FakeNode(tmp_path, 'r2', ROUTES4),
+                           FakeNode(tmp_path, 'r3', None)])
+    assert sorted(before) == ['r1', 'r2']
+    assert before.routes('r1', '10.0.0.0/24')[0][1] == 'kernel'
+    assert before.routes('r2', 'fc00::/48') == ()
+
+    after = fib_snapshot([FakeNode(tmp_path, 'r1', ROUTES4[1:], ROUTES6),
+                          FakeNode(tmp_path, 'r2', ROUTES4),
+                          FakeNode(tmp_path, 'r3', ROUTES4)])
+    changes = diff(before, after)
+    assert list(changes) == ['r1']
+    assert changes['r1'] == {'0.0.0.0/0': (before.routes('r1', '0.0.0.0/0'),
+                                           ())}
+    assert diff(after, before)['r1']['0.0.0.0/0'][0] == ()
+
+
+def test_large_diff(tmp_path):
+    routes = [{'dst': '%d.%d.%d.0/24' % (10 + (i >> 16), i >> 8 & 255,
+                                         i & 255),
+               'gateway': '10.0.0.2', 'dev': 'r1-eth0', 'protocol': 'bgp'}
+              for i in range(100000)]
+    moved = [dict(r, gateway='10.0.1.2', dev='r1-eth1') if i % 1000 == 0
+             else r for i, r in enumerate(routes)]
+    start = time.time()
+    before = fib_snapshot([FakeNode(tmp_path, 'r1', routes)], families=[4])
+    after = fib_snapshot([FakeNode(tmp_path, 'r1', moved)], families=[4])
+    changes = diff(before, after)
+    assert len(changes['r1']) == 100
+    assert time.time() - start < 10
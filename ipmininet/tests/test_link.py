@@ -1,10 +1,10 @@
 import pytest
-from ipaddress import ip_interface
+from ipaddress import ip_interface, ip_network
 
 from ipmininet.clean import cleanup
 from ipmininet.examples.static_address_network import StaticAddressNet
 from ipmininet.ipnet import IPNet
-from ipmininet.link import OrderedAddress
+from ipmininet.link import OrderedAddress, address_sort_key
 from ipmininet.tests import require_root
 
 
@@ -39,6 +39,9 @@ def test_ordered_address(unsorted_list, sorted_list):
     new_list = sorted(unsorted_list, key=OrderedAddress, reverse=True)
     new_list = [ip.with_prefixlen for ip in new_list]
     assert sorted_list == new_list, "The IP list was not sorted correctly"
+    new_list = sorted(unsorted_list, key=address_sort_key, reverse=True)
+    new_list = [ip.with_prefixlen for ip in new_list]
+    assert sorted_list == new_list, "The IP list was not sorted correctly"
 
 
 @require_root
@@ -68,6 +71,11 @@ def test_addr_intf():
         assert itf.prefixLen == 28,\
             "Cannot update prefix len of an IPv4 address"
 
+        # Check the address index
+        assert net.intf_for_ip("10.1.2.1") is itf
+        assert net.node_for_ip("2001:21::1") is net["r1"]
+        assert net.lpm("10.1.2.2") == (ip_network("10.1.2.0/28"), [itf])
+
         # Check MAC getters
         assert itf.updateMAC() == itf.updateAddr()[1],\
             "MAC address obtained through two methods is not identical"
@@ -0,0 +1,82 @@
+from ipaddress import ip_interface, ip_network
+
+import pytest
+
+from ipmininet.lpm import AddressIndex, PrefixTrie
+
+
+class FakeIntf:
+
+    def __init__(self, name, *addresses):
+        self.name = name
+        self.address_watchers = []
+        self.addresses = {4: [], 6: []}
+        self.set(*addresses)
+
+    def set(self, *addresses):
+        old = self.addresses[4] + self.addresses[6]
+        new = [ip_interface(a) for a in addresses]
+        self.addresses = {v: [a for a in new if a.version == v]
+                          for v in (4, 6)}
+        for watcher in self.address_watchers:
+            watcher(self, [a for a in old if a not in new],
+                    [a for a in new if a not in old])
+
+
+def test_prefix_trie():
+    trie = PrefixTrie()
+    trie['10.0.0.0/8'] = 'a'
+    trie['10.1.0.0/16'] = 'b'
+    trie['0.0.0.0/0'] = 'default'
+    trie['fc00::/7'] = 'v6'
+    assert len(trie) == 4
+    assert trie['10.1.0.0/16'] == 'b'
+    assert '10.2.0.0/16' not in trie
+    assert trie.lpm('10.1.2.3') == (ip_network('10.1.0.0/16'), 'b')
+    assert trie.lpm('10.2.2.3') == (ip_network('10.0.0.0/8'), 'a')
+    assert trie.lpm('192.168.0.1') == (ip_network('0.0.0.0/0'), 'default')
+    assert trie.lpm('fc00::1') == (ip_network('fc00::/7'), 'v6')
+    assert trie.lpm('2001::1') is None
+
+    del trie['10.1.0.0/16']
+    assert trie.lpm('10.1.2.3') == (ip_network('10.0.0.0/8'), 'a')
+    with pytest.raises(KeyError):
+        del trie['10.1.0.0/16']
+    with pytest.raises(KeyError):
+        trie['10.0.0.0/9']
+    assert len(trie) == 3
+    trie['10.1.2.3/32'] = 'host'
+    assert trie.lpm('10.1.2.3') == (ip_network('10.1.2.3/32'), 'host')
+
+
+def test_address_index():
+    r1 = FakeIntf('r1-eth0', '10.0.0.1/24', 'fc00::1/64', 'fe80::1/64')
+    r2 = FakeIntf('r2-eth0', '10.0.0.2/24', 'fc00::2/64', 'fe80::1/64')
+    lo = FakeIntf('lo', '127.0.0.1/8', '10.255.0.1/32')
+    index = AddressIndex()
+    for itf in (r1, r2, lo):
+        index.watch(itf)
+        index.watch(itf)
+    assert r1.address_watchers == [index.update]
+
+    assert index.intf_for_ip('10.0.0.1') is r1
+    assert index.intf_for_ip('fc00::2/64') is r2
+    assert index.intf_for_ip('fe80::1') is None
+    assert index.intf_for_ip('127.0.0.1') is None
+    assert {i.name for i in index.intfs_for_prefix('10.0.0.0/24')} \
+        == {'r1-eth0', 'r2-eth0'}
+    prefix, itfs = index.lpm('10.255.0.1')
+    assert prefix == ip_network('10.255.0.1/32') and itfs == [lo]
+    assert index.lpm('10.0.0.3')[0] == ip_network('10.0.0.0/24')
+    assert index.lpm('192.168.0.1') is None
+
+    # Changes are followed
+    r1.set('10.0.1.1/24', 'fc00::1/64')
+    assert index.intf_for_ip('10.0.0.1') is None
+    assert index.intf_for_ip('10.0.1.1') is r1
+    assert index.intfs_for_prefix('10.0.0.0/24') == [r2]
+    index.unwatch(r2)
+    r2.set('10.0.2.2/24')
+    assert index.lpm('10.0.0.3') is None
+    assert index.intf_for_ip('10.0.2.2') is None
+    assert index.intfs_for_prefix('fc00::/64') == [r1]
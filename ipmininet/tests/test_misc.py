@@ -1,15 +1,26 @@
+import json
 import os
 import subprocess
+import threading
 
 import ipaddress
 import pytest
 
 import ipmininet.utils as utils
+from ipmininet.allocator import RouterIdAllocator
+from ipmininet import validation
 from ipmininet.clean import cleanup
+from ipmininet import compiler
+from ipmininet.compiler import compile_configs, load_manifest
 from ipmininet.examples.static_address_network import StaticAddressNet
 from ipmininet.ipnet import IPNet
-from ipmininet.link import _parse_addresses
-from ipmininet.router.config.utils import ip_statement
+from ipmininet.link import _parse_addresses, _parse_node_addresses
+from ipmininet.netlink import interface_addresses
+from ipmininet.router import IPNode
+from ipmininet.router.config import base as config_base
+from ipmininet.router.config.utils import ip_statement, config_digest, \
+    ConfigDict
+from mininet.node import Node
 from . import require_root
 
 
@@ -77,6 +88,28 @@ def test_ip_address_format():
     assert len(out.strip('\n').split('\n')) == (2 + 2 * len(v4) + 2 * len(v6))
 
 
+def test_node_ip_address_format():
+    """Check that the output of ip address for all the interfaces of a node
+    is split properly among them"""
+    subprocess.call(['ip', 'link', 'set', 'dev', 'lo', 'up'])
+    out = subprocess.check_output(['ip', 'address', 'show']).decode("utf-8")
+    addresses = _parse_node_addresses(out)
+    assert 'lo' in addresses
+    assert addresses['lo'] == _parse_addresses(subprocess.check_output(
+        ['ip', 'address', 'show', 'dev', 'lo']).decode("utf-8"))
+    for name, (mac, _, _) in addresses.items():
+        assert '@' not in name
+        assert mac is None or mac in out
+
+
+def test_netlink_addresses():
+    """Check that the addresses read through netlink match the ones
+    reported by ip address"""
+    subprocess.call(['ip', 'link', 'set', 'dev', 'lo', 'up'])
+    out = subprocess.check_output(['ip', 'address', 'show']).decode("utf-8")
+    assert interface_addresses() == _parse_node_addresses(out)
+
+
 @pytest.mark.parametrize("cmd,present", [
     ("ls", True),
     ("/bin/sh", True),
@@ -155,3 +188,310 @@ def test_find_node(start, node, present):
 ])
 def test_ip_statement(test_input, expected):
     assert ip_statement(test_input) == expected
+
+
+def test_config_digest():
+    cfg = ConfigDict(a=[1, ipaddress.ip_network("10.0.0.0/8")], b={'x', 'y'})
+    assert config_digest(cfg) == config_digest(
+        ConfigDict(b={'y', 'x'}, a=[1, ipaddress.ip_network("10.0.0.0/8")]))
+    cfg.a.append(2)
+    assert config_digest(cfg) != config_digest(
+        ConfigDict(a=[1, ipaddress.ip_network("10.0.0.0/8")], b={'x', 'y'}))
+    # The plain attributes of the nodes are part of the digest
+    node = Node.__new__(Node)
+    node.name, node.params, node.pid = 'n', {'asn': 1}, 1
+    digest = config_digest(ConfigDict(peer=node))
+    # But not their running shell
+    node.pid = 2
+    assert config_digest(ConfigDict(peer=node)) == digest
+    node.password = 'secret'
+    assert config_digest(ConfigDict(peer=node)) != digest
+    # Generators cannot be described without consuming them
+    assert config_digest(ConfigDict(a=(i for i in range(2)))) is None
+
+
+class FakeNode:
+
+    def __init__(self, cwd):
+        self.name = 'n'
+        self.cwd = cwd
+
+
+class FakeDaemon(config_base.Daemon):
+    NAME = 'fake'
+
+    startup_line = dry_run = None
+
+    def set_defaults(self, defaults):
+        pass
+
+
+def test_daemon_render_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_base, 'TEMPLATE_CACHE_DIR',
+                        str(tmp_path / 'cache'))
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'fake.mako').write_text('${node.fake.value}')
+    lookup = config_base.template_lookup(str(templates))
+    assert lookup.template_args['module_directory'].startswith(
+        str(tmp_path / 'cache'))
+    daemon = FakeDaemon(FakeNode(str(tmp_path)), template_lookup=lookup)
+
+    cfg = ConfigDict(fake=ConfigDict(value=1))
+    daemon.write(daemon.render(cfg))
+    with open(daemon.cfg_filename) as f:
+        assert f.read() == '1'
+    mtime = os.stat(daemon.cfg_filename).st_mtime_ns
+    # Unchanged files are not rewritten
+    daemon.write(daemon.render(cfg))
+    assert os.stat(daemon.cfg_filename).st_mtime_ns == mtime
+    # The cached rendering is used
+    rendered, = (tmp_path / 'cache').glob('*/rendered/*')
+    rendered.write_text('cached')
+    assert daemon.render(cfg) == {daemon.cfg_filename: 'cached'}
+    # The inputs changed
+    cfg.fake.value = 2
+    daemon.write(daemon.render(cfg))
+    with open(daemon.cfg_filename) as f:
+        assert f.read() == '2'
+
+
+def test_planned_routerid():
+    class FakeIntf:
+        def __init__(self, ip):
+            self.ip = ip
+
+        def ips(self):
+            return iter([ipaddress.ip_interface(self.ip)])
+
+    node = FakeNode('/tmp')
+    intf = FakeIntf('10.0.0.1/24')
+    node.intfList = lambda: [intf]
+    cfg = config_base.RouterConfig.__new__(config_base.RouterConfig)
+    cfg._node, cfg._daemons, cfg.routerid = node, {}, None
+    cfg.planned_routerid, cfg._allocated_routerid = '10.9.9.9', None
+    assert '10.9.9.9' in cfg.known_routerids()
+    # Every build of the start sequence uses it
+    assert cfg.compute_routerid() == '10.9.9.9'
+    assert cfg.compute_routerid() == '10.9.9.9'
+    # The addresses changed before the next build
+    cfg.planned_routerid = None
+    intf.ip = '10.0.0.2/24'
+    assert cfg.compute_routerid() == '10.0.0.2'
+    # Without IPv4 address, the planned id was allocated and is kept
+    node.intfList = lambda: []
+    cfg.planned_routerid = '10.9.9.9'
+    assert cfg.compute_routerid() == '10.9.9.9'
+    cfg.planned_routerid = None
+    assert cfg.compute_routerid() == '10.9.9.9'
+
+
+def test_allocated_routerid():
+    node = FakeNode('/tmp')
+    node.intfList = lambda: []
+    cfg = config_base.RouterConfig.__new__(config_base.RouterConfig)
+    cfg._node, cfg._daemons, cfg.routerid = node, {}, None
+    cfg.planned_routerid, cfg._allocated_routerid = None, None
+    cfg.routerid_allocator = RouterIdAllocator()
+    routerid = cfg.compute_routerid()
+    # Later builds keep the allocated router id
+    assert cfg.compute_routerid() == routerid
+    assert cfg.routerid_allocator.allocate() != routerid
+
+
+def test_daemon_render_cache_inheritance(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_base, 'TEMPLATE_CACHE_DIR',
+                        str(tmp_path / 'cache'))
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    base = templates / 'base.mako'
+    base.write_text('base ${self.body()}')
+    (templates / 'fake.mako').write_text('<%inherit file="base.mako"/>'
+                                         '${node.fake.value}')
+    daemon = FakeDaemon(FakeNode(str(tmp_path)),
+                        template_lookup=config_base.template_lookup(
+                            str(templates)))
+    cfg = ConfigDict(fake=ConfigDict(value=1))
+    assert daemon.render(cfg) == {daemon.cfg_filename: 'base 1'}
+    # The base template changed
+    base.write_text('new ${self.body()}')
+    mtime = os.stat(str(base)).st_mtime + 10
+    os.utime(str(base), (mtime, mtime))
+    assert daemon.render(cfg) == {daemon.cfg_filename: 'new 1'}
+
+
+def test_render_cache_pruning(tmp_path):
+    for i in range(5):
+        (tmp_path / str(i)).write_text('')
+        os.utime(str(tmp_path / str(i)), (i, i))
+    config_base._prune_renderings(str(tmp_path), size=2)
+    assert sorted(os.listdir(str(tmp_path))) == ['3', '4']
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_compile_configs(tmp_path, monkeypatch, processes):
+    monkeypatch.setattr(config_base, 'TEMPLATE_CACHE_DIR', '')
+    monkeypatch.setattr(compiler, 'MIN_FORKED_NODES', 2)
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'fake.mako').write_text('${node.name}')
+    lookup = config_base.template_lookup(str(templates))
+    nodes = []
+    for i in range(3):
+        node = FakeNode(str(tmp_path))
+        node.name = 'n%d' % i
+        node.nconfig = config_base.NodeConfig(node)
+        node.nconfig._daemons['fake'] = FakeDaemon(node,
+                                                   template_lookup=lookup)
+        nodes.append(node)
+
+    out = tmp_path / 'out'
+    manifest = compile_configs(nodes, directory=str(out), processes=processes)
+    assert sorted(manifest) == ['n0', 'n1', 'n2']
+    with open(str(out / 'manifest.json')) as f:
+        assert json.load(f) == manifest
+    for node in nodes:
+        target = node.nconfig.daemon('fake').cfg_filename
+        assert not os.path.exists(target)
+        entry = manifest[node.name]['fake'][target]
+        with open(entry['file']) as f:
+            assert f.read() == node.name
+        # Starting the node writes the compiled file
+        assert node.nconfig.load_compiled()
+        with open(target) as f:
+            assert f.read() == node.name
+    # Modified compiled files are not used
+    load_manifest(nodes, str(out))
+    (out / 'n0' / os.path.basename(
+        nodes[0].nconfig.daemon('fake').cfg_filename)).write_text('x')
+    assert not nodes[0].nconfig.load_compiled()
+    assert nodes[1].nconfig.load_compiled()
+
+
+class FakeRouterDaemon(config_base.RouterDaemon):
+    NAME = 'fake'
+
+    startup_line = dry_run = None
+
+    def set_defaults(self, defaults):
+        pass
+
+
+def test_compiled_routerid(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_base, 'TEMPLATE_CACHE_DIR', '')
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'fake.mako').write_text('${node.fake.routerid}')
+    # An IPv6-only router gets its router id from the allocator
+    node = FakeNode(str(tmp_path))
+    node.password = 'zebra'
+    node.intfList = lambda: []
+    node.nconfig = config_base.RouterConfig(node)
+    node.nconfig.routerid_allocator = RouterIdAllocator()
+    node.nconfig._daemons['fake'] = FakeRouterDaemon(
+        node, template_lookup=config_base.template_lookup(str(templates)))
+
+    compile_configs([node])
+    # Starting the node keeps the router id of the compiled files
+    assert node.nconfig.load_compiled()
+    with open(node.nconfig.daemon('fake').cfg_filename) as f:
+        assert f.read() == str(node.nconfig.routerid)
+
+
+def test_compile_configs_with_threads(monkeypatch):
+    monkeypatch.setattr(compiler, 'MIN_FORKED_NODES', 2)
+    monkeypatch.setattr(compiler, '_render', lambda name: (name, {}))
+
+    def no_fork(*args):
+        raise AssertionError('Forked while a thread runs')
+
+    monkeypatch.setattr(compiler.multiprocessing, 'get_context', no_fork)
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert list(compiler._render_all(['n0', 'n1'], 2)) \
+            == [('n0', {}), ('n1', {})]
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_compile_configs_with_library_threads(monkeypatch):
+    monkeypatch.setattr(compiler, 'MIN_FORKED_NODES', 2)
+
+    class Forked(Exception):
+        pass
+
+    def fork(*args):
+        raise Forked()
+
+    monkeypatch.setattr(compiler.multiprocessing, 'get_context', fork)
+    stop = threading.Event()
+    # Such as the readers of the execution channels
+    thread = threading.Thread(target=stop.wait, name='ipmininet-exec-r1',
+                              daemon=True)
+    thread.start()
+    try:
+        assert compiler._other_threads() == []
+        with pytest.raises(Forked):
+            compiler._render_all(['n0', 'n1'], 2)
+    finally:
+        stop.set()
+        thread.join()
+
+
+class FakeProcesses:
+
+    def __init__(self):
+        self.calls = []
+
+    def pexec(self, cmd):
+        self.calls.append(cmd)
+        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           universal_newlines=True)
+        return p.stdout, p.stderr, p.returncode
+
+
+class FakeIPNode(FakeNode):
+
+    check_daemons = IPNode.check_daemons
+    create_logdirs = False
+
+    def __init__(self, cwd, name):
+        super().__init__(cwd)
+        self.name = name
+        self._processes = FakeProcesses()
+        self.nconfig = config_base.NodeConfig(self)
+
+
+class CheckedDaemon(FakeDaemon):
+
+    @property
+    def dry_run(self):
+        return 'grep -q ok %s' % self.cfg_filename
+
+
+def test_validate_configs(tmp_path, monkeypatch):
+    monkeypatch.setattr(validation, 'VALIDATION_CACHE_DIR',
+                        str(tmp_path / 'cache'))
+    monkeypatch.setattr(validation, '_validated', set())
+    nodes = []
+    for i, content in enumerate(['ok', 'ok', 'ko']):
+        node = FakeIPNode(str(tmp_path), 'n%d' % i)
+        daemon = node.nconfig._daemons['fake'] = CheckedDaemon(node)
+        with open(daemon.cfg_filename, 'w') as f:
+            f.write(content)
+        nodes.append(node)
+
+    failures = validation.validate_configs(nodes)
+    assert list(failures) == ['n2']
+    assert failures['n2'][0].code == 1
+    # Identical configurations are checked once
+    assert len(nodes[0]._processes.calls + nodes[1]._processes.calls) == 1
+    # Successful checks are cached, failures are not
+    monkeypatch.setattr(validation, '_validated', set())
+    failures = validation.validate_configs(nodes)
+    assert list(failures) == ['n2']
+    assert len(nodes[0]._processes.calls + nodes[1]._processes.calls) == 1
+    assert len(nodes[2]._processes.calls) == 2
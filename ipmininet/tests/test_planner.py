@@ -0,0 +1,121 @@
+from ipaddress import ip_interface
+
+import pytest
+
+from ipmininet.examples.partial_static_address_network import \
+    PartialStaticAddressNet
+from ipmininet.examples.simple_ospf_network import SimpleOSPFNet
+from ipmininet.ipnet import IPNet
+from ipmininet.iptopo import IPTopo
+from ipmininet.planner import AddressPlanner, PlanCache, topology_fingerprint
+from ipmininet.router.config import RouterConfig
+from . import require_root
+
+
+def test_planner_fixed_addresses():
+    plan = AddressPlanner(PartialStaticAddressNet()).plan()
+    assert plan.to_dict() == AddressPlanner(PartialStaticAddressNet())\
+        .plan().to_dict(), "The plan is not deterministic"
+
+    def addresses(node, intf):
+        return [a.with_prefixlen for a in plan.addresses(node, intf)]
+
+    # Static addresses and Subnet overlays are honoured
+    assert '2042:1::1/64' in addresses('r1', 'lo')
+    assert addresses('r2', 'r2-eth1') == ['192.168.1.1/24', 'fc00:1::1/64']
+    assert addresses('h3', 'h3-eth0') == ['192.168.1.2/24', 'fc00:1::2/64']
+    assert addresses('r1', 'r1-eth1') == ['192.168.0.1/24', 'fc00::1/64']
+    assert addresses('r2', 'r2-eth0') == ['192.168.0.2/24', 'fc00::2/64']
+    # Switches are not addressed and gather their neighbors in one domain
+    assert plan.interface('s1', 's1-eth1') is None
+    assert plan.interface('h2', 'h2-eth0').broadcast_domain \
+        is plan.interface('h4', 'h4-eth0').broadcast_domain
+
+
+@pytest.mark.parametrize("topo,use_v4,use_v6", [
+    (PartialStaticAddressNet, True, True),
+    (SimpleOSPFNet, True, True),
+    (SimpleOSPFNet, True, False),
+    (SimpleOSPFNet, False, True),
+])
+def test_planner_allocation(topo, use_v4, use_v6):
+    plan = AddressPlanner(topo(), use_v4=use_v4, use_v6=use_v6).plan()
+    for d in plan.domains:
+        nets = set()
+        for intf in d:
+            v4 = list(intf.ips())
+            v6 = list(intf.ip6s(exclude_lls=True))
+            assert len(v4) == (intf.interface_width[0]
+                               if use_v4 and intf.node.use_v4 else 0)
+            assert len(v6) == (intf.interface_width[1]
+                               if use_v6 and intf.node.use_v6 else 0)
+            nets.update(ip_interface(a).network for a in v4 + v6)
+        assert len({n.version for n in nets}) == len(nets), \
+            "The interfaces of a domain should share their subnets"
+    # The allocated subnets do not overlap
+    nets = [d.net for d in plan.domains if d.net is not None] \
+        + [d.net6 for d in plan.domains if d.net6 is not None]
+    for i, a in enumerate(nets):
+        for b in nets[i + 1:]:
+            assert not a.overlaps(b)
+
+
+def test_plan_cache(tmp_path):
+    topo = SimpleOSPFNet()
+    fingerprint = topology_fingerprint(topo, ipBase='10.0.0.0/8')
+    assert fingerprint == topology_fingerprint(SimpleOSPFNet(),
+                                               ipBase='10.0.0.0/8')
+    assert fingerprint != topology_fingerprint(topo, ipBase='10.0.0.0/16')
+    assert fingerprint != topology_fingerprint(PartialStaticAddressNet(),
+                                               ipBase='10.0.0.0/8')
+
+    cache = PlanCache(str(tmp_path / 'plans'))
+    assert cache.load(fingerprint) is None
+    plan = AddressPlanner(topo, ipBase='10.0.0.0/8').plan()
+    plan.routerids = {'r1': '10.0.0.1'}
+    cache.store(fingerprint, plan)
+    cached = cache.load(fingerprint)
+    assert cached.to_dict() == plan.to_dict()
+    assert cached.serialize() == plan.serialize()
+    assert cached.routerids == {'r1': '10.0.0.1'}
+    for intf in ('r1-eth0', 'lo'):
+        assert cached.interface('r1', intf).broadcast_domain.net \
+            == plan.interface('r1', intf).broadcast_domain.net
+
+    # A corrupted entry is ignored
+    (tmp_path / 'plans' / ('%s.json' % fingerprint)).write_text('{')
+    assert cache.load(fingerprint) is None
+
+
+class IPv6OnlyNet(IPTopo):
+
+    def build(self, *args, **kwargs):
+        r1, r2 = self.addRouters('r1', 'r2', config=RouterConfig,
+                                 use_v4=False)
+        self.addLink(r1, r2)
+        super().build(*args, **kwargs)
+
+
+@require_root
+def test_plan_cache_routerids(tmp_path, monkeypatch):
+    stored = []
+    store = PlanCache.store
+
+    def counted_store(cache, fingerprint, plan):
+        stored.append(dict(plan.routerids))
+        store(cache, fingerprint, plan)
+
+    monkeypatch.setattr(PlanCache, 'store', counted_store)
+    routerids = []
+    for _ in range(2):
+        net = IPNet(topo=IPv6OnlyNet(), use_v4=False,
+                    plan_cache=str(tmp_path / 'plans'))
+        try:
+            net.start()
+            routerids.append({r.name: str(r.nconfig.routerid)
+                              for r in net.routers})
+        finally:
+            net.stop()
+    # The second run reuses the cached router ids without rewriting the plan
+    assert routerids[0] == routerids[1]
+    assert stored == [routerids[0]]
@@ -0,0 +1,72 @@
+import os
+import stat
+import subprocess
+
+import pytest
+
+from ipmininet.reachability import probe_all, _parse_fping, _parse_ping
+
+FPING_OUTPUT = """\
+10.0.0.1 : xmt/rcv/%loss = 3/3/0%, min/avg/max = 0.04/0.06/0.09
+fc00::2  : xmt/rcv/%loss = 3/0/100%
+"""
+
+PING_OUTPUT = """\
+--- 10.0.0.1 ping statistics ---
+2 packets transmitted, 1 received, 50% packet loss, time 1001ms
+rtt min/avg/max/mdev = 0.045/0.052/0.060/0.007 ms
+"""
+
+# Replies to the addresses ending in .1 or ::1 only
+FAKE_PING = """#!/bin/sh
+for a in "$@"; do addr="$a"; done
+case "$addr" in
+  *.1|*::1) echo "1 packets transmitted, 1 received, 0% packet loss"
+            echo "rtt min/avg/max/mdev = 0.1/0.2/0.3/0.0 ms";;
+  *) echo "1 packets transmitted, 0 received, 100% packet loss";;
+esac
+"""
+
+
+class FakeNode:
+
+    def __init__(self, name, path=''):
+        self.name = name
+        self.path = path
+
+    def popen(self, cmd, **kwargs):
+        env = dict(os.environ, PATH=self.path + os.pathsep
+                   + os.environ.get('PATH', ''))
+        return subprocess.Popen(cmd, env=env, **kwargs)
+
+
+def test_parsers():
+    assert _parse_fping(FPING_OUTPUT) == {'10.0.0.1': (3, 3, 0.06),
+                                          'fc00::2': (3, 0, None)}
+    assert _parse_ping(PING_OUTPUT) == (2, 1, 0.052)
+    assert _parse_ping('connect: Network is unreachable') == (0, 0, None)
+
+
+@pytest.mark.parametrize("max_workers", [1, None])
+def test_probe_all(tmp_path, max_workers):
+    for name in ('ping', 'ping6'):
+        script = tmp_path / name
+        script.write_text(FAKE_PING)
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    a, b, c = (FakeNode(n, str(tmp_path)) for n in 'abc')
+    targets = {a: [(b, 4, '10.0.0.1'), (c, 4, '10.0.0.2'),
+                   (b, 6, 'fc00::1')],
+               b: [(a, 4, '10.0.0.3')],
+               c: []}
+    matrix = probe_all(targets, timeout='1', max_workers=max_workers,
+                       use_fping=False)
+
+    assert len(matrix) == 4
+    assert matrix.sent == 4 and matrix.received == 2
+    assert matrix.loss == 0.5
+    assert matrix.get('a', 'b', 4).rtt == 0.2
+    assert matrix.get('a', 'b', 6).received == 1
+    assert matrix.get('a', 'c', 4).loss == 1
+    assert matrix.get('c', 'a', 4) is None
+    assert matrix.loss_matrix(4) == {'a': {'b': 0, 'c': 1}, 'b': {'a': 1}}
+    assert matrix.rtt_matrix(6) == {'a': {'b': 0.2}}
@@ -0,0 +1,67 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from ipmininet.router.config.readiness import UnixSocketProbe, \
+    ListeningPortProbe, poll_until
+
+
+class FakeNode:
+
+    def __init__(self):
+        self.name = 'fake'
+        self.pid = os.getpid()
+
+
+def test_unix_socket_probe():
+    path = os.path.join(tempfile.mkdtemp(), 'daemon.api')
+    probe = UnixSocketProbe(path)
+    assert not probe.check()
+    assert not probe.wait(.05)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def listen():
+        time.sleep(.1)
+        server.bind(path)
+        server.listen(1)
+
+    t = threading.Thread(target=listen)
+    t.start()
+    try:
+        assert probe.wait(5), "The probe missed the socket creation"
+        assert probe.check()
+    finally:
+        t.join()
+        server.close()
+        os.unlink(path)
+
+
+def test_listening_port_probe():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    probe = ListeningPortProbe(FakeNode(), port)
+    try:
+        assert not probe.check()
+        server.listen(1)
+        assert probe.wait(1)
+    finally:
+        server.close()
+    assert not probe.check()
+
+
+def test_poll_until():
+    calls = []
+
+    def check():
+        calls.append(None)
+        return len(calls) == 5
+
+    assert poll_until(check, 5)
+    assert len(calls) == 5
+    t = time.monotonic()
+    assert not poll_until(lambda: False, .2)
+    assert time.monotonic() - t < 1
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from ipmininet.scheduler import StartupScheduler, StartupError
+
+
+class FakeNode:
+
+    def __init__(self, name, fail=False, delay=0.):
+        self.name = name
+        self.fail = fail
+        self.delay = delay
+
+    def start(self):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ValueError('Config checks failed for node %s' % self.name)
+
+
+def _record_start(order, lock):
+    def start(node):
+        node.start()
+        with lock:
+            order.append(node.name)
+    return start
+
+
+@pytest.mark.parametrize("max_workers", [1, 4, None])
+def test_startup_order(max_workers):
+    order = []
+    scheduler = StartupScheduler(max_workers=max_workers)
+    scheduler.add(FakeNode('slave1'), after=['master'])
+    scheduler.add(FakeNode('master', delay=.05))
+    scheduler.add(FakeNode('slave2'), after=['slave1', 'master'])
+    scheduler.add(FakeNode('other'))
+    failures = scheduler.run(_record_start(order, threading.Lock()))
+
+    assert failures == {}
+    assert sorted(order) == ['master', 'other', 'slave1', 'slave2']
+    assert order.index('master') < order.index('slave1') \
+        < order.index('slave2')
+    if max_workers == 1:
+        assert order == ['master', 'other', 'slave1', 'slave2'], \
+            "Serial mode should keep the insertion order"
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_startup_failures(max_workers):
+    order = []
+    scheduler = StartupScheduler(max_workers=max_workers)
+    scheduler.add(FakeNode('r1', fail=True))
+    scheduler.add(FakeNode('r2'), after=['r1'])
+    scheduler.add(FakeNode('r3'), after=['r2'])
+    scheduler.add(FakeNode('r4'))
+    scheduler.add(FakeNode('c1'), after=['c2'])
+    scheduler.add(FakeNode('c2'), after=['c1'])
+    failures = scheduler.run(_record_start(order, threading.Lock()))
+
+    assert order == ['r4']
+    assert sorted(failures.keys()) == ['c1', 'c2', 'r1', 'r2', 'r3']
+    assert isinstance(failures['r1'], ValueError)
+    for n in ('c1', 'c2', 'r2', 'r3'):
+        assert isinstance(failures[n], StartupError)
+
+
+def test_startup_concurrency():
+    scheduler = StartupScheduler(max_workers=8)
+    for i in range(8):
+        scheduler.add(FakeNode('r%d' % i, delay=.2))
+    t = time.time()
+    assert scheduler.run() == {}
+    assert time.time() - t < 1, "Nodes were not started concurrently"
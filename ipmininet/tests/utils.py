@@ -6,7 +6,7 @@ from typing import List, Tuple, Dict, Pattern, Match, Optional
 
 import mininet.log
 from io import StringIO
-from ipaddress import ip_address, ip_network
+from ipaddress import ip_network
 from ipmininet.utils import require_cmd
 from ipmininet.ipnet import IPNet
 from ipmininet.router import IPNode
@@ -58,21 +58,10 @@ def assert_path(net: IPNet, expected_path: List[str], v6=False, retry=5,
 
         path = [src]
         for path_ip in path_ips:
-            found = False
-            for n in net.routers + net.hosts:
-                for itf in n.intfList():
-                    itf_ips = itf.ip6s() if v6 else itf.ips()
-                    for ip in itf_ips:
-                        if ip.ip == ip_address(path_ip):
-                            found = True
-                            break
-                    if found:
-                        break
-                if found:
-                    path.append(n.name)
-                    break
-            assert found, "Traceroute returned the address '%s' " \
-                          "that cannot be linked to a node" % path_ip
+            itf = net.intf_for_ip(path_ip)
+            assert itf is not None, "Traceroute returned the address '%s' " \
+                                    "that cannot be linked to a node" % path_ip
+            path.append(itf.node.name)
         i += 1
 
     assert path == expected_path, "We expected the path from %s to %s to go " \
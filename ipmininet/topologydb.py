@@ -6,6 +6,7 @@ import json
 import itertools
 from ipaddress import ip_interface
 
+from .link import refresh_addresses
 from .utils import otherIntf, realIntfList
 
 from mininet.log import lg
@@ -117,6 +118,8 @@ class TopologyDB:
             self.add_router(r)
 
     def _add_node(self, n, props):
+        # Fetch the current addresses of all interfaces at once
+        refresh_addresses(n)
         itfs = realIntfList(n)
         props['interfaces'] = [itf.name for itf in itfs]
         for itf in itfs:
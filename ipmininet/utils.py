@@ -152,6 +152,9 @@ def find_node(start: Node, node_name: str) -> Optional[Intf]:
     :return: The interface of the node connected to start with node_name as name
     """
 
+    components = getattr(start, 'components', None)
+    if components is not None:
+        return components.find_node(start, node_name)
     if start.name == node_name:
         return start.intf()
 
@@ -170,3 +173,34 @@ def find_node(start: Node, node_name: str) -> Optional[Intf]:
             if L3Router.is_l3router_intf(n):
                 to_visit.extend(realIntfList(n.node))
     return None
+
+
+class DisjointSet:
+    """A union-find structure over hashable elements, with path halving and
+    union by size. Elements are implicitly added on their first use."""
+
+    def __init__(self):
+        self._parent = {}  # type: Dict
+        self._size = {}  # type: Dict
+
+    def find(self, x):
+        """Return the representative of the set containing x"""
+        parent = self._parent
+        if x not in parent:
+            parent[x] = x
+            self._size[x] = 1
+            return x
+        while parent[x] is not x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        """Merge the sets containing a and b"""
+        a, b = self.find(a), self.find(b)
+        if a is b:
+            return
+        if self._size[a] < self._size[b]:
+            a, b = b, a
+        self._parent[b] = a
+        self._size[a] += self._size[b]
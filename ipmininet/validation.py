@@ -0,0 +1,163 @@
+"""This module checks the configurations of the daemons of a network with
+their dry runs, all nodes at once, before any of them is started.
+The successful checks are cached by the content of the checked files, so
+that identical configurations are only validated once."""
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+
+from mininet.log import lg as log
+
+from .router.config.base import Daemon, _write_file
+
+# The keys of the successful dry runs are kept there across runs,
+# set IPMININET_VALIDATION_CACHE to an empty string to disable it
+VALIDATION_CACHE_DIR = os.environ.get(
+    'IPMININET_VALIDATION_CACHE', os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+        'ipmininet', 'validated'))
+
+# The keys of the successful dry runs of this process
+_validated = set()  # type: Set[str]
+# The keys of the dry runs in progress
+_running = {}  # type: Dict[str, threading.Event]
+_lock = threading.Lock()
+
+
+class DryRun:
+    """The outcome of the dry run of a daemon"""
+
+    def __init__(self, node: str, daemon: str, cmd: str, out='', err='',
+                 code=0, cached=False):
+        """:param node: The node name
+        :param daemon: The daemon name
+        :param cmd: The dry run command
+        :param out: Its standard output
+        :param err: Its standard error
+        :param code: Its return code
+        :param cached: Whether the result comes from the cache"""
+        self.node = node
+        self.daemon = daemon
+        self.cmd = cmd
+        self.out = out
+        self.err = err
+        self.code = code
+        self.cached = cached
+
+    @property
+    def ok(self) -> bool:
+        return self.code == 0
+
+    def __str__(self):
+        return '%s: %s configuration check failed [rcode: %s]\n' \
+               'command: %s\nstdout: %s\nstderr: %s' \
+               % (self.node, self.daemon, self.code, self.cmd, self.out,
+                  self.err)
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+def _cache_key(daemon: Daemon, cmd: str) -> Optional[str]:
+    """Return the key of a dry run, which depends on the command, on the
+    executable and on the content of the files that it reads
+
+    :return: The key, or None if the dry run cannot be cached"""
+    args = shlex.split(cmd)
+    executable = shutil.which(args[0]) if args else None
+    if executable is None:
+        return None
+    st = os.stat(executable)
+    # The file arguments are replaced by their content, so that the same
+    # configuration is recognized whatever the node that it belongs to
+    for i, arg in enumerate(args):
+        if os.path.isfile(arg):
+            args[i] = ['file', _file_digest(arg)]
+    digests = sorted(_file_digest(f) for f in daemon.cfg_filenames)
+    if any(d is None for d in digests) \
+            or any(a == ['file', None] for a in args):
+        return None
+    key = json.dumps([args, executable, st.st_size, st.st_mtime_ns, digests])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _is_validated(key: str) -> bool:
+    return key in _validated or (
+        bool(VALIDATION_CACHE_DIR)
+        and os.path.exists(os.path.join(VALIDATION_CACHE_DIR, key)))
+
+
+def _set_validated(key: str):
+    _validated.add(key)
+    if VALIDATION_CACHE_DIR:
+        _write_file(os.path.join(VALIDATION_CACHE_DIR, key), '', atomic=True)
+
+
+def dry_run(node, daemon: Daemon) -> DryRun:
+    """Check the configuration of a daemon, unless an identical one was
+    already successfully checked
+
+    :param node: The IPNode of the daemon
+    :param daemon: The daemon to check"""
+    cmd = daemon.dry_run
+    key = _cache_key(daemon, cmd)
+    if key is None:
+        out, err, code = node._processes.pexec(shlex.split(cmd))
+        return DryRun(node.name, daemon.NAME, cmd, out, err, code)
+    # Wait for the concurrent check of an identical configuration, if any
+    with _lock:
+        owner = key not in _running
+        event = _running.setdefault(key, threading.Event())
+    if not owner:
+        event.wait()
+    try:
+        if _is_validated(key):
+            return DryRun(node.name, daemon.NAME, cmd, cached=True)
+        out, err, code = node._processes.pexec(shlex.split(cmd))
+        if not code:
+            _set_validated(key)
+        return DryRun(node.name, daemon.NAME, cmd, out, err, code)
+    finally:
+        if owner:
+            with _lock:
+                del _running[key]
+            event.set()
+
+
+def validate_configs(nodes: Iterable, max_workers: Optional[int] = None) \
+        -> Dict[str, List[DryRun]]:
+    """Check the configuration of every daemon of every node concurrently.
+    The configuration files have to be written beforehand, e.g., by
+    ipmininet.compiler.compile_configs().
+
+    :param nodes: The IPNodes to check
+    :param max_workers: The maximal number of nodes checked at the same time
+    :return: The failed dry runs of each node with at least one failure"""
+    def check(node) -> List[DryRun]:
+        try:
+            return node.check_daemons()
+        except Exception as e:
+            return [DryRun(node.name, '-', '-', err=str(e), code=-1)]
+
+    failures = {}  # type: Dict[str, List[DryRun]]
+    n_checks = n_cached = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for results in pool.map(check, nodes):
+            for r in results:
+                n_checks += 1
+                n_cached += r.cached
+                if not r.ok:
+                    failures.setdefault(r.node, []).append(r)
+    log.info('*** Checked %d daemon configurations (%d cached)\n'
+             % (n_checks, n_cached))
+    return failures